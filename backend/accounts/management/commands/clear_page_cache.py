@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from accounts.page_cache import bump_page_cache_version
+
+
+class Command(BaseCommand):
+    help = ("Make the cached static pages stale by bumping their version, so they are rendered again with "
+            "the current templates and translations. Meant to be run on every deploy.")
+
+    def handle(self, *args, **options):
+        version = bump_page_cache_version()
+        self.stdout.write(self.style.SUCCESS(f"Page cache version set to {version}."))
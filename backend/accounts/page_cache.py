@@ -0,0 +1,68 @@
+import re
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+# Cache key of the version of all cached pages, replaced by bump_page_cache_version() on every deploy
+PAGE_CACHE_VERSION_KEY = 'page_cache_version'
+
+# Rendered CSRF token inputs, whose per-request token is not cached
+CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__csrf_token__'
+
+
+def page_cache_version():
+    """ Version of the cached pages, set on first use if no deploy set it yet """
+    version = cache.get(PAGE_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(PAGE_CACHE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(PAGE_CACHE_VERSION_KEY)
+    return version
+
+
+def bump_page_cache_version():
+    """
+    Make all cached pages stale, e.g. after templates or translations changed. The old pages are not
+    deleted, they expire after PAGE_CACHE_TIMEOUT.
+    """
+    version = time.time_ns()
+    cache.set(PAGE_CACHE_VERSION_KEY, version, None)
+    return version
+
+
+def page_cache_key(request):
+    """ Key of the page for the request: its path, language and whether the user is logged in """
+    variant = 'user' if request.user.is_authenticated else 'anonymous'
+    language = getattr(request, 'LANGUAGE_CODE', None) or get_language()
+    return f"page:{request.path}:{language}:{variant}"
+
+
+def cache_static_page(view):
+    """
+    Cache the pages of a view whose content only depends on the language and on whether the user is
+    logged in, for PAGE_CACHE_TIMEOUT seconds (0 disables the cache).
+
+    Cache hits are answered without calling the view, so no template is rendered. The CSRF token of the
+    forms in the page is stored as a placeholder and replaced with the token of each request.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.PAGE_CACHE_TIMEOUT
+        if not timeout or request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        key, version = page_cache_key(request), page_cache_version()
+        content = cache.get(key, version=version)
+        if content is not None:
+            return HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request).encode()))
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, CSRF_INPUT.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content), timeout,
+                      version=version)
+        return response
+    return wrapper
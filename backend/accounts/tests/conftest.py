@@ -227,6 +227,15 @@ def create_bank(db):
 # CLIENT / AUTHENTICATION FIXTURES
 
 
+@pytest.fixture(autouse=True)
+def no_page_cache(settings):
+    """
+    Fixture disabling the page cache, so the view tests see every page rendered.
+    The page cache tests enable it again.
+    """
+    settings.PAGE_CACHE_TIMEOUT = 0
+
+
 @pytest.fixture
 def client():
     """
@@ -0,0 +1,87 @@
+import re
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from accounts.page_cache import CSRF_INPUT
+
+CSRF_TOKEN = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+@pytest.fixture(autouse=True)
+def page_cache(settings):
+    """
+    Fixture enabling the page cache, with no cached pages.
+    """
+    settings.PAGE_CACHE_TIMEOUT = 60
+    cache.clear()
+
+
+def _templates(response):
+    return [t.name for t in response.templates]
+
+
+@pytest.mark.django_db
+class TestPageCache:
+    @pytest.mark.parametrize('name, template', [
+        ('about', 'accounts/about.html'),
+        ('dashboard', 'accounts/dashboard.html'),
+        ('services', 'accounts/services.html'),
+        ('why_us', 'accounts/why.html'),
+        ('team', 'accounts/team.html'),
+    ])
+    def test_hit_skips_rendering(self, name, template):
+        """Test that a cached page is served again without rendering its template."""
+        first = Client().get(reverse(name))
+        second = Client().get(reverse(name))
+
+        assert template in _templates(first)
+        assert _templates(second) == []
+        assert second.status_code == 200
+        assert CSRF_INPUT.sub(b'', second.content) == CSRF_INPUT.sub(b'', first.content)
+
+    def test_csrf_token_per_request(self):
+        """Test that a cached page carries a CSRF token accepted for the client it is served to."""
+        Client().get(reverse('about'))
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(reverse('about'))
+
+        assert _templates(response) == []
+        # The same token in every form of the page, as when it is rendered
+        tokens = set(CSRF_TOKEN.findall(response.content))
+        assert len(tokens) == 1
+        response = client.post(reverse('set_language'),
+                                {'language': 'pl', 'csrfmiddlewaretoken': tokens.pop().decode()})
+        assert response.status_code == 302
+
+    def test_language_variants(self):
+        """Test that pages are cached separately per language."""
+        english = Client().get(reverse('about'), HTTP_ACCEPT_LANGUAGE='en')
+        polish = Client().get(reverse('about'), HTTP_ACCEPT_LANGUAGE='pl')
+
+        assert 'accounts/about.html' in _templates(polish)
+        assert b'alt="pl"' in polish.content
+        assert b'alt="en"' in english.content
+
+    def test_authenticated_variant(self, authenticated_client):
+        """Test that logged in users are not served the page cached for anonymous visitors."""
+        Client().get(reverse('about'))
+        client, _ = authenticated_client
+        response = client.get(reverse('about'))
+
+        assert 'accounts/about.html' in _templates(response)
+        assert reverse('logout').encode() in response.content
+        assert _templates(client.get(reverse('about'))) == []
+
+    def test_clear_page_cache(self):
+        """Test that clear_page_cache makes the cached pages render again."""
+        Client().get(reverse('about'))
+        call_command('clear_page_cache', verbosity=0)
+        assert 'accounts/about.html' in _templates(Client().get(reverse('about')))
+
+    def test_disabled(self, settings):
+        """Test that a PAGE_CACHE_TIMEOUT of 0 renders every request."""
+        settings.PAGE_CACHE_TIMEOUT = 0
+        Client().get(reverse('about'))
+        assert 'accounts/about.html' in _templates(Client().get(reverse('about')))
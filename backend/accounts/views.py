@@ -8,7 +8,9 @@ from oauth2_provider.models import Application
 from oauth2_provider.models import generate_client_id, generate_client_secret
 from datetime import datetime
 from bank.models import Bank, Transaction
+from payment_gateway.replicas import replica_reads
 from .models import Profile
+from .page_cache import cache_static_page
 from .forms import UserRegistrationForm, ProfileForm, CustomRegistrationFormOAuth2
 
 
@@ -93,6 +95,7 @@ def register(request):
 
 
 @require_http_methods(["GET"])
+@cache_static_page
 def about(request):
     return render(request,
                   'accounts/about.html',
@@ -100,6 +103,7 @@ def about(request):
 
 
 @require_http_methods(["GET"])
+@cache_static_page
 def dashboard(request):
     return render(request,
                   'accounts/dashboard.html',
@@ -107,6 +111,7 @@ def dashboard(request):
 
 
 @require_http_methods(["GET"])
+@cache_static_page
 def services(request):
     return render(request,
                   'accounts/services.html',
@@ -114,6 +119,7 @@ def services(request):
 
 
 @require_http_methods(["GET"])
+@cache_static_page
 def why_us(request):
     return render(request,
                   'accounts/why.html',
@@ -121,6 +127,7 @@ def why_us(request):
 
 
 @require_http_methods(["GET"])
+@cache_static_page
 def team(request):
     return render(request,
                   'accounts/team.html',
@@ -128,6 +135,7 @@ def team(request):
 
 
 @login_required
+@replica_reads
 def show_profile(request):
     profile = get_object_or_404(Profile, pk=request.user.pk)
 
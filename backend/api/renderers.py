@@ -0,0 +1,24 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Renderer which serializes to JSON using orjson.
+
+    Types orjson does not handle natively (lazy translations, decimals, querysets...) and
+    datetimes are passed to the DRF JSON encoder, so the output matches JSONRenderer.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render `data` into JSON, returning a bytestring.
+        """
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=JSONEncoder().default, option=self.options)
@@ -1,10 +1,15 @@
 from os import name
+from collections import defaultdict
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from payments.models import Client, Product, Order
+from payments.models import Client, Product, Order, OrderItem, OrderSequence, bump_orders_version
 from accounts.models import Profile
 from .toolkit import get_user_profile
 import uuid
 
+# Attempts of a bulk create whose new merchant references were created concurrently by another request
+BULK_CREATE_ATTEMPTS = 3
+
 
 class ProfileSerializer(serializers.ModelSerializer):
     """
@@ -34,17 +39,149 @@ class ClientSerializer(serializers.ModelSerializer):
         fields = ['name', 'surname', 'email']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(serializers.ModelSerializer):
     """
-    Serializer for the Product model.
+    Serializer for the OrderItem model, exposing the catalog product fields inline.
 
     Attributes:
     - name (str): The name of the product.
+    - sku (str): The merchant's SKU of the product (optional).
     - quantity (int): The quantity of the product.
+    - price (decimal): The unit price of the product (optional).
     """
+    name = serializers.CharField(source='product.name', max_length=255)
+    sku = serializers.CharField(source='product.sku', max_length=100, required=False, allow_blank=True)
+
     class Meta:
-        model = Product
-        fields = ['name', 'quantity']
+        model = OrderItem
+        fields = ['name', 'sku', 'quantity', 'price']
+
+
+class OrderStatusQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating a bulk order status query.
+
+    Attributes:
+    - ids (list of int): Payment IDs of the orders (optional).
+    - order_ids (list of str): Merchant references of the orders (optional).
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    order_ids = serializers.ListField(child=serializers.CharField(max_length=255), required=False, default=list)
+
+    def validate(self, data):
+        if not data['ids'] and not data['order_ids']:
+            raise serializers.ValidationError("Provide at least one of ids or order_ids.")
+        return data
+
+
+def build_order_items(order, items_data, catalog):
+    """
+    Build unsaved line items of the order from validated OrderItemSerializer data.
+
+    Args:
+    - order (Order): The order the line items belong to.
+    - items_data (list of dict): The validated line item data.
+    - catalog (dict): Catalog products keyed by fingerprint, as returned by Product.from_catalog.
+
+    Returns:
+    - list of OrderItem: The line items, ready for bulk_create.
+    """
+    items = []
+    for item_data in items_data:
+        product_data = item_data['product']
+        fingerprint = Product.make_fingerprint(product_data['name'], product_data.get('sku', ''))
+        items.append(OrderItem(order=order, product=catalog[fingerprint],
+                               quantity=item_data.get('quantity', 1), price=item_data.get('price', 0)))
+    return items
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    """
+    List serializer creating many orders with a constant number of queries.
+
+    Clients, orders and their line items are each written with a single bulk_create
+    instead of one INSERT per object, missing products are added to the merchant's catalog at once.
+    Orders whose merchant reference (order_id) already exists are not created again.
+    """
+
+    def create(self, validated_data):
+        """
+        Method to create many new orders at once.
+
+        Args:
+        - validated_data (list): The validated data for each order.
+
+        Returns:
+        - orders (list of Order): The created or already existing order for each item of validated_data.
+          self.created tells, for each item, whether its order was created by this call.
+
+        If another request creates some of the new references concurrently, the whole batch is rolled
+        back and created again, returning the orders it created as existing ones.
+
+        Raises:
+        - ValidationError: If the user is not logged in or no profile is found.
+        """
+        request = self.context.get('request', None)
+        if not request:
+            raise serializers.ValidationError("User not logged in or no profile found.")
+
+        # The profile may already have been resolved by the view
+        profile = self.context.get('profile') or get_user_profile(request)
+
+        for attempt in range(BULK_CREATE_ATTEMPTS):
+            try:
+                return self._create_missing(profile, validated_data)
+            except IntegrityError:
+                # Another request created some of the references meanwhile. Everything of this attempt
+                # was rolled back, the next one reads them as existing and creates only the others.
+                if attempt == BULK_CREATE_ATTEMPTS - 1:
+                    raise
+
+    @transaction.atomic
+    def _create_missing(self, profile, validated_data):
+        by_reference = {order.order_id: order for order in Order.objects.filter(
+            profile=profile, order_id__in=[item['order_id'] for item in validated_data])}
+
+        # Only the first occurrence of each new merchant reference is created
+        self.created = []
+        new_data = []
+        for item in validated_data:
+            is_new = item['order_id'] not in by_reference
+            if is_new:
+                by_reference[item['order_id']] = None
+                new_data.append(item)
+            self.created.append(is_new)
+
+        if new_data:
+            by_reference.update((order.order_id, order) for order in self._create_orders(profile, new_data))
+        return [by_reference[item['order_id']] for item in validated_data]
+
+    def _create_orders(self, profile, validated_data):
+        clients = Client.objects.bulk_create(
+            [Client(**item['client']) for item in validated_data])
+        catalog = Product.from_catalog(
+            profile, [item_data['product'] for item in validated_data for item_data in item['items']])
+
+        # Reserve one change sequence number per order at once
+        last_seq = OrderSequence.allocate(profile.pk, len(validated_data))
+        first_seq = last_seq - len(validated_data) + 1
+
+        orders = []
+        for seq, (item, client) in enumerate(zip(validated_data, clients), start=first_seq):
+            fields = {key: value for key, value in item.items()
+                      if key not in ('client', 'items', 'profile')}
+            orders.append(Order(client=client, profile=profile, link=str(uuid.uuid4()),
+                                updated_seq=seq, **fields))
+        Order.objects.bulk_create(orders)
+
+        OrderItem.objects.bulk_create([
+            order_item
+            for order, item in zip(orders, validated_data)
+            for order_item in build_order_items(order, item['items'], catalog)
+        ])
+        # bulk_create does not send post_save signals
+        bump_orders_version(profile.pk)
+        return orders
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -54,36 +191,48 @@ class OrderSerializer(serializers.ModelSerializer):
     Attributes:
     - profile (ProfileSerializer): The profile associated with the order (optional).
     - client (ClientSerializer): The client associated with the order.
-    - products (list of ProductSerializer): The list of products included in the order.
+    - products (list of OrderItemSerializer): The list of line items included in the order.
     - total (decimal): The total amount of the order.
     - is_paid (bool): The payment status of the order.
     """
     profile = ProfileSerializer(required=False)
     client = ClientSerializer()
-    products = ProductSerializer(many=True)
+    products = OrderItemSerializer(many=True, source='items')
 
     class Meta:
         model = Order
         fields = ['id', 'link', 'profile', 'client', 'products', 'order_id', 'total', 'is_paid']
+        list_serializer_class = OrderListSerializer
+        # A repeated merchant reference returns the existing order instead of failing validation
+        validators = []
+
+    def validate_order_id(self, value):
+        """
+        Check that an updated merchant reference is not used by another order of the merchant.
+        """
+        if self.instance and Order.objects.filter(
+                profile=self.instance.profile, order_id=value).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError("An order with this order_id already exists.")
+        return value
 
     def create(self, validated_data):
         """
         Method to create a new order.
 
+        If the merchant already has an order with the same order_id, that order is returned
+        instead and self.created is set to False.
+
         Args:
         - validated_data (dict): The validated data for the order.
 
         Returns:
-        - order (Order): The newly created order object.
+        - order (Order): The newly created or already existing order object.
 
         Raises:
         - ValidationError: If the user is not logged in or no profile is found.
         """
         client_data = validated_data.pop('client')
-        products_data = validated_data.pop('products')
-
-        client = Client.objects.create(**client_data)
-        products = [Product.objects.create(**product_data) for product_data in products_data]
+        items_data = validated_data.pop('items')
 
         request = self.context.get('request', None)
 
@@ -91,14 +240,28 @@ class OrderSerializer(serializers.ModelSerializer):
         if request:
             # Get the user's profile
             profile = get_user_profile(request)
-    
-            # Create a new order, assign client, user profile, unique link and other data
-            order = Order.objects.create(client=client, profile=profile, link=str(uuid.uuid4()), **validated_data)
 
-            # Add products to the order
-            for product in products:
-                order.products.add(product)
+            # Return the existing order for a repeated merchant reference
+            self.created = False
+            order = Order.objects.filter(profile=profile, order_id=validated_data['order_id']).first()
+            if order:
+                return order
+
+            try:
+                with transaction.atomic():
+                    client = Client.objects.create(**client_data)
 
+                    # Create a new order, assign client, user profile, unique link and other data
+                    order = Order.objects.create(client=client, profile=profile, link=str(uuid.uuid4()), **validated_data)
+
+                    # Add line items to the order, reusing the products of the merchant's catalog
+                    catalog = Product.from_catalog(profile, [item_data['product'] for item_data in items_data])
+                    OrderItem.objects.bulk_create(build_order_items(order, items_data, catalog))
+            except IntegrityError:
+                # Created concurrently by another request with the same merchant reference
+                return Order.objects.get(profile=profile, order_id=validated_data['order_id'])
+
+            self.created = True
             return order
 
         # If no logged-in user is found, raise an error
@@ -122,28 +285,62 @@ class OrderSerializer(serializers.ModelSerializer):
                 setattr(instance.profile, attr, value)
             instance.profile.save()
 
-        # Update the products
-        products_data = validated_data.pop('products', None)
-        if products_data:
-            # Clear existing products
-            instance.products.clear()
-            for product_data in products_data:
-                # Check if product exists with the same name and quantity
-                product = Product.objects.filter(
-                    name=product_data['name'],
-                    quantity=product_data['quantity']
-                ).first()
-
-                # Create product if it doesn't exist
-                if not product:
-                    product = Product.objects.create(**product_data)
-
-                # Add the product to the order
-                instance.products.add(product)
+        # Update the line items
+        items_data = validated_data.pop('items', None)
+        if items_data:
+            # Replace existing line items, products are looked up in the merchant's catalog by fingerprint
+            instance.items.all().delete()
+            catalog = Product.from_catalog(instance.profile, [item_data['product'] for item_data in items_data])
+            OrderItem.objects.bulk_create(build_order_items(instance, items_data, catalog))
 
         # Update other fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+def serialize_orders(queryset):
+    """
+    Read-only fast path producing the same data as OrderSerializer(queryset, many=True).data.
+
+    Orders and their line items are read with two .values() queries and turned into plain
+    dictionaries directly, skipping model instantiation and per-field serializer calls.
+
+    Args:
+    - queryset (QuerySet): The orders to serialize.
+
+    Returns:
+    - list of dict: The serialized orders.
+    """
+    rows = queryset.values(
+        'id', 'link', 'order_id', 'total', 'is_paid',
+        'profile__first_name', 'profile__last_name', 'profile__email',
+        'client__name', 'client__surname', 'client__email',
+    )
+    items = defaultdict(list)
+    for item in (OrderItem.objects
+                 .filter(order__in=queryset.values('id'))
+                 .order_by('id')
+                 .values_list('order_id', 'product__name', 'product__sku', 'quantity', 'price')):
+        items[item[0]].append({'name': item[1], 'sku': item[2], 'quantity': item[3], 'price': f'{item[4]:f}'})
+
+    return [{
+        'id': row['id'],
+        'link': row['link'],
+        'profile': {
+            'first_name': row['profile__first_name'],
+            'last_name': row['profile__last_name'],
+            'email': row['profile__email'],
+        },
+        'client': {
+            'name': row['client__name'],
+            'surname': row['client__surname'],
+            'email': row['client__email'],
+        },
+        'products': items[row['id']],
+        'order_id': row['order_id'],
+        'total': f"{row['total']:f}",
+        'is_paid': row['is_paid'],
+    } for row in rows]
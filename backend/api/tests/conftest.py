@@ -0,0 +1,88 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import Client as TestClient
+from django.utils import timezone
+from oauth2_provider.models import AccessToken, Application
+from accounts.models import Profile
+from payments.models import Client, Order, OrderItem, Product
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Fixture clearing the cache before each test, so cached order versions do not leak between tests.
+    """
+    cache.clear()
+    yield
+
+
+@pytest.fixture
+def merchant(db):
+    """
+    Fixture providing a merchant profile with an OAuth2 application and a valid access token.
+
+    Usage:
+        profile, token = merchant
+
+    Returns:
+        tuple: (profile, access_token) - Profile instance and its AccessToken
+    """
+    profile = Profile.objects.create_user(username='merchant', password='merchantpass123',
+                                          first_name='Jan', last_name='Kowalski',
+                                          email='merchant@example.com')
+    app = Application.objects.create(
+        user=profile,
+        name='Merchant Shop',
+        client_type=Application.CLIENT_CONFIDENTIAL,
+        authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        redirect_uris='https://shop.example.com/api/paid/',
+    )
+    token = AccessToken.objects.create(
+        user=profile,
+        application=app,
+        token='merchant-access-token',
+        expires=timezone.now() + timedelta(hours=1),
+        scope='read write',
+    )
+    return profile, token
+
+
+@pytest.fixture
+def api_client(merchant):
+    """
+    Fixture providing a test client sending the merchant's Bearer token with every request.
+
+    Returns:
+        Client: Django test client instance
+    """
+    _, token = merchant
+    return TestClient(HTTP_AUTHORIZATION=f'Bearer {token.token}')
+
+
+@pytest.fixture
+def create_order(merchant):
+    """
+    Factory fixture to create orders of the merchant.
+
+    Usage:
+        order = create_order(order_id='A-1', total='99.99', products=[('Shoes', 2)])
+
+    Returns:
+        function: Factory function that creates Order instances
+    """
+    profile, _ = merchant
+
+    def _factory(order_id='1', total='100.00', products=(('Product', 1),), **kwargs):
+        client = Client.objects.create(name='Anna', surname='Nowak', email='anna@example.com')
+        order = Order.objects.create(client=client, profile=kwargs.pop('profile', profile),
+                                     order_id=order_id, total=Decimal(total), **kwargs)
+        catalog = Product.from_catalog(order.profile, [{'name': name} for name, _ in products])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=catalog[Product.make_fingerprint(name)], quantity=quantity)
+            for name, quantity in products
+        ])
+        return order
+
+    return _factory
@@ -0,0 +1,44 @@
+import io
+import json
+import pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+
+
+class TestORJSONRenderer:
+    def test_output_matches_json_renderer(self):
+        """Test that the rendered data decodes to the same value as with DRF's JSONRenderer."""
+        data = {
+            'text': 'Zażółć gęślą jaźń',
+            'lazy': _('Polish'),
+            'amount': Decimal('10.50'),
+            'date': datetime(2025, 1, 10, 12, 37, tzinfo=timezone.utc),
+            'items': [1, None, True],
+        }
+        assert json.loads(ORJSONRenderer().render(data)) == json.loads(JSONRenderer().render(data))
+
+    def test_datetime_format_matches_json_renderer(self):
+        """Test that UTC datetimes use the 'Z' suffix like DRF's encoder."""
+        data = {'date': datetime(2025, 1, 10, 12, 37, tzinfo=timezone.utc)}
+        assert ORJSONRenderer().render(data) == b'{"date":"2025-01-10T12:37:00Z"}'
+
+    def test_render_none(self):
+        """Test that None renders to an empty body."""
+        assert ORJSONRenderer().render(None) == b''
+
+
+class TestORJSONParser:
+    def test_parse(self):
+        """Test that JSON request bodies are parsed."""
+        stream = io.BytesIO('{"order_id": "A-1", "products": [{"name": "Buty"}]}'.encode())
+        assert ORJSONParser().parse(stream) == {'order_id': 'A-1', 'products': [{'name': 'Buty'}]}
+
+    def test_parse_error(self):
+        """Test that malformed JSON raises a ParseError."""
+        with pytest.raises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"order_id": '))
@@ -0,0 +1,34 @@
+import pytest
+from accounts.models import Profile
+from api.serializers import OrderSerializer, serialize_orders
+from payments.models import Order
+
+
+@pytest.mark.django_db
+class TestSerializeOrders:
+    def test_matches_order_serializer(self, create_order):
+        """Test that the fast path produces exactly the data of OrderSerializer."""
+        create_order(order_id='A-1', total='99.90', products=[('Shoes', 2), ('Hat', 1)])
+        create_order(order_id='A-2', total='0.00', products=[('Socks', 5)])
+        paid = create_order(order_id='A-3', products=[])
+        paid.mark_as_paid()
+
+        queryset = Order.objects.order_by('id')
+        assert serialize_orders(queryset) == OrderSerializer(queryset, many=True).data
+
+    def test_respects_queryset_filter(self, create_order):
+        """Test that only orders of the given queryset and their line items are serialized."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        create_order(order_id='OTHER', profile=other, products=[('Hat', 1)])
+        own = create_order(order_id='OWN', products=[('Shoes', 2)])
+
+        data = serialize_orders(Order.objects.filter(profile=own.profile))
+        assert [order['order_id'] for order in data] == ['OWN']
+        assert [product['name'] for product in data[0]['products']] == ['Shoes']
+
+    def test_constant_number_of_queries(self, create_order, django_assert_num_queries):
+        """Test that orders and line items are read with two queries regardless of their number."""
+        for i in range(5):
+            create_order(order_id=str(i), products=[('Shoes', 1), ('Hat', 2)])
+        with django_assert_num_queries(2):
+            serialize_orders(Order.objects.all())
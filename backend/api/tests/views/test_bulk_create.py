@@ -0,0 +1,106 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from api.views import BULK_ORDERS_MAX
+from payments.models import Order
+
+
+def _order(order_id, products=(('Shoes', 2),), total='100.00'):
+    return {
+        'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+        'products': [{'name': name, 'quantity': quantity} for name, quantity in products],
+        'order_id': order_id,
+        'total': total,
+    }
+
+
+@pytest.mark.django_db
+class TestBulkCreateOrders:
+    def test_all_orders_created(self, api_client, merchant):
+        """Test that every valid order is created with its client and products."""
+        profile, _ = merchant
+        payload = [_order('A-1', products=[('Shoes', 2), ('Socks', 1)]), _order('A-2')]
+        response = api_client.post(reverse('api:order-bulk'), payload, content_type='application/json')
+
+        assert response.status_code == 201
+        results = response.json()
+        assert [result['index'] for result in results] == [0, 1]
+        order = Order.objects.get(id=results[0]['payment_id'])
+        assert order.profile == profile
+        assert order.order_id == 'A-1'
+        assert order.client.email == 'anna@example.com'
+        assert sorted(order.items.values_list('product__name', 'quantity')) == [('Shoes', 2), ('Socks', 1)]
+        assert results[0]['payment_link'].endswith(f"/payment/card/{order.id}/{order.link}")
+
+    def test_constant_number_of_queries(self, api_client):
+        """Test that the number of queries does not grow with the number of orders and products."""
+        def count_queries(orders, products):
+            payload = [_order(f'{orders}-{i}', products=[(f'Product {orders}-{j}', j + 1) for j in range(products)])
+                       for i in range(orders)]
+            with CaptureQueriesContext(connection) as queries:
+                response = api_client.post(reverse('api:order-bulk'), payload, content_type='application/json')
+            assert response.status_code == 201
+            return len(queries.captured_queries)
+
+        count_queries(orders=1, products=1)  # The first order of a merchant also creates its sequence counter
+        assert count_queries(orders=2, products=1) == count_queries(orders=20, products=10)
+        assert Order.objects.count() == 23
+
+    def test_partial_success(self, api_client):
+        """Test that invalid orders are reported per item while valid ones are created."""
+        invalid = _order('A-2')
+        del invalid['client']
+        response = api_client.post(reverse('api:order-bulk'), [_order('A-1'), invalid],
+                                   content_type='application/json')
+
+        assert response.status_code == 207
+        created, rejected = response.json()
+        assert created['status'] == 201
+        assert rejected['status'] == 400
+        assert 'client' in rejected['errors']
+        assert Order.objects.filter(order_id='A-1').exists()
+        assert not Order.objects.filter(order_id='A-2').exists()
+
+    def test_all_invalid(self, api_client):
+        """Test that a request where every order is invalid returns 400."""
+        response = api_client.post(reverse('api:order-bulk'), [{'order_id': 'A-1'}],
+                                   content_type='application/json')
+        assert response.status_code == 400
+        assert Order.objects.count() == 0
+
+    def test_payload_must_be_a_list(self, api_client):
+        """Test that a single order object is rejected."""
+        response = api_client.post(reverse('api:order-bulk'), _order('A-1'), content_type='application/json')
+        assert response.status_code == 400
+
+    def test_too_many_orders(self, api_client):
+        """Test that requests above the bulk limit are rejected."""
+        payload = [_order(str(i)) for i in range(BULK_ORDERS_MAX + 1)]
+        response = api_client.post(reverse('api:order-bulk'), payload, content_type='application/json')
+        assert response.status_code == 400
+        assert Order.objects.count() == 0
+
+    @pytest.mark.parametrize('headers', [{}, {'HTTP_AUTHORIZATION': 'Bearer nope'}])
+    def test_requires_token(self, client, headers):
+        """Test that bulk creation without a valid token is rejected with 401."""
+        response = client.post(reverse('api:order-bulk'), [_order('A-1')], content_type='application/json',
+                               **headers)
+        assert response.status_code == 401
+        assert Order.objects.count() == 0
+
+    def test_products_reused_from_catalog(self, api_client, merchant):
+        """Test that products with the same name or SKU are stored once in the merchant's catalog."""
+        profile, _ = merchant
+        first = _order('A-1', products=[('Shoes', 2)])
+        second = _order('A-2', products=[('  shoes ', 1), ('Hat', 1)])
+        second['products'][1]['sku'] = 'HAT-1'
+        third = _order('A-3', products=[('Red hat', 4)])
+        third['products'][0]['sku'] = 'HAT-1'
+        response = api_client.post(reverse('api:order-bulk'), [first, second, third],
+                                   content_type='application/json')
+
+        assert response.status_code == 201
+        assert sorted(profile.products.values_list('name', flat=True)) == ['Hat', 'Shoes']
+        order = Order.objects.get(order_id='A-3')
+        assert [(item.product.sku, item.quantity) for item in order.items.all()] == [('HAT-1', 4)]
@@ -0,0 +1,76 @@
+import pytest
+from django.urls import reverse
+from accounts.models import Profile
+from payments.models import Order, OrderSequence
+
+
+@pytest.mark.django_db
+class TestOrderChanges:
+    def test_sequence_increases_on_every_save(self, create_order):
+        """Test that each save gives the order the next sequence number of its merchant."""
+        first = create_order(order_id='A-1')
+        second = create_order(order_id='A-2')
+        assert second.updated_seq == first.updated_seq + 1
+
+        first.mark_as_paid()
+        assert first.updated_seq == second.updated_seq + 1
+        assert OrderSequence.objects.get(profile=first.profile).value == first.updated_seq
+
+    def test_sequences_are_per_merchant(self, create_order):
+        """Test that merchants have independent sequences."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        assert create_order(profile=other).updated_seq == 1
+        assert create_order().updated_seq == 1
+
+    def test_initial_sync(self, api_client, create_order):
+        """Test that without a token all orders are returned in the order of their changes."""
+        orders = [create_order(order_id=str(i)) for i in range(3)]
+        data = api_client.get(reverse('api:order-changes')).json()
+
+        assert [change['id'] for change in data['changes']] == [order.id for order in orders]
+        assert data['next'] == str(orders[-1].updated_seq)
+        assert data['has_more'] is False
+
+    def test_only_changes_since_token(self, api_client, create_order):
+        """Test that only orders modified after the token are returned."""
+        paid, untouched = create_order(order_id='A-1'), create_order(order_id='A-2')
+        token = api_client.get(reverse('api:order-changes')).json()['next']
+
+        paid.mark_as_paid()
+        data = api_client.get(reverse('api:order-changes'), {'since': token}).json()
+        assert [(change['id'], change['is_paid']) for change in data['changes']] == [(paid.id, True)]
+
+        data = api_client.get(reverse('api:order-changes'), {'since': data['next']}).json()
+        assert data['changes'] == []
+        assert data['next'] == str(paid.updated_seq)
+
+    def test_pagination(self, api_client, create_order):
+        """Test that large change sets are returned in pages."""
+        orders = [create_order(order_id=str(i)) for i in range(3)]
+        data = api_client.get(reverse('api:order-changes'), {'limit': 2}).json()
+        assert [change['id'] for change in data['changes']] == [orders[0].id, orders[1].id]
+        assert data['has_more'] is True
+
+        data = api_client.get(reverse('api:order-changes'), {'limit': 2, 'since': data['next']}).json()
+        assert [change['id'] for change in data['changes']] == [orders[2].id]
+        assert data['has_more'] is False
+
+    def test_bulk_created_orders_have_sequences(self, api_client):
+        """Test that orders created in bulk receive consecutive sequence numbers."""
+        order = {'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+                 'products': [{'name': 'Shoes'}], 'total': '10.00'}
+        api_client.post(reverse('api:order-bulk'), [{**order, 'order_id': str(i)} for i in range(3)],
+                        content_type='application/json')
+        assert list(Order.objects.order_by('id').values_list('updated_seq', flat=True)) == [1, 2, 3]
+
+    @pytest.mark.parametrize('params', [{'since': 'abc'}, {'limit': 0}, {'limit': 5000}])
+    def test_invalid_parameters(self, api_client, params):
+        """Test that malformed tokens and limits are rejected."""
+        response = api_client.get(reverse('api:order-changes'), params)
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize('headers', [{}, {'HTTP_AUTHORIZATION': 'Bearer unknown-token'}])
+    def test_requires_token(self, client, headers):
+        """Test that the changes feed without a valid token is rejected with 401."""
+        response = client.get(reverse('api:order-changes'), **headers)
+        assert response.status_code == 401
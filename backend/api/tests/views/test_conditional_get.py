@@ -0,0 +1,94 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from accounts.models import Profile
+
+
+@pytest.mark.django_db
+class TestOrdersConditionalGet:
+    def test_validators_in_response(self, api_client, create_order):
+        """Test that order lists carry an ETag, but no Last-Modified date that two changes could share."""
+        create_order()
+        response = api_client.get(reverse('api:order-api'))
+        assert response.status_code == 200
+        assert response.has_header('ETag')
+        assert not response.has_header('Last-Modified')
+        assert 'Authorization' in response['Vary']
+
+    def test_unchanged_orders_not_modified(self, api_client, create_order):
+        """Test that a poll with a matching ETag returns 304 without reading the orders table."""
+        create_order()
+        etag = api_client.get(reverse('api:order-api'))['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse('api:order-api'), HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert not any('payments_order' in query['sql'] for query in queries.captured_queries)
+
+    def test_if_modified_since_ignored(self, api_client, create_order, django_capture_on_commit_callbacks):
+        """Test that a poll with only If-Modified-Since is answered with the orders, even right after a change."""
+        order = create_order()
+        api_client.get(reverse('api:order-api'))
+        date = http_date()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            order.mark_as_paid()
+
+        response = api_client.get(reverse('api:order-api'), HTTP_IF_MODIFIED_SINCE=date)
+        assert response.status_code == 200
+        assert response.json()[0]['is_paid'] is True
+
+    def test_changed_order_invalidates_etag(self, api_client, create_order, django_capture_on_commit_callbacks):
+        """Test that saving an order starts a new version once the transaction commits."""
+        order = create_order()
+        etag = api_client.get(reverse('api:order-api'))['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            order.mark_as_paid()
+
+        response = api_client.get(reverse('api:order-api'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+        assert response.json()[0]['is_paid'] is True
+
+    def test_bulk_create_invalidates_etag(self, api_client, django_capture_on_commit_callbacks):
+        """Test that orders created in bulk start a new version."""
+        etag = api_client.get(reverse('api:order-api'))['ETag']
+        order = {'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+                 'products': [{'name': 'Shoes'}], 'order_id': 'A-1', 'total': '10.00'}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('api:order-bulk'), [order], content_type='application/json')
+
+        response = api_client.get(reverse('api:order-api'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+    def test_login_keeps_etag(self, client, api_client, merchant, django_capture_on_commit_callbacks):
+        """Test that logging in to the dashboard, which saves the last login time, starts no new version."""
+        etag = api_client.get(reverse('api:order-api'))['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert client.login(username='merchant', password='merchantpass123')
+
+        assert api_client.get(reverse('api:order-api'), HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_single_order(self, api_client, create_order):
+        """Test that a single order can be fetched and conditionally polled."""
+        order = create_order(order_id='A-1')
+        response = api_client.get(reverse('api:order-update', args=[order.id]))
+        assert response.status_code == 200
+        assert response.json()['order_id'] == 'A-1'
+
+        response = api_client.get(reverse('api:order-update', args=[order.id]), HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == 304
+
+    def test_single_order_of_other_merchant(self, api_client, create_order):
+        """Test that orders of other merchants are not found."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        order = create_order(profile=other)
+        response = api_client.get(reverse('api:order-update', args=[order.id]))
+        assert response.status_code == 404
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+import pytest
+from django.urls import reverse
+from accounts.models import Profile
+
+
+def _ndjson(response):
+    content = b''.join(response.streaming_content).decode()
+    return [json.loads(line) for line in content.splitlines()]
+
+
+@pytest.mark.django_db
+class TestExportOrders:
+    def test_export_requires_token(self, client):
+        """Test that an export without an Authorization header is rejected."""
+        response = client.get(reverse('api:order-export'))
+        assert response.status_code == 401
+
+    def test_export_ndjson_by_default(self, api_client, create_order):
+        """Test that orders are streamed as NDJSON ordered by id."""
+        first = create_order(order_id='A-1', products=[('Shoes', 2), ('Socks', 3)])
+        second = create_order(order_id='A-2', total='15.50')
+        response = api_client.get(reverse('api:order-export'))
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'application/x-ndjson'
+        rows = _ndjson(response)
+        assert [row['id'] for row in rows] == [first.id, second.id]
+        assert [(p['name'], p['quantity']) for p in rows[0]['products']] == [('Shoes', 2), ('Socks', 3)]
+        assert rows[1]['total'] == '15.50'
+
+    def test_export_only_own_orders(self, api_client, create_order):
+        """Test that orders of other merchants are not exported."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        create_order(order_id='OTHER', profile=other)
+        own = create_order(order_id='OWN')
+        rows = _ndjson(api_client.get(reverse('api:order-export')))
+        assert [row['id'] for row in rows] == [own.id]
+
+    def test_export_resumes_after_cursor(self, api_client, create_order):
+        """Test that the 'after' cursor token skips already received orders."""
+        orders = [create_order(order_id=str(i)) for i in range(3)]
+        response = api_client.get(reverse('api:order-export'), {'after': orders[0].id})
+        assert [row['id'] for row in _ndjson(response)] == [orders[1].id, orders[2].id]
+
+    def test_export_csv(self, api_client, create_order):
+        """Test that orders can be streamed as CSV with a header row."""
+        order = create_order(order_id='A-1', products=[('Shoes', 2)])
+        response = api_client.get(reverse('api:order-export'), {'format': 'csv'})
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert rows[0][0] == 'id'
+        assert rows[1][:2] == [str(order.id), 'A-1']
+        assert rows[1][5] == 'Shoes X 2'
+
+    @pytest.mark.parametrize('params', [{'format': 'xml'}, {'after': 'abc'}])
+    def test_export_invalid_parameters(self, api_client, params):
+        """Test that unknown formats and malformed cursors are rejected."""
+        response = api_client.get(reverse('api:order-export'), params)
+        assert response.status_code == 400
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient
+from django.urls import reverse
+from accounts.models import Profile
+from payments.events import publish_order_status
+
+
+@pytest.fixture(autouse=True)
+def in_memory_channel_layer(settings):
+    """
+    Fixture replacing the Redis channel layer with an in-memory one.
+    """
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def _parse(chunk):
+    if isinstance(chunk, bytes):
+        chunk = chunk.decode()
+    fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+    return fields['event'], json.loads(fields['data'])
+
+
+async def _next(stream):
+    return await asyncio.wait_for(stream.__anext__(), timeout=5)
+
+
+@pytest.mark.django_db
+class TestOrderEvents:
+    def test_requires_token(self):
+        """Test that a stream without an Authorization header is rejected."""
+        async def scenario():
+            return await AsyncClient().get(reverse('api:order-events'))
+
+        assert async_to_sync(scenario)().status_code == 401
+
+    def test_order_of_other_merchant(self, merchant, create_order):
+        """Test that orders of other merchants cannot be subscribed to."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        order = create_order(profile=other)
+        _, token = merchant
+
+        async def scenario():
+            client = AsyncClient()
+            return await client.get(reverse('api:order-events-detail', args=[order.id]),
+                                    headers={'Authorization': f'Bearer {token.token}'})
+
+        assert async_to_sync(scenario)().status_code == 404
+
+    def test_order_stream_pushes_payment(self, merchant, create_order):
+        """Test that the order stream sends the current status, then the payment, and ends."""
+        order = create_order()
+        _, token = merchant
+
+        async def scenario():
+            client = AsyncClient()
+            response = await client.get(reverse('api:order-events-detail', args=[order.id]),
+                                        headers={'Authorization': f'Bearer {token.token}'})
+            assert response['Content-Type'] == 'text/event-stream'
+            stream = response.streaming_content
+            assert (await _next(stream)).startswith(b'retry:')
+            current = _parse(await _next(stream))
+
+            await sync_to_async(order.mark_as_paid)()
+            await sync_to_async(publish_order_status)(order)
+            paid = _parse(await _next(stream))
+            with pytest.raises(StopAsyncIteration):
+                await _next(stream)
+            return current, paid
+
+        current, paid = async_to_sync(scenario)()
+        assert current == ('status', {'id': order.id, 'order_id': order.order_id,
+                                      'is_paid': False, 'date_of_payment': None})
+        assert paid[1]['is_paid'] is True
+        assert paid[1]['date_of_payment'] is not None
+
+    def test_merchant_stream_pushes_payments_of_all_orders(self, merchant, create_order):
+        """Test that the merchant stream sends the status changes of every order of the merchant."""
+        first, second = create_order(order_id='A-1'), create_order(order_id='A-2')
+        _, token = merchant
+
+        async def scenario():
+            client = AsyncClient()
+            response = await client.get(reverse('api:order-events'), headers={'Authorization': f'Bearer {token.token}'})
+            stream = response.streaming_content
+            await _next(stream)
+            events = []
+            for order in (second, first):
+                await sync_to_async(order.mark_as_paid)()
+                await sync_to_async(publish_order_status)(order)
+                events.append(_parse(await _next(stream))[1]['order_id'])
+            await stream.aclose()
+            return events
+
+        assert async_to_sync(scenario)() == ['A-2', 'A-1']
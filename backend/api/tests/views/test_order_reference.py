@@ -0,0 +1,122 @@
+import pytest
+from django.db import IntegrityError
+from django.urls import reverse
+from accounts.models import Profile
+from payments.models import Order
+
+
+def _order(order_id, products=(('Shoes', 2),)):
+    return {
+        'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+        'products': [{'name': name, 'quantity': quantity} for name, quantity in products],
+        'order_id': order_id,
+        'total': '100.00',
+    }
+
+
+@pytest.mark.django_db
+class TestOrderReference:
+    def test_reference_unique_per_merchant(self, create_order):
+        """Test that a merchant cannot have two orders with the same order_id."""
+        create_order(order_id='A-1')
+        with pytest.raises(IntegrityError):
+            create_order(order_id='A-1')
+
+    def test_same_reference_for_different_merchants(self, create_order):
+        """Test that different merchants may use the same order_id."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        create_order(order_id='A-1')
+        create_order(order_id='A-1', profile=other)
+        assert Order.objects.filter(order_id='A-1').count() == 2
+
+    def test_get_by_reference(self, api_client, create_order):
+        """Test that an order is fetched by the merchant's order_id."""
+        order = create_order(order_id='SHOP-2024-07')
+        create_order(order_id='SHOP-2024-08')
+        response = api_client.get(reverse('api:order-by-ref', args=['SHOP-2024-07']))
+        assert response.status_code == 200
+        assert response.json()['id'] == order.id
+        assert response.has_header('ETag')
+
+    def test_get_by_reference_with_slash(self, api_client, create_order):
+        """Test that references containing slashes are fetched by their full value."""
+        order = create_order(order_id='INV/2024/07')
+        create_order(order_id='2024/07')
+        response = api_client.get(reverse('api:order-by-ref', args=['INV/2024/07']))
+        assert response.status_code == 200
+        assert response.json()['id'] == order.id
+
+    def test_unknown_reference(self, api_client):
+        """Test that an unknown order_id returns 404."""
+        response = api_client.get(reverse('api:order-by-ref', args=['missing']))
+        assert response.status_code == 404
+
+    def test_get_by_reference_of_other_merchant(self, api_client, create_order):
+        """Test that orders of other merchants are not found by their reference."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        create_order(order_id='A-1', profile=other)
+        response = api_client.get(reverse('api:order-by-ref', args=['A-1']))
+        assert response.status_code == 404
+
+    def test_duplicate_post_returns_existing_order(self, api_client):
+        """Test that posting an existing order_id returns the existing order with status 200."""
+        first = api_client.post(reverse('api:order-api'), _order('A-1'), content_type='application/json')
+        second = api_client.post(reverse('api:order-api'), _order('A-1', products=[('Hat', 1)]),
+                                 content_type='application/json')
+
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert Order.objects.count() == 1
+        assert [item.product.name for item in Order.objects.get().items.all()] == ['Shoes']
+
+    def test_duplicates_in_bulk(self, api_client, create_order):
+        """Test that bulk creation returns existing orders and creates repeated references once."""
+        existing = create_order(order_id='A-1')
+        response = api_client.post(reverse('api:order-bulk'), [_order('A-1'), _order('A-2'), _order('A-2')],
+                                   content_type='application/json')
+
+        assert response.status_code == 201
+        results = response.json()
+        assert [result['status'] for result in results] == [200, 201, 200]
+        assert results[0]['payment_id'] == existing.id
+        assert results[1]['payment_id'] == results[2]['payment_id']
+        assert Order.objects.count() == 2
+
+    def test_concurrent_duplicate_in_bulk(self, monkeypatch, api_client, create_order):
+        """Test that a reference created by a concurrent request during a bulk create is returned as existing."""
+        existing = create_order(order_id='A-1')
+        lookup = Order.objects.filter
+        stale = []
+
+        def racing_lookup(*args, **kwargs):
+            # The first lookup of existing references runs before the concurrent request committed
+            if 'order_id__in' in kwargs and not stale:
+                stale.append(kwargs)
+                return Order.objects.none()
+            return lookup(*args, **kwargs)
+        monkeypatch.setattr(Order.objects, 'filter', racing_lookup)
+
+        response = api_client.post(reverse('api:order-bulk'), [_order('A-1'), _order('A-2')],
+                                   content_type='application/json')
+
+        assert response.status_code == 201
+        results = response.json()
+        assert [result['status'] for result in results] == [200, 201]
+        assert results[0]['payment_id'] == existing.id
+        assert Order.objects.count() == 2
+
+    def test_update_to_existing_reference_rejected(self, api_client, create_order):
+        """Test that an order cannot be renamed to another order's reference."""
+        create_order(order_id='A-1')
+        order = create_order(order_id='A-2')
+        response = api_client.put(reverse('api:order-update', args=[order.id]), {'order_id': 'A-1'},
+                                  content_type='application/json')
+        assert response.status_code == 400
+        assert 'order_id' in response.json()
+
+    @pytest.mark.parametrize('headers', [{}, {'HTTP_AUTHORIZATION': 'Bearer unknown-token'}])
+    def test_get_by_reference_requires_token(self, client, headers):
+        """Test that fetching an order by reference without a valid token is rejected with 401."""
+        response = client.get(reverse('api:order-by-ref', args=['A-1']), **headers)
+        assert response.status_code == 401
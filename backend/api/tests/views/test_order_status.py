@@ -0,0 +1,75 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from accounts.models import Profile
+from api.views import STATUS_QUERY_MAX
+
+
+@pytest.mark.django_db
+class TestOrderStatus:
+    def test_status_by_ids_and_references(self, api_client, create_order):
+        """Test that orders are found both by payment ID and by merchant order_id."""
+        paid, pending = create_order(order_id='A-1'), create_order(order_id='A-2')
+        create_order(order_id='A-3')
+        paid.mark_as_paid()
+
+        response = api_client.post(reverse('api:order-status'), {'ids': [paid.id], 'order_ids': ['A-2']},
+                                   content_type='application/json')
+
+        assert response.status_code == 200
+        orders = response.json()['orders']
+        assert [order['id'] for order in orders] == [paid.id, pending.id]
+        assert orders[0]['is_paid'] is True
+        assert orders[0]['date_of_payment'] is not None
+        assert orders[1] == {'id': pending.id, 'order_id': 'A-2', 'is_paid': False, 'date_of_payment': None,
+                             'redirect_link': None,
+                             'payment_link': f'https://127.0.0.1:8000/payment/card/{pending.id}/{pending.link}'}
+
+    def test_redirect_link(self, api_client, create_order):
+        """Test that paid orders carry the redirect link returned by the merchant's webhook."""
+        order = create_order(order_id='A-1')
+        order.redirect_link = 'https://shop.example.com/thanks/A-1'
+        order.save()
+
+        response = api_client.post(reverse('api:order-status'), {'order_ids': ['A-1']},
+                                   content_type='application/json')
+        assert response.json()['orders'][0]['redirect_link'] == 'https://shop.example.com/thanks/A-1'
+
+    def test_single_query(self, api_client, create_order):
+        """Test that the orders are read with one query regardless of how many are requested."""
+        orders = [create_order(order_id=str(i)) for i in range(20)]
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.post(reverse('api:order-status'),
+                                       {'ids': [order.id for order in orders], 'order_ids': ['1', '2']},
+                                       content_type='application/json')
+        assert len(response.json()['orders']) == 20
+        assert len([query for query in context.captured_queries if 'payments_order' in query['sql']]) == 1
+
+    def test_missing_orders(self, api_client, create_order):
+        """Test that unknown ids and references, and orders of other merchants, are reported as missing."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        foreign = create_order(order_id='B-1', profile=other)
+
+        data = api_client.post(reverse('api:order-status'), {'ids': [foreign.id], 'order_ids': ['B-1', 'nope']},
+                               content_type='application/json').json()
+
+        assert data['orders'] == []
+        assert data['missing'] == {'ids': [foreign.id], 'order_ids': ['B-1', 'nope']}
+
+    def test_empty_query(self, api_client):
+        """Test that a query without ids and order_ids is rejected."""
+        response = api_client.post(reverse('api:order-status'), {}, content_type='application/json')
+        assert response.status_code == 400
+
+    def test_too_many_orders(self, api_client):
+        """Test that a query for more than STATUS_QUERY_MAX orders is rejected."""
+        response = api_client.post(reverse('api:order-status'), {'ids': list(range(1, STATUS_QUERY_MAX + 2))},
+                                   content_type='application/json')
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize('headers', [{}, {'HTTP_AUTHORIZATION': 'Bearer unknown-token'}])
+    def test_requires_token(self, client, headers):
+        """Test that a status query without a valid token is rejected with 401."""
+        response = client.post(reverse('api:order-status'), {'ids': [1]}, content_type='application/json', **headers)
+        assert response.status_code == 401
@@ -0,0 +1,50 @@
+import pytest
+from django.urls import reverse
+from payments.models import Order, Product
+
+
+def _order(order_id, products=(('Shoes', 2),), total='100.00'):
+    return {
+        'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+        'products': [{'name': name, 'quantity': quantity} for name, quantity in products],
+        'order_id': order_id,
+        'total': total,
+    }
+
+
+@pytest.mark.django_db
+class TestOrderAPIView:
+    def test_create_order(self, api_client, merchant):
+        """Test that an order is created with its line items and a payment link is returned."""
+        profile, _ = merchant
+        response = api_client.post(reverse('api:order-api'), _order('A-1', products=[('Shoes', 2), ('Hat', 1)]),
+                                   content_type='application/json')
+
+        assert response.status_code == 201
+        order = Order.objects.get(id=response.json()['payment_id'])
+        assert order.profile == profile
+        assert sorted(order.items.values_list('product__name', 'quantity')) == [('Hat', 1), ('Shoes', 2)]
+        assert response.json()['payment_link'].endswith(f"/payment/card/{order.id}/{order.link}")
+
+    def test_list_orders(self, api_client, create_order):
+        """Test that the merchant's orders are listed with their products."""
+        order = create_order(order_id='A-1', products=[('Shoes', 2)])
+        response = api_client.get(reverse('api:order-api'))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [item['id'] for item in data] == [order.id]
+        assert data[0]['products'] == [{'name': 'Shoes', 'sku': '', 'quantity': 2, 'price': '0.00'}]
+        assert data[0]['client'] == {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'}
+
+    def test_update_replaces_line_items(self, api_client, create_order):
+        """Test that updating products replaces the line items and reuses catalog products."""
+        order = create_order(order_id='A-1', products=[('Shoes', 2), ('Hat', 1)])
+        response = api_client.put(reverse('api:order-update', args=[order.id]),
+                                  {'products': [{'name': 'shoes', 'quantity': 5, 'price': '20.00'}]},
+                                  content_type='application/json')
+
+        assert response.status_code == 200
+        assert [(item.product.name, item.quantity, str(item.price)) for item in order.items.all()] == [
+            ('Shoes', 5, '20.00')]
+        assert Product.objects.filter(profile=order.profile).count() == 2
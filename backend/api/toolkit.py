@@ -25,18 +25,26 @@ def get_user_profile(request, profile_id=False):
             if profile_id is True:
                 try:
                     # Retrieve the access token from the database and return the user's ID
-                    user_token = AccessToken.objects.get(token=token)
-                    return user_token.application.user.id
+                    user_token = AccessToken.objects.select_related('application').get(token=token)
+                    # Lets the API metrics count the request under its application
+                    getattr(request, '_request', request).oauth_application = user_token.application
+                    return user_token.application.user_id
                 except AccessToken.DoesNotExist:
                     # Return None if the token does not exist
                     raise ValueError("Invalid token")
             else:
                 try:
                     # Retrieve the access token from the database and return the user object
-                    user_token = AccessToken.objects.get(token=token)
+                    user_token = AccessToken.objects.select_related('application__user').get(token=token)
+                    getattr(request, '_request', request).oauth_application = user_token.application
                     return user_token.application.user
                 except AccessToken.DoesNotExist:
                     # Return None if the token does not exist
                     raise ValueError("Invalid token")
     # Raise an error if the 'Authorization' header is not provided
     raise ValueError("Authorization header not provided")
+
+
+def build_payment_link(payment_id, link):
+    # Build the link to the payment page of the order with the given ID and unique link
+    return f"https://127.0.0.1:8000/payment/card/{payment_id}/{link}"
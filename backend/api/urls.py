@@ -7,4 +7,11 @@ urlpatterns = [
 
     path('orders/', views.OrderAPIView.as_view(), name='order-api'),
     path('orders/<int:payment_id>/', views.OrderAPIView.as_view(), name='order-update'),
+    path('orders/<int:payment_id>/events/', views.order_events, name='order-events-detail'),
+    path('orders/events/', views.order_events, name='order-events'),
+    path('orders/by-ref/<path:order_id>/', views.OrderByReferenceAPIView.as_view(), name='order-by-ref'),
+    path('orders/bulk/', views.OrderBulkAPIView.as_view(), name='order-bulk'),
+    path('orders/status/', views.OrderStatusAPIView.as_view(), name='order-status'),
+    path('orders/changes/', views.OrderChangesAPIView.as_view(), name='order-changes'),
+    path('orders/export/', views.export_orders, name='order-export'),
 ]
@@ -1,10 +1,66 @@
+import asyncio
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router
+from django.db.models import Q
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from payments.models import Order
-from .serializers import OrderSerializer
-from .toolkit import get_user_profile
+from payment_gateway.replicas import read_from_replica
+from payments.events import order_status_event, order_status_group
+from payments.models import Order, get_orders_version
+from .serializers import OrderSerializer, OrderStatusQuerySerializer, serialize_orders
+from .toolkit import get_user_profile, build_payment_link
+
+# Number of orders fetched from the database cursor per round trip during an export
+EXPORT_CHUNK_SIZE = 2000
+
+# Maximum number of orders accepted by a single bulk create request
+BULK_ORDERS_MAX = 1000
+
+# Default and maximum number of changed orders returned by a single changes feed request
+CHANGES_PAGE_SIZE = 100
+CHANGES_PAGE_SIZE_MAX = 1000
+
+# Maximum number of ids and order_ids accepted by a single status query
+STATUS_QUERY_MAX = 1000
+
+# Seconds between keep-alive comments of idle status streams, and the lifetime of a stream
+# after which the client reconnects (bounds streams of clients that disconnected silently)
+STATUS_STREAM_KEEPALIVE = 15
+STATUS_STREAM_LIFETIME = 300
+
+EXPORT_CSV_HEADER = ['id', 'order_id', 'client_name', 'client_surname', 'client_email',
+                     'products', 'total', 'is_paid', 'date_of_order', 'date_of_payment', 'link']
+
+def _orders_version(request):
+    """
+    Returns the cached version of the requesting merchant's orders, or None if the request is not
+    authenticated.
+    """
+    if not hasattr(request, '_orders_version'):
+        try:
+            request._orders_version = get_orders_version(get_user_profile(request, True))
+        except ValueError:
+            request._orders_version = None
+    return request._orders_version
+
+
+def orders_etag(request, payment_id=None, **kwargs):
+    version = _orders_version(request)
+    if version is None:
+        return None
+    return f"{version}-{payment_id}" if payment_id else version
+
 
 class OrderAPIView(APIView):
     """
@@ -13,19 +69,35 @@ class OrderAPIView(APIView):
     Attributes:
     - queryset (QuerySet): The queryset containing all orders.
     """
-    def get(self, request):
+    @method_decorator(condition(etag_func=orders_etag))
+    def get(self, request, payment_id=None):
         """
-        Method for retrieving all orders of a given user.
+        Method for retrieving all orders of a given user, or a single order if payment_id is given.
+
+        Responses carry an ETag validator taken from the cached version of the user's orders. There is
+        no Last-Modified validator, as two changes within one second would share its date. Conditional
+        requests for unchanged orders are answered with 304 Not Modified before any order is read or
+        serialized. The orders are read from the primary, never a replica, so a new ETag is never sent
+        with a lagging body.
 
         Arguments:
         - request (HttpRequest): HTTP request object.
+        - payment_id (int): The ID of the order (optional).
 
         Returns:
-        - response (Response): HTTP response containing all the orders of a given user.
+        - response (Response): HTTP response containing the orders of a given user.
         """
-        queryset = Order.objects.filter(profile=get_user_profile(request, True))
-        serializer = OrderSerializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Order.objects.filter(profile=get_user_profile(request, True)).order_by('id')
+        if payment_id is None:
+            response = Response(serialize_orders(queryset))
+        else:
+            orders = serialize_orders(queryset.filter(id=payment_id))
+            if not orders:
+                raise NotFound(detail="Order not found.")
+            response = Response(orders[0])
+        # Validators depend on the merchant identified by the token
+        patch_vary_headers(response, ['Authorization'])
+        return response
 
     def post(self, request):
         """
@@ -36,15 +108,17 @@ class OrderAPIView(APIView):
 
         Returns:
         - Response: JSON response containing the ID of the created order and a link to the payment page,
-                    or error messages if the provided data is invalid.
+                    or error messages if the provided data is invalid. If the user already has an order
+                    with the same order_id, that order is returned with status 200.
         """
         serializer = OrderSerializer(
             data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
+            # An order with the same merchant order_id already existed and is returned instead
             return Response({'payment_id': serializer.data['id'], 
-                             'payment_link': f"https://127.0.0.1:8000/payment/card/{serializer.data['id']}/{serializer.data['link']}"},
-                            status=status.HTTP_201_CREATED)
+                             'payment_link': build_payment_link(serializer.data['id'], serializer.data['link'])},
+                            status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def put(self, request, payment_id):
@@ -63,8 +137,383 @@ class OrderAPIView(APIView):
             serializer.save()
             return Response({
                 'payment_id': serializer.data['id'],
-                'payment_link': f"https://127.0.0.1:8000/payment/card/{serializer.data['id']}/{serializer.data['link']}"
+                'payment_link': build_payment_link(serializer.data['id'], serializer.data['link'])
             }, status=status.HTTP_200_OK)
         
         # Jeśli dane są nieprawidłowe, zwróć błędy
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+class OrderByReferenceAPIView(APIView):
+    """
+    API view for retrieving an order by the merchant's own order_id.
+    """
+    @method_decorator(condition(etag_func=orders_etag))
+    def get(self, request, order_id):
+        """
+        Method for retrieving the order of a given user with the given order_id. Like the validators,
+        the order is read from the primary.
+
+        Arguments:
+        - request (HttpRequest): HTTP request object.
+        - order_id (str): The merchant's reference of the order.
+
+        Returns:
+        - response (Response): HTTP response containing the order, or 401 without a valid token.
+        """
+        try:
+            profile = get_user_profile(request, True)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        orders = serialize_orders(Order.objects.filter(profile=profile, order_id=order_id))
+        if not orders:
+            raise NotFound(detail="Order not found.")
+        response = Response(orders[0])
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class OrderBulkAPIView(APIView):
+    """
+    API view for creating many orders in a single request.
+    """
+    def post(self, request):
+        """
+        Handle POST requests to create many orders at once.
+
+        Parameters:
+        - request (HttpRequest): The HTTP request object containing a list of orders.
+
+        Returns:
+        - Response: JSON list with one result per submitted order, in the submitted order. Created orders
+                    (status 201) and orders whose order_id already existed (status 200) contain their ID
+                    and payment link, invalid ones contain their error messages. The status is 201 if
+                    no order was invalid, 207 if only some of them and 400 if all of them, or 401
+                    without a valid token.
+        """
+        # Before the orders are validated, so that requests without a valid token cost no more than that
+        try:
+            profile = get_user_profile(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of orders.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > BULK_ORDERS_MAX:
+            return Response({'detail': f'A single request may contain at most {BULK_ORDERS_MAX} orders.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(request.data)
+        valid = []
+        for index, item in enumerate(request.data):
+            serializer = OrderSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': serializer.errors}
+
+        if valid:
+            serializer = OrderSerializer(many=True, context={'request': request, 'profile': profile})
+            orders = serializer.create([data for _, data in valid])
+            for (index, _), order, created in zip(valid, orders, serializer.created):
+                results[index] = {'index': index,
+                                  'status': status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+                                  'payment_id': order.id,
+                                  'payment_link': build_payment_link(order.id, order.link)}
+
+        if len(valid) == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+
+class OrderStatusAPIView(APIView):
+    """
+    API view returning the payment status of many orders in a single request.
+    """
+    def post(self, request):
+        """
+        Handle POST requests querying the status of many orders at once.
+
+        All orders are read with one query matching the payment IDs and merchant references
+        with IN lookups, served by the primary key and the unique (profile, order_id) index.
+
+        Parameters:
+        - request (HttpRequest): The HTTP request object containing the ids and/or order_ids lists.
+
+        Returns:
+        - Response: JSON object with the compact status of every found order (including the redirect link
+                    set by the merchant's webhook once it is paid), and the requested ids and order_ids
+                    which do not match any order of the user. 401 without a valid token.
+        """
+        try:
+            profile = get_user_profile(request, True)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        serializer = OrderStatusQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = set(serializer.validated_data['ids'])
+        order_ids = set(serializer.validated_data['order_ids'])
+        if len(ids) + len(order_ids) > STATUS_QUERY_MAX:
+            return Response({'detail': f'A single request may query at most {STATUS_QUERY_MAX} orders.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rows = (Order.objects
+                .filter(Q(id__in=ids) | Q(order_id__in=order_ids), profile=profile)
+                .order_by('id')
+                .values_list('id', 'order_id', 'is_paid', 'date_of_payment', 'redirect_link', 'link'))
+        orders = []
+        for payment_id, order_id, is_paid, date_of_payment, redirect_link, link in rows:
+            ids.discard(payment_id)
+            order_ids.discard(order_id)
+            orders.append({'id': payment_id, 'order_id': order_id, 'is_paid': is_paid,
+                           'date_of_payment': date_of_payment, 'redirect_link': redirect_link,
+                           'payment_link': build_payment_link(payment_id, link)})
+        return Response({'orders': orders,
+                         'missing': {'ids': sorted(ids), 'order_ids': sorted(order_ids)}})
+
+
+class OrderChangesAPIView(APIView):
+    """
+    API view returning the orders of a given user changed since a sequence token.
+    """
+    def get(self, request):
+        """
+        Method for retrieving orders created or modified after the given change sequence token.
+
+        Query parameters:
+        - since (int): Token returned as 'next' by the previous request, 0 (default) to start from the beginning.
+        - limit (int): Maximum number of changed orders to return.
+
+        Returns:
+        - response (Response): Changed orders in the order of their changes, the token to use in the
+                               next request and whether more changes are waiting, or 401 without
+                               a valid token.
+        """
+        try:
+            profile = get_user_profile(request, True)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        since = request.query_params.get('since', '0')
+        limit = request.query_params.get('limit', str(CHANGES_PAGE_SIZE))
+        if not since.isdigit() or not limit.isdigit() or not 0 < int(limit) <= CHANGES_PAGE_SIZE_MAX:
+            return Response({'detail': 'Invalid since token or limit.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = int(limit)
+
+        # Served by the (profile, updated_seq) index
+        orders = list(
+            Order.objects
+            .filter(profile=profile, updated_seq__gt=int(since))
+            .select_related('client', 'profile')
+            .prefetch_related('items__product')
+            .order_by('updated_seq')[:limit + 1]
+        )
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        changes = OrderSerializer(orders, many=True).data
+        for change, order in zip(changes, orders):
+            change['seq'] = order.updated_seq
+        return Response({
+            'changes': changes,
+            'next': str(orders[-1].updated_seq if orders else int(since)),
+            'has_more': has_more,
+        })
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer which returns the written row instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def _export_row(order):
+    """
+    Build a flat dictionary describing a single exported order.
+    """
+    return {
+        'id': order.id,
+        'order_id': order.order_id,
+        'client': {
+            'name': order.client.name,
+            'surname': order.client.surname,
+            'email': order.client.email,
+        },
+        'products': [{'name': item.product.name, 'sku': item.product.sku,
+                      'quantity': item.quantity, 'price': str(item.price)}
+                     for item in order.items.all()],
+        'total': str(order.total),
+        'is_paid': order.is_paid,
+        'date_of_order': order.date_of_order.isoformat(),
+        'date_of_payment': order.date_of_payment.isoformat() if order.date_of_payment else None,
+        'link': order.link,
+    }
+
+
+def _ndjson_lines(orders):
+    for order in orders:
+        yield json.dumps(_export_row(order)) + '\n'
+
+
+def _csv_lines(orders):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_CSV_HEADER)
+    for order in orders:
+        row = _export_row(order)
+        yield writer.writerow([
+            row['id'], row['order_id'],
+            row['client']['name'], row['client']['surname'], row['client']['email'],
+            '; '.join(f"{p['name']} X {p['quantity']}" for p in row['products']),
+            row['total'], row['is_paid'], row['date_of_order'], row['date_of_payment'] or '', row['link'],
+        ])
+
+
+async def _async_lines(lines):
+    """
+    Wrap a synchronous line generator in an async iterator.
+
+    Under ASGI Django would otherwise consume a synchronous iterator in full before sending it,
+    so the database cursor is advanced one chunk at a time in the main sync thread instead.
+    """
+    next_chunk = sync_to_async(lambda: list(islice(lines, EXPORT_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        yield ''.join(chunk)
+
+
+@require_GET
+def export_orders(request):
+    """
+    Stream all orders of a given user as NDJSON (default) or CSV.
+
+    Query parameters:
+    - format (str): Either 'ndjson' or 'csv'.
+    - after (int): Cursor token - the id of the last order received. Only orders with a greater id
+      are exported, which allows resuming an export after the connection drops.
+
+    Returns:
+    - response (StreamingHttpResponse): Orders ordered by id, read from the database in chunks.
+    """
+    try:
+        profile_id = get_user_profile(request, True)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return JsonResponse({'detail': "Format must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    after = request.GET.get('after', '0')
+    if not after.isdigit():
+        return JsonResponse({'detail': 'Invalid cursor token.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The export may lag behind recent writes, so it is read from a replica. The rows are streamed after the
+    # view returned, so the queryset is bound to the database chosen now
+    with read_from_replica():
+        database = router.db_for_read(Order)
+
+    # iterator() streams rows through a server-side cursor on PostgreSQL instead of caching the queryset
+    orders = (
+        Order.objects.using(database)
+        .filter(profile=profile_id, id__gt=int(after))
+        .select_related('client')
+        .prefetch_related('items__product')
+        .order_by('id')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    if export_format == 'csv':
+        lines, content_type = _csv_lines(orders), 'text/csv'
+    else:
+        lines, content_type = _ndjson_lines(orders), 'application/x-ndjson'
+
+    if isinstance(request, ASGIRequest):
+        lines = _async_lines(lines)
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+    return response
+
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _order_status_stream(profile_id, payment_id=None):
+    """
+    Yield server-sent events with the payment status changes of the merchant's orders.
+
+    The stream subscribes to the merchant's channel layer group before the current status is
+    read, so a payment committed in between is not missed. A stream of a single order ends
+    once the order is paid.
+    """
+    channel_layer = get_channel_layer()
+    group = order_status_group(profile_id)
+    channel = await channel_layer.new_channel()
+    await channel_layer.group_add(group, channel)
+    try:
+        yield f"retry: {STATUS_STREAM_KEEPALIVE * 1000}\n\n"
+        if payment_id is not None:
+            order = await Order.objects.aget(id=payment_id)
+            event = order_status_event(order)
+            del event['type']
+            yield _sse('status', event)
+            if order.is_paid:
+                return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STATUS_STREAM_LIFETIME
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(channel_layer.receive(channel), STATUS_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if payment_id is not None and event['id'] != payment_id:
+                continue
+            del event['type']
+            yield _sse('status', event)
+            if payment_id is not None:
+                return
+    finally:
+        await channel_layer.group_discard(group, channel)
+
+
+async def order_events(request, payment_id=None):
+    """
+    Stream payment status changes of all orders of a given user, or of a single order,
+    as server-sent events (text/event-stream).
+
+    The view is asynchronous, so an idle subscriber only holds a channel layer subscription
+    and no worker thread.
+
+    Arguments:
+    - request (HttpRequest): HTTP request object.
+    - payment_id (int): The ID of the order (optional).
+
+    Returns:
+    - response (StreamingHttpResponse): 'status' events with the order ID, order_id, is_paid
+      and date_of_payment of the changed order.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        profile_id = await sync_to_async(get_user_profile)(request, True)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    if payment_id is not None and not await Order.objects.filter(profile=profile_id, id=payment_id).aexists():
+        return JsonResponse({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(_order_status_stream(profile_id, payment_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable response buffering of nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from payment_gateway.replicas import ReplicaChangeListMixin
 from .models import Bank, Visa, MasterCard, Transaction
 
 
@@ -18,7 +19,7 @@ class MasterCardInline(admin.StackedInline):
 
 
 @admin.register(Bank)
-class BankAdmin(admin.ModelAdmin):
+class BankAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ['first_name', 'last_name',
                     'country', 'iban', 'balance']
     search_fields = ['first_name', 'last_name']
@@ -28,7 +29,7 @@ class BankAdmin(admin.ModelAdmin):
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ['bank', 'first_name',
                     'last_name', 'transaction_type', 'amount', 'iban', 'date']
     search_fields = ['first_name', 'last_name', 'iban']
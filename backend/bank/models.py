@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from datetime import timedelta
+from monitoring.metrics import LEDGER_POSTING
 from . import iban
 
 
@@ -120,15 +121,27 @@ class Transaction(models.Model):
         )
 
     def save(self, *args, **kwargs):
+        # Only successful postings are timed
+        with LEDGER_POSTING.time(transaction_type=self.transaction_type):
+            self._post(*args, **kwargs)
+
+    def _post(self, *args, **kwargs):
+        """
+        Apply the transaction to the account balances and save it.
+
+        Raises:
+            ValidationError: If the account has insufficient funds (code "insufficient_funds")
+                or a transfer targets its own account (code "same_account").
+        """
         if self.transaction_type == "TRANSFER":
             from_account = self.bank
             to_account = Bank.find_by_iban(self.iban)
             
             # Validate before any database changes
             if from_account == to_account:
-                raise ValidationError("Cannot transfer to the same account")
+                raise ValidationError("Cannot transfer to the same account", code="same_account")
             if from_account.balance < self.amount:
-                raise ValidationError("Insufficient funds for transfer")
+                raise ValidationError("Insufficient funds for transfer", code="insufficient_funds")
             
             # Only proceed if validation passes
             with transaction.atomic():
@@ -153,7 +166,7 @@ class Transaction(models.Model):
         if self.transaction_type == "WITHDRAWAL":
             acc = self.bank
             if acc.balance < self.amount:
-                raise ValidationError("Insufficient funds for withdrawal")
+                raise ValidationError("Insufficient funds for withdrawal", code="insufficient_funds")
             acc.balance -= self.amount
             acc.save()
 
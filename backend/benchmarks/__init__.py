@@ -0,0 +1,8 @@
+"""
+Benchmarks of the gateway hot paths.
+
+Every benchmark runs against a fresh, migrated SQLite database in a temporary directory,
+so it can be run from the backend directory without any services:
+
+    python -m benchmarks.bench_serialization
+"""
@@ -0,0 +1,171 @@
+"""
+Load test of the support chat: many simulated WebSocket clients spread over many rooms,
+connected to ChatConsumer through channels' WebsocketCommunicator and the in-memory channel layer.
+
+Measures connect latency (until the history frame arrives), fan-out latency (from sending a
+chat message until each client of the room receives it) and message throughput.
+
+    python -m benchmarks.bench_chat_load --rooms 100 --clients-per-room 10 --messages 20
+"""
+import argparse
+import asyncio
+import time
+from .harness import percentiles, setup_django, write_report
+
+
+class SimulatedClient:
+    """
+    One WebSocket connection to a room, recording when chat messages arrive.
+
+    Attributes:
+    - communicator (WebsocketCommunicator): The connection.
+    - connect_latency (float): Seconds from opening the connection to receiving the history.
+    - received (dict): Content of the received chat messages -> perf_counter() at arrival.
+    """
+    def __init__(self, application, room, user, on_message):
+        from channels.testing import WebsocketCommunicator
+
+        self.communicator = WebsocketCommunicator(application, f'/ws/chat/{room.uuid}/')
+        self.communicator.scope['user'] = user
+        self.connect_latency = None
+        self.received = {}
+        self.on_message = on_message
+        self.reader = None
+
+    async def connect(self):
+        start = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError("Connection refused")
+        await self.communicator.receive_json_from(timeout=30)
+        self.connect_latency = time.perf_counter() - start
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        # Presence and typing frames are skipped, chat messages are timestamped
+        while True:
+            frame = await self.communicator.receive_json_from(timeout=3600)
+            if frame['type'] == 'chat_message':
+                self.received[frame['message']] = time.perf_counter()
+                self.on_message()
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        await self.communicator.disconnect()
+
+
+def seed_rooms(rooms):
+    """
+    Create `rooms` support rooms, each owned by its own user.
+
+    Returns:
+        list of tuple: (SupportRoom, owner) pairs.
+    """
+    from accounts.models import Profile
+    from support.models import SupportRoom
+
+    seeded = []
+    for i in range(rooms):
+        owner = Profile.objects.create_user(username=f'client{i}', password='clientpass123')
+        seeded.append((SupportRoom.objects.create(title=f'Room {i}', user=owner), owner))
+    return seeded
+
+
+async def load(rooms, clients_per_room, messages, concurrency):
+    """
+    Connect all clients, send `messages` rounds of one message per room and wait for the fan-out.
+
+    Returns:
+        dict: Latencies in milliseconds and throughput figures.
+    """
+    from channels.routing import URLRouter
+    from support.routing import websocket_urlpatterns
+
+    application = URLRouter(websocket_urlpatterns)
+    seeded = await asyncio.to_thread(seed_rooms, rooms)
+    delivered = 0
+    round_done = asyncio.Event()
+    expected = 0
+
+    def on_message():
+        nonlocal delivered
+        delivered += 1
+        if delivered >= expected:
+            round_done.set()
+
+    clients = [[SimulatedClient(application, room, owner, on_message) for _ in range(clients_per_room)]
+               for room, owner in seeded]
+    flat = [client for room_clients in clients for client in room_clients]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(client):
+        async with semaphore:
+            await client.connect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in flat))
+    connect_elapsed = time.perf_counter() - start
+
+    sent = {}
+    start = time.perf_counter()
+    for round_number in range(messages):
+        expected = delivered + len(flat)
+        round_done.clear()
+        for room_number, room_clients in enumerate(clients):
+            content = f'room {room_number} message {round_number}'
+            sent[content] = (time.perf_counter(), room_number)
+            await room_clients[0].communicator.send_json_to({'message': content})
+        await asyncio.wait_for(round_done.wait(), timeout=60)
+    send_elapsed = time.perf_counter() - start
+
+    fanout = [(client.received[content] - sent_at) * 1000
+              for content, (sent_at, room_number) in sent.items()
+              for client in clients[room_number] if content in client.received]
+    await asyncio.gather(*(client.close() for client in flat))
+
+    return {
+        'connections': len(flat),
+        'connect_latency_ms': percentiles([client.connect_latency * 1000 for client in flat]),
+        'connections_per_second': len(flat) / connect_elapsed,
+        'messages_sent': len(sent),
+        'deliveries': len(fanout),
+        'fanout_latency_ms': percentiles(fanout),
+        'messages_per_second': len(sent) / send_elapsed,
+        'deliveries_per_second': len(fanout) / send_elapsed,
+    }
+
+
+def run(rooms=100, clients_per_room=10, messages=20, concurrency=200):
+    """
+    Run the load test.
+
+    Returns:
+        dict: The configuration and results.
+    """
+    results = asyncio.run(load(rooms, clients_per_room, messages, concurrency))
+    return {
+        'benchmark': 'chat_load',
+        'config': {'rooms': rooms, 'clients_per_room': clients_per_room, 'messages': messages,
+                   'concurrency': concurrency},
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--clients-per-room', type=int, default=10)
+    parser.add_argument('--messages', type=int, default=20, help='Messages sent to every room.')
+    parser.add_argument('--concurrency', type=int, default=200, help='Connections opened at the same time.')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    setup_django()
+    write_report(args.output, run(rooms=args.rooms, clients_per_room=args.clients_per_room,
+                                  messages=args.messages, concurrency=args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
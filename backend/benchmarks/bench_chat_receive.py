@@ -0,0 +1,116 @@
+"""
+Messages per second a single process persists and broadcasts through ChatConsumer.receive,
+compared with the previous implementation which looked the room up for every message, and
+number of database writes with and without the write-behind message buffer.
+
+    python -m benchmarks.bench_chat_receive --messages 2000
+"""
+import argparse
+import asyncio
+import time
+from .harness import setup_django, write_report
+
+
+def previous_consumer():
+    """
+    Returns a ChatConsumer subclass with the receive path before rooms were cached per connection:
+    a room query, Message.objects.create through sync_to_async and a lazy sender query per message.
+    """
+    import json
+    from asgiref.sync import sync_to_async
+    from django.utils.timezone import now
+    from support.consumers import ChatConsumer
+    from support.models import Message, SupportRoom
+
+    class PreviousChatConsumer(ChatConsumer):
+        async def receive(self, text_data):
+            data = json.loads(text_data)
+            room = await sync_to_async(SupportRoom.objects.get)(uuid=self.room_id)
+            new_message = await sync_to_async(Message.objects.create)(
+                content=data.get('message'), sender=self.user, chat=room, timestamp=now())
+            sender = await sync_to_async(lambda: new_message.sender.username)()
+            await self.channel_layer.group_send(self.room_group_name, {
+                'type': 'chat_message',
+                'message': new_message.content,
+                'sender': sender,
+                'timestamp': new_message.timestamp.isoformat(),
+            })
+
+    return PreviousChatConsumer
+
+
+async def send_messages(consumer, room, user, messages):
+    """
+    Connect to the room, send `messages` chat messages one after another waiting for each broadcast.
+
+    Returns:
+        float: Seconds spent sending and receiving the messages.
+    """
+    from channels.testing import WebsocketCommunicator
+
+    socket = WebsocketCommunicator(consumer.as_asgi(), f'/ws/chat/{room.uuid}/')
+    socket.scope['user'] = user
+    socket.scope['url_route'] = {'kwargs': {'room_uuid': str(room.uuid)}}
+    await socket.connect()
+    await socket.receive_json_from()
+
+    start = time.perf_counter()
+    for i in range(messages):
+        await socket.send_json_to({'message': f'message {i}'})
+        await socket.receive_json_from(timeout=5)
+    # Buffered messages count as handled once they are written
+    from support.consumers import message_buffer
+    await message_buffer.flush()
+    elapsed = time.perf_counter() - start
+    await socket.disconnect()
+    return elapsed
+
+
+def run(messages=2000, repeat=3):
+    """
+    Time the receive paths, each in a new room of the same user.
+
+    Returns:
+        dict: Best time, messages per second and database writes per run of every path.
+    """
+    from django.test import override_settings
+    from accounts.models import Profile
+    from support.consumers import ChatConsumer, message_buffer
+    from support.models import SupportRoom
+
+    user = Profile.objects.create_user(username='bench', password='benchpass123')
+    paths = (
+        ('previous', previous_consumer(), False),
+        ('current', ChatConsumer, False),
+        ('write_behind', ChatConsumer, True),
+    )
+    results = {}
+    for name, consumer, write_behind in paths:
+        flushes = message_buffer.flushes
+        with override_settings(SUPPORT_MESSAGE_WRITE_BEHIND=write_behind):
+            best = min(
+                asyncio.run(send_messages(consumer, SupportRoom.objects.create(title=name, user=user), user, messages))
+                for _ in range(repeat)
+            )
+        results[name] = {
+            'best': best,
+            'messages_per_second': messages / best,
+            'writes': (message_buffer.flushes - flushes) // repeat if write_behind else messages,
+        }
+    results['speedup'] = results['previous']['best'] / results['current']['best']
+    return {'benchmark': 'chat_receive', 'messages': messages, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    setup_django()
+    write_report(args.output, run(messages=args.messages, repeat=args.repeat))
+
+
+if __name__ == '__main__':
+    main()
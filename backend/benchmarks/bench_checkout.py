@@ -0,0 +1,295 @@
+"""
+End-to-end load test of the checkout, driving the real ASGI application (payment_gateway.asgi.application)
+in process, with the merchant's webhook answered by a local stub server.
+
+Every virtual merchant repeats the full flow until the duration is over:
+OAuth token (client credentials) -> POST /api/orders/ -> GET /payment/card/... -> card POST -> webhook
+receipt by the stub. Reports the checkout throughput and the latency percentiles (in milliseconds)
+and errors of every step.
+
+    python -m benchmarks.bench_checkout --concurrency 20 --duration 30 --dataset 10000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlsplit
+from .harness import percentiles, setup_django, write_report
+
+# Host the requests are addressed to, sent as Host and Origin so the CSRF checks pass over https
+HOST = 'gateway.test'
+
+STEPS = ('token', 'create_order', 'payment_page', 'card_post', 'webhook')
+
+CLIENT_SECRET = 'bench-client-secret'
+
+CSRF_TOKEN = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class WebhookStub:
+    """
+    Local HTTP server standing in for the merchant's payment webhook, in a background thread.
+
+    Attributes:
+    - url (str): URL the gateway posts payment notifications to.
+    - received (dict): Merchant order_id -> perf_counter() when its notification arrived.
+    """
+    def __init__(self):
+        received = self.received = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                received[data['order_id']] = time.perf_counter()
+                body = json.dumps({'redirect_link': f"thanks-{data['order_id']}"}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/payment-webhook/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def seed(dataset, webhook_url):
+    """
+    Create a merchant with an OAuth application notifying `webhook_url`, `dataset` earlier orders of
+    the merchant and `dataset` card holders with enough funds for every payment.
+
+    Returns:
+        tuple: (client_id, list of card data dicts for the card form).
+    """
+    from oauth2_provider.models import Application
+    from accounts.models import Profile
+    from bank.models import Bank, Visa
+    from payments.models import Client, Order, OrderItem, Product
+
+    bank = Bank.objects.create(first_name='Jan', last_name='Kowalski', country='PL', balance=0)
+    merchant = Profile.objects.create_user(username='merchant', password='merchantpass123', iban=bank.iban)
+    # The secret is hashed when saved, requests authenticate with the plain one
+    application = Application.objects.create(
+        user=merchant, name='Load Test Shop', client_type=Application.CLIENT_CONFIDENTIAL,
+        authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS, client_secret=CLIENT_SECRET,
+        redirect_uris=webhook_url)
+
+    product = Product.objects.create(profile=merchant, name='Product', fingerprint=Product.make_fingerprint('Product'))
+    clients = Client.objects.bulk_create(
+        Client(name='Anna', surname=f'Nowak {i}', email=f'anna{i}@example.com') for i in range(dataset))
+    orders = Order.objects.bulk_create(
+        Order(client=client, profile=merchant, order_id=f'seed-{i}', total=Decimal('59.94'), link=f'link-{i}',
+              updated_seq=i + 1)
+        for i, client in enumerate(clients))
+    OrderItem.objects.bulk_create(OrderItem(order=order, product=product, quantity=1) for order in orders)
+
+    # bulk_create skips the signal generating IBANs
+    banks = Bank.objects.bulk_create(
+        Bank(first_name='Card', last_name=f'Holder {i}', country='PL', iban=f'PL{i:026d}',
+             balance=Decimal('1000000000')) for i in range(dataset))
+    cards = Visa.objects.bulk_create(
+        Visa(bank=bank, id_card=f'4{i:015d}', cvc=f'{i % 1000:03d}') for i, bank in enumerate(banks))
+    return application.client_id, [
+        {'id_card': card.id_card, 'valid_until': card.valid_until, 'cvc': card.cvc} for card in cards]
+
+
+async def http(application, method, path, body=b'', headers=()):
+    """
+    Send one https request to the ASGI application.
+
+    Returns:
+        tuple: (status, list of (name, value) header pairs, body bytes).
+    """
+    from asgiref.testing import ApplicationCommunicator
+
+    split = urlsplit(path)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'https',
+        'method': method, 'path': split.path, 'raw_path': split.path.encode(), 'query_string': split.query.encode(),
+        'root_path': '', 'server': (HOST, 443), 'client': ('127.0.0.1', 50000),
+        'headers': [(b'host', HOST.encode()), (b'content-length', str(len(body)).encode()),
+                    *((name.encode(), value.encode()) for name, value in headers)],
+    }
+    communicator = ApplicationCommunicator(application, scope)
+    await communicator.send_input({'type': 'http.request', 'body': body})
+    start = await communicator.receive_output(timeout=60)
+    chunks = []
+    while True:
+        message = await communicator.receive_output(timeout=60)
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    await communicator.wait()
+    return start['status'], [(name.decode(), value.decode()) for name, value in start['headers']], b''.join(chunks)
+
+
+class CheckoutError(Exception):
+    """ A step of the checkout did not answer as expected """
+    def __init__(self, step, detail):
+        super().__init__(f'{step}: {detail}')
+        self.step = step
+
+
+class VirtualMerchant:
+    """
+    Repeats the checkout flow, recording the latency of every step.
+
+    Attributes:
+    - latencies (dict): Step -> list of latencies in seconds.
+    - errors (dict): Step -> number of checkouts that failed at it.
+    - completed (int): Number of checkouts completed.
+    """
+    def __init__(self, application, client_id, cards, webhook, name):
+        self.application = application
+        self.authorization = 'Basic ' + base64.b64encode(f'{client_id}:{CLIENT_SECRET}'.encode()).decode()
+        self.cards = cards
+        self.webhook = webhook
+        self.name = name
+        self.random = random.Random(name)
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.completed = 0
+        self.sequence = 0
+
+    async def step(self, name, method, path, body=b'', headers=(), expect=200):
+        start = time.perf_counter()
+        status, response_headers, content = await http(self.application, method, path, body, headers)
+        self.latencies[name].append(time.perf_counter() - start)
+        if status != expect:
+            raise CheckoutError(name, f'status {status}')
+        return response_headers, content
+
+    async def checkout(self):
+        _, content = await self.step('token', 'POST', '/o/token/', urlencode({'grant_type': 'client_credentials'}).encode(),
+                                     [('authorization', self.authorization),
+                                      ('content-type', 'application/x-www-form-urlencoded')])
+        token = json.loads(content)['access_token']
+
+        self.sequence += 1
+        order_id = f'{self.name}-{self.sequence}'
+        order = {
+            'order_id': order_id, 'total': '59.94',
+            'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+            'products': [{'name': f'Product {i}', 'quantity': 2, 'price': '9.99'} for i in range(3)],
+        }
+        _, content = await self.step('create_order', 'POST', '/api/orders/', json.dumps(order).encode(),
+                                     [('authorization', f'Bearer {token}'), ('content-type', 'application/json')],
+                                     expect=201)
+        payment_path = urlsplit(json.loads(content)['payment_link']).path
+
+        headers, content = await self.step('payment_page', 'GET', payment_path)
+        cookies = SimpleCookie()
+        for name, value in headers:
+            if name.lower() == 'set-cookie':
+                cookies.load(value)
+        match = CSRF_TOKEN.search(content)
+        if match is None:
+            raise CheckoutError('payment_page', 'no CSRF token in the card form')
+
+        form = {'csrfmiddlewaretoken': match.group(1).decode(), **self.random.choice(self.cards)}
+        start = time.perf_counter()
+        await self.step('card_post', 'POST', payment_path, urlencode(form).encode(), [
+            ('content-type', 'application/x-www-form-urlencoded'),
+            ('cookie', '; '.join(f'{name}={morsel.value}' for name, morsel in cookies.items())),
+            ('origin', f'https://{HOST}'),
+        ])
+        # The gateway notifies the merchant before answering the card form
+        received = self.webhook.received.pop(order_id, None)
+        if received is None:
+            self.errors['webhook'] += 1
+            raise CheckoutError('webhook', f'no notification for {order_id}')
+        self.latencies['webhook'].append(received - start)
+        self.completed += 1
+
+    async def run(self, deadline):
+        while time.perf_counter() < deadline:
+            try:
+                await self.checkout()
+            except CheckoutError as e:
+                if e.step != 'webhook':
+                    self.errors[e.step] += 1
+
+
+async def load(application, client_id, cards, webhook, concurrency, duration):
+    """
+    Run `concurrency` virtual merchants against the application for `duration` seconds.
+
+    Returns:
+        tuple: (list of VirtualMerchant, elapsed seconds).
+    """
+    merchants = [VirtualMerchant(application, client_id, cards, webhook, f'vm{i}') for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(merchant.run(start + duration) for merchant in merchants))
+    return merchants, time.perf_counter() - start
+
+
+def run(concurrency=10, duration=30, dataset=1000):
+    """
+    Seed the dataset, start the webhook stub and load the application.
+
+    Returns:
+        dict: Throughput of completed checkouts and requests, and per step the number of samples,
+        errors and latency percentiles in milliseconds.
+    """
+    webhook = WebhookStub()
+    try:
+        client_id, cards = seed(dataset, webhook.url)
+        from payment_gateway.asgi import application
+
+        merchants, elapsed = asyncio.run(load(application, client_id, cards, webhook, concurrency, duration))
+    finally:
+        webhook.close()
+
+    steps = {}
+    for step in STEPS:
+        latencies = [latency * 1000 for merchant in merchants for latency in merchant.latencies[step]]
+        steps[step] = {
+            'count': len(latencies),
+            'errors': sum(merchant.errors[step] for merchant in merchants),
+            'latency_ms': percentiles(latencies),
+        }
+    completed = sum(merchant.completed for merchant in merchants)
+    # The webhook is not a request of the load generator
+    requests = sum(steps[step]['count'] for step in STEPS if step != 'webhook')
+    return {
+        'benchmark': 'checkout',
+        'concurrency': concurrency,
+        'duration': duration,
+        'dataset': dataset,
+        'elapsed': elapsed,
+        'checkouts': completed,
+        'checkouts_per_second': completed / elapsed,
+        'requests_per_second': requests / elapsed,
+        'steps': steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=10, help='Virtual merchants checking out in parallel.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run the load for.')
+    parser.add_argument('--dataset', type=int, default=1000,
+                        help='Earlier orders of the merchant and card holders paying (default: %(default)s).')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    setup_django()
+    write_report(args.output, run(concurrency=args.concurrency, duration=args.duration, dataset=args.dataset))
+
+
+if __name__ == '__main__':
+    main()
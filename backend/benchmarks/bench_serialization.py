@@ -0,0 +1,86 @@
+"""
+Throughput of GET /api/orders/ serialization: OrderSerializer(many=True) with JSONRenderer
+versus the serialize_orders() fast path with ORJSONRenderer.
+
+    python -m benchmarks.bench_serialization --orders 10000
+"""
+import argparse
+from decimal import Decimal
+from .harness import setup_django, measure, write_report
+
+
+def seed_orders(count, items_per_order=3):
+    """
+    Create a merchant with `count` orders, each with `items_per_order` line items.
+
+    Returns:
+        Profile: The merchant.
+    """
+    from accounts.models import Profile
+    from payments.models import Client, Order, OrderItem, Product
+
+    profile = Profile.objects.create_user(username='bench', password='benchpass123',
+                                          first_name='Jan', last_name='Kowalski', email='bench@example.com')
+    products = Product.objects.bulk_create([
+        Product(profile=profile, name=f'Product {i}', fingerprint=Product.make_fingerprint(f'Product {i}'))
+        for i in range(50)
+    ])
+    clients = Client.objects.bulk_create([
+        Client(name='Anna', surname=f'Nowak {i}', email=f'anna{i}@example.com') for i in range(count)
+    ])
+    orders = Order.objects.bulk_create([
+        Order(client=client, profile=profile, order_id=str(i), total=Decimal('99.90'),
+              link=f'link-{i}', updated_seq=i + 1)
+        for i, client in enumerate(clients)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[(i + j) % len(products)], quantity=j + 1, price=Decimal('33.30'))
+        for i, order in enumerate(orders) for j in range(items_per_order)
+    ], batch_size=5000)
+    return profile
+
+
+def run(orders=10000, repeat=5):
+    """
+    Seed the orders and time both serialization paths.
+
+    Returns:
+        dict: Timings and throughput (orders per second) of both paths.
+    """
+    from rest_framework.renderers import JSONRenderer
+    from api.renderers import ORJSONRenderer
+    from api.serializers import OrderSerializer, serialize_orders
+    from payments.models import Order
+
+    profile = seed_orders(orders)
+    queryset = Order.objects.filter(profile=profile).order_by('id')
+
+    def serializer_path():
+        data = OrderSerializer(
+            queryset.select_related('client', 'profile').prefetch_related('items__product'), many=True).data
+        return JSONRenderer().render(data)
+
+    def fast_path():
+        return ORJSONRenderer().render(serialize_orders(queryset))
+
+    results = {}
+    for name, func in (('order_serializer', serializer_path), ('serialize_orders', fast_path)):
+        results[name] = measure(func, repeat=repeat)
+        results[name]['orders_per_second'] = orders / results[name]['best']
+    results['speedup'] = results['order_serializer']['best'] / results['serialize_orders']['best']
+    return {'benchmark': 'serialization', 'orders': orders, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    setup_django()
+    write_report(args.output, run(orders=args.orders, repeat=args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django():
+    """
+    Configure Django for benchmarking and create a migrated database.
+
+    The database is a SQLite file in a temporary directory (shared by all threads of the process),
+    the cache and channel layer are kept in memory, so no Redis is needed.
+
+    Returns:
+        str: Path of the database file.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
+    from django.conf import settings
+    from django.db import connections
+
+    path = os.path.join(tempfile.mkdtemp(prefix='payment-gateway-bench-'), 'db.sqlite3')
+    # The settings module sets Django up while being imported, so the database settings
+    # are already loaded by the connection handler and have to be changed in place
+    connections.close_all()
+    connections.settings['default'].update({
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+    })
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    settings.CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+    settings.DEBUG = False
+
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Time func, calling it `number` times per run, over `repeat` runs.
+
+    Returns:
+        dict: Best, mean and standard deviation of a single call in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'best': min(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if repeat > 1 else 0.0,
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Summarize a list of measurements, e.g. latencies.
+
+    Returns:
+        dict: The given percentiles (as p50, p95, ...), mean and max, or an empty dict for no values.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f'p{point}': ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] for point in points}
+    summary['mean'] = statistics.mean(ordered)
+    summary['max'] = ordered[-1]
+    return summary
+
+
+def write_report(path, report):
+    """
+    Write a benchmark report as JSON, or print it when path is None.
+    """
+    content = json.dumps(report, indent=2, sort_keys=True, default=str)
+    if path is None:
+        print(content)
+    else:
+        with open(path, 'w') as f:
+            f.write(content + '\n')
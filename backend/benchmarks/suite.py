@@ -0,0 +1,407 @@
+"""
+Benchmark suite of the gateway hot paths, run against a seeded dataset at several sizes.
+
+The dataset is seeded with a fixed random seed and grown in place from one size to the next, so
+each size holds `size` orders, bank transactions and chat messages. Every benchmark is timed at
+every size. The report is written as JSON together with the commit it was measured on. With
+--compare, every benchmark is also compared with an earlier report; the command fails if any
+benchmark got slower by more than --threshold.
+
+    python -m benchmarks.suite --sizes 1000,100000,1000000 --output bench-results.json
+    python -m benchmarks.suite --sizes 1000 --compare bench-results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from .harness import setup_django, measure, write_report
+
+# Dataset sizes the suite runs at by default
+SIZES = (1000, 100000, 1000000)
+
+# Orders owned by the benchmarked merchant, the other orders belong to a second merchant
+MERCHANT_ORDERS = 1000
+
+# Rows per bulk_create while seeding
+BATCH_SIZE = 5000
+
+# Chat messages sent per connection by the chat round trip benchmark
+CHAT_MESSAGES = 50
+
+# Benchmark name -> (setup function, number of operations per timed call)
+BENCHMARKS = {}
+
+
+def benchmark(name, operations=1):
+    """
+    Register a benchmark. The decorated function receives the Dataset and returns the callable to time.
+    `operations` is the number of operations a single call performs, used for per-operation results.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, operations)
+        return setup
+    return decorator
+
+
+def _batches(rows):
+    """ Split an iterable of unsaved objects into lists of BATCH_SIZE """
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, BATCH_SIZE)):
+        yield batch
+
+
+class Dataset:
+    """
+    Rows seeded for the benchmarks, grown in place from one size to the next.
+
+    Attributes:
+    - size (int): Number of orders, bank transactions and chat messages seeded so far.
+    - merchant (Profile): Merchant whose API, serializers and profile page are benchmarked.
+    - token (AccessToken): Access token of the merchant.
+    - bank (Bank): Bank account of the merchant, receiving the seeded deposits.
+    - payer (Bank): Bank account the benchmarked transactions and payments are made from.
+    - card (Visa): Card of the payer.
+    - room (SupportRoom): Support room of `client` holding the seeded chat messages.
+    - client (Profile): Owner of the support room.
+    """
+    def __init__(self, seed=0):
+        from oauth2_provider.models import AccessToken, Application
+        from django.utils import timezone
+        from accounts.models import Profile
+        from bank.models import Bank, Visa
+        from payments.models import Product
+        from support.models import SupportRoom
+
+        self.size = 0
+        self.random = random.Random(seed)
+        self.bank = Bank.objects.create(first_name='Jan', last_name='Kowalski', country='PL', balance=0)
+        self.merchant = Profile.objects.create_user(username='merchant', password='merchantpass123',
+                                                    email='merchant@example.com', iban=self.bank.iban)
+        self.other_merchant = Profile.objects.create_user(username='other', password='otherpass123')
+        application = Application.objects.create(
+            user=self.merchant, name='Bench Shop', client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS, redirect_uris='https://shop.example.com/')
+        self.token = AccessToken.objects.create(user=self.merchant, application=application, token='bench-token',
+                                                expires=timezone.now() + timedelta(days=1), scope='read write')
+        self.payer = Bank.objects.create(first_name='Anna', last_name='Nowak', country='PL',
+                                         balance=Decimal('1000000000000'))
+        self.card = Visa.objects.create(bank=self.payer, id_card='4' + '9' * 15, cvc='123')
+        self.products = {
+            profile.pk: Product.objects.bulk_create([
+                Product(profile=profile, name=f'Product {i}', fingerprint=Product.make_fingerprint(f'Product {i}'))
+                for i in range(50)
+            ])
+            for profile in (self.merchant, self.other_merchant)
+        }
+        self.client = Profile.objects.create_user(username='client', password='clientpass123')
+        self.room = SupportRoom.objects.create(title='Benchmark', user=self.client)
+
+    def grow(self, size):
+        """
+        Seed rows until the dataset has `size` orders, bank transactions and chat messages, and size // 10
+        additional card holders.
+        """
+        start, self.size = self.size, size
+        self._seed_orders(start, size)
+        self._seed_transactions(start, size)
+        self._seed_cards(start // 10, size // 10)
+        self._seed_messages(start, size)
+
+    def _seed_orders(self, start, stop):
+        from payments.models import Client, Order, OrderItem
+
+        for batch in _batches(range(start, stop)):
+            clients = Client.objects.bulk_create(
+                Client(name='Anna', surname=f'Nowak {i}', email=f'anna{i}@example.com') for i in batch)
+            orders = Order.objects.bulk_create(
+                Order(client=client, profile=self.merchant if i < MERCHANT_ORDERS else self.other_merchant,
+                      order_id=str(i), total=Decimal('99.90'), link=f'link-{i}', updated_seq=i + 1)
+                for i, client in zip(batch, clients))
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=self.random.choice(self.products[order.profile_id]),
+                          quantity=self.random.randint(1, 5), price=Decimal('19.98'))
+                for order in orders)
+
+    def _seed_transactions(self, start, stop):
+        from django.utils import timezone
+        from bank.models import Transaction
+
+        # Deposits spread over the last year, the date field is auto_now_add and would stamp them all with now
+        date = Transaction._meta.get_field('date')
+        now = timezone.now()
+        date.auto_now_add = False
+        try:
+            for batch in _batches(range(start, stop)):
+                Transaction.objects.bulk_create(
+                    Transaction(bank=self.bank, first_name='Anna', last_name='Nowak', transaction_type='DEPOSIT',
+                                amount=Decimal(self.random.randint(100, 100000)) / 100, iban=self.bank.iban,
+                                date=now - timedelta(minutes=self.random.randint(0, 365 * 24 * 60)))
+                    for _ in batch)
+        finally:
+            date.auto_now_add = True
+
+    def _seed_cards(self, start, stop):
+        from bank.models import Bank, Visa
+
+        for batch in _batches(range(start, stop)):
+            # bulk_create skips the signal generating IBANs
+            banks = Bank.objects.bulk_create(
+                Bank(first_name='Card', last_name=f'Holder {i}', country='PL', iban=f'PL{i:026d}', balance=1000)
+                for i in batch)
+            Visa.objects.bulk_create(Visa(bank=bank, id_card=f'4{i:015d}', cvc=f'{i % 1000:03d}')
+                                     for i, bank in zip(batch, banks))
+
+    def _seed_messages(self, start, stop):
+        from django.utils import timezone
+        from support.models import Message
+
+        first = timezone.now() - timedelta(seconds=stop)
+        for batch in _batches(range(start, stop)):
+            Message.objects.bulk_create(
+                Message(chat=self.room, sender=self.client, content=f'message {i}', timestamp=first + timedelta(seconds=i))
+                for i in batch)
+
+    def api_request(self, method='get', path='/api/orders/', **kwargs):
+        """ Returns a request of the merchant, authenticated with its access token """
+        from django.test import RequestFactory
+        return getattr(RequestFactory(), method)(path, HTTP_AUTHORIZATION=f'Bearer {self.token.token}', **kwargs)
+
+
+def _transaction_save(transaction_type):
+    def setup(dataset):
+        from bank.models import Transaction
+
+        def run():
+            Transaction(bank=dataset.payer, first_name='Anna', last_name='Nowak', transaction_type=transaction_type,
+                        amount=Decimal('10.00'), iban=dataset.bank.iban).save()
+        return run
+    return setup
+
+
+benchmark('transaction_save_deposit')(_transaction_save('DEPOSIT'))
+benchmark('transaction_save_withdrawal')(_transaction_save('WITHDRAWAL'))
+benchmark('transaction_save_transfer')(_transaction_save('TRANSFER'))
+
+
+@benchmark('card_form_is_valid')
+def card_form_is_valid(dataset):
+    from payments.forms import CardForm
+
+    data = {'id_card': dataset.card.id_card, 'valid_until': dataset.card.valid_until, 'cvc': dataset.card.cvc}
+
+    def run():
+        if not CardForm(data).is_valid():
+            raise AssertionError("The benchmark card was rejected")
+    return run
+
+
+def _order_payload(order_id):
+    return {
+        'order_id': order_id,
+        'total': '59.94',
+        'client': {'name': 'Anna', 'surname': 'Nowak', 'email': 'anna@example.com'},
+        'products': [{'name': f'Product {i}', 'quantity': 2, 'price': '9.99'} for i in range(3)],
+    }
+
+
+@benchmark('order_serializer_create')
+def order_serializer_create(dataset):
+    from api.serializers import OrderSerializer
+
+    counter = itertools.count()
+    request = dataset.api_request('post')
+
+    def run():
+        serializer = OrderSerializer(data=_order_payload(f'bench-{dataset.size}-{next(counter)}'),
+                                     context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    return run
+
+
+@benchmark('order_serializer_update')
+def order_serializer_update(dataset):
+    from api.serializers import OrderSerializer
+    from payments.models import Order
+
+    order = Order.objects.filter(profile=dataset.merchant).order_by('id').first()
+    request = dataset.api_request('put')
+    payload = _order_payload(order.order_id)
+
+    def run():
+        serializer = OrderSerializer(order, data=payload, context={'request': request}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    return run
+
+
+@benchmark('order_api_get_list', operations=MERCHANT_ORDERS)
+def order_api_get_list(dataset):
+    from api.views import OrderAPIView
+
+    view = OrderAPIView.as_view()
+
+    def run():
+        view(dataset.api_request()).render()
+    return run
+
+
+@benchmark('order_api_get_one')
+def order_api_get_one(dataset):
+    from api.views import OrderAPIView
+    from payments.models import Order
+
+    view = OrderAPIView.as_view()
+    payment_id = Order.objects.filter(profile=dataset.merchant).order_by('-id').values_list('id', flat=True)[0]
+
+    def run():
+        view(dataset.api_request(path=f'/api/orders/{payment_id}/'), payment_id=payment_id).render()
+    return run
+
+
+@benchmark('show_profile')
+def show_profile(dataset):
+    from django.test import RequestFactory
+    from accounts.views import show_profile
+
+    def run():
+        request = RequestFactory().get('/profile/')
+        request.user = dataset.merchant
+        show_profile(request)
+    return run
+
+
+@benchmark('chat_round_trip', operations=CHAT_MESSAGES)
+def chat_round_trip(dataset):
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    from support.routing import websocket_urlpatterns
+
+    application = URLRouter(websocket_urlpatterns)
+
+    async def round_trips():
+        socket = WebsocketCommunicator(application, f'/ws/chat/{dataset.room.uuid}/')
+        socket.scope['user'] = dataset.client
+        await socket.connect(timeout=30)
+        await socket.receive_json_from(timeout=30)
+        await socket.receive_json_from(timeout=30)  # Users present in the room
+        for i in range(CHAT_MESSAGES):
+            await socket.send_json_to({'message': f'round trip {i}'})
+            await socket.receive_json_from(timeout=30)
+        await socket.disconnect()
+
+    return lambda: asyncio.run(round_trips())
+
+
+def git_commit():
+    """ Returns the commit the benchmarks run on, or None outside of a git checkout """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=SIZES, names=None, repeat=5, number=3, seed=0):
+    """
+    Seed the dataset at each size and time the selected benchmarks.
+
+    Returns:
+        dict: Report with the environment, the seeding time of each size and, per size and benchmark,
+        the timings of a call with the time and throughput of a single operation.
+    """
+    import django
+
+    dataset = Dataset(seed)
+    report = {
+        'suite': 'gateway',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'seed': seed,
+        'sizes': list(sizes),
+        'seeding': {},
+        'results': {},
+    }
+    for size in sorted(sizes):
+        start = time.perf_counter()
+        dataset.grow(size)
+        report['seeding'][str(size)] = time.perf_counter() - start
+
+        results = report['results'][str(size)] = {}
+        for name in names or BENCHMARKS:
+            setup, operations = BENCHMARKS[name]
+            func = setup(dataset)
+            # Warm-up call, fills caches the way a running server would have them
+            func()
+            timing = measure(func, repeat=repeat, number=number)
+            timing['operations'] = operations
+            timing['per_operation'] = timing['best'] / operations
+            timing['operations_per_second'] = operations / timing['best']
+            results[name] = timing
+    return report
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare the best times of the report with those of a baseline report, for the sizes and
+    benchmarks both contain.
+
+    Returns:
+        dict: 'baseline_commit', 'ratios' (size -> benchmark -> current / baseline time) and
+        'regressions' (list of 'size/benchmark' whose ratio is above the threshold).
+    """
+    ratios, regressions = {}, []
+    for size, results in report['results'].items():
+        for name, timing in results.items():
+            previous = baseline.get('results', {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            ratio = timing['best'] / previous['best']
+            ratios.setdefault(size, {})[name] = ratio
+            if ratio > threshold:
+                regressions.append(f'{size}/{name}')
+    return {'baseline_commit': baseline.get('commit'), 'threshold': threshold,
+            'ratios': ratios, 'regressions': regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='Comma separated dataset sizes (default: %(default)s).')
+    parser.add_argument('--benchmarks', help=f"Comma separated benchmarks to run, of: {', '.join(BENCHMARKS)}.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=3, help='Calls per timed run.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', help='Earlier JSON report to compare the results with.')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Slowdown ratio above which a benchmark counts as a regression (default: %(default)s).')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    names = args.benchmarks.split(',') if args.benchmarks else None
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    setup_django()
+    report = run(sizes=[int(size) for size in args.sizes.split(',')], names=names,
+                 repeat=args.repeat, number=args.number, seed=args.seed)
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare(report, json.load(f), args.threshold)
+    write_report(args.output, report)
+
+    if report.get('comparison', {}).get('regressions'):
+        print(f"Regressions: {', '.join(report['comparison']['regressions'])}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
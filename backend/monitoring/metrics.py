@@ -0,0 +1,375 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from django.conf import settings
+from payment_gateway.stores import SharedStore
+from .profiling import LATENCY_BUCKETS, profile_stats
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the default histogram buckets, the last bucket is unbounded
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of this node in the labels of per-node metrics
+NODE = socket.gethostname()
+
+# Seconds after which the values published by a process for a ProcessGauge expire, and seconds
+# between two publications of a process that is alive
+PROCESS_TTL = 60
+PROCESS_HEARTBEAT = 15
+
+# Metrics in the order they are exposed
+REGISTRY = []
+
+
+def metric_key(name):
+    """ Returns the Redis key of the hash holding the values of a metric """
+    return f"metrics:{name}"
+
+
+def process_name():
+    """ Name of this worker process in metric labels and keys, "<host>:<pid>" """
+    return f"{NODE}:{os.getpid()}"
+
+
+class RedisMetricsStore:
+    """
+    Metric values kept in one Redis hash per metric, so the values written by every worker process
+    and node add up and any of them can expose the totals.
+
+    Hash fields are the JSON encoded label values of a series, followed by '|' and the bucket index,
+    'sum' or 'count' for histograms. Values are incremented atomically with HINCRBYFLOAT.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def incr(self, name, amounts):
+        """ Add each amount to its field of the metric, in a single round trip """
+        pipeline = self.connection.pipeline(transaction=False)
+        for field, amount in amounts.items():
+            pipeline.hincrbyfloat(metric_key(name), field, amount)
+        pipeline.execute()
+
+    def read(self, names):
+        """
+        Returns the values of the metrics, read in a single round trip.
+
+        Returns:
+        - dict: Metric name -> dict of field -> value.
+        """
+        pipeline = self.connection.pipeline(transaction=False)
+        for name in names:
+            pipeline.hgetall(metric_key(name))
+        return {name: {field.decode(): float(value) for field, value in values.items()}
+                for name, values in zip(names, pipeline.execute())}
+
+    def publish(self, name, process, values, ttl):
+        """ Replace the values of the metric published by a process, expiring after ttl seconds """
+        key = f"{metric_key(name)}:{process}"
+        pipeline = self.connection.pipeline()
+        pipeline.delete(key)
+        if values:
+            pipeline.hset(key, mapping=values)
+            pipeline.expire(key, ttl)
+        pipeline.execute()
+
+    def read_processes(self, names):
+        """
+        Returns the values of the metrics summed over the processes whose publication has not expired.
+
+        Returns:
+        - dict: Metric name -> dict of field -> value.
+        """
+        keys = {name: list(self.connection.scan_iter(match=f"{metric_key(name)}:*")) for name in names}
+        pipeline = self.connection.pipeline(transaction=False)
+        for name in names:
+            for key in keys[name]:
+                pipeline.hgetall(key)
+        results = iter(pipeline.execute())
+        totals = {}
+        for name in names:
+            values = totals[name] = {}
+            for _ in keys[name]:
+                for field, value in next(results).items():
+                    values[field.decode()] = values.get(field.decode(), 0) + float(value)
+        return totals
+
+
+class LocalMetricsStore:
+    """
+    Process-local metric store with the interface of RedisMetricsStore, used when the cache is not
+    Redis (development and tests). It only knows the values written by its own process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {}
+        self.processes = {}
+
+    def incr(self, name, amounts):
+        with self._lock:
+            values = self.metrics.setdefault(name, {})
+            for field, amount in amounts.items():
+                values[field] = values.get(field, 0) + amount
+
+    def read(self, names):
+        with self._lock:
+            return {name: dict(self.metrics.get(name, {})) for name in names}
+
+    def publish(self, name, process, values, ttl):
+        with self._lock:
+            self.processes.setdefault(name, {})[process] = (dict(values), time.time() + ttl)
+
+    def read_processes(self, names):
+        now = time.time()
+        totals = {}
+        with self._lock:
+            for name in names:
+                values = totals[name] = {}
+                for published, expires in self.processes.get(name, {}).values():
+                    if expires > now:
+                        for field, value in published.items():
+                            values[field] = values.get(field, 0) + value
+        return totals
+
+
+# Metric store: Redis if the default cache is Redis, process-local otherwise. Metrics are recorded while
+# serving requests and posting payments, so a stalled Redis fails them after METRICS_REDIS_TIMEOUT
+get_metrics_store = SharedStore(RedisMetricsStore, LocalMetricsStore, socket_timeout=settings.METRICS_REDIS_TIMEOUT)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """
+    Base class of metrics with a fixed set of label names.
+
+    Class attributes:
+    - per_process (bool): Whether the stored values are published per process (ProcessGauge).
+
+    Attributes:
+    - name (str): Metric name, as exposed.
+    - documentation (str): HELP text.
+    - labelnames (tuple of str): Names of the labels every series of the metric has.
+    """
+    type = None
+    per_process = False
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _series(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {', '.join(self.labelnames) or 'none'}")
+        return json.dumps([str(labels[label]) for label in self.labelnames])
+
+    def _labels(self, series, extra=()):
+        pairs = list(zip(self.labelnames, json.loads(series))) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+    def _incr(self, amounts):
+        # Metrics must never break the request that records them
+        try:
+            get_metrics_store().incr(self.name, amounts)
+        except Exception:
+            logger.warning("Could not record the %s metric", self.name, exc_info=True)
+
+    def samples(self, values):
+        """ Returns the exposition lines of the samples of the metric, given its stored values """
+        return [f"{self.name}{self._labels(series)} {_format_value(value)}" for series, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    """ Monotonically increasing count. Names should end with _total. """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._incr({self._series(labels): amount})
+
+
+class ProcessGauge(Metric):
+    """
+    Gauge of a quantity held by the worker processes, e.g. their open connections, exposed as the sum
+    over the live processes.
+
+    Each process counts its own values and publishes them under its own key, which expires PROCESS_TTL
+    seconds after the last publication. A daemon thread publishes them again every PROCESS_HEARTBEAT
+    seconds, so the values of a process killed before it could decrement them drop out of the sum
+    instead of staying in it forever.
+    """
+    type = 'gauge'
+    per_process = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+
+    def inc(self, amount=1, **labels):
+        self._add(self._series(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        self._add(self._series(labels), -amount)
+
+    def _add(self, series, amount):
+        with self._lock:
+            if self._pid != os.getpid():
+                # First value of this process, values copied from a parent process are not its own
+                self._pid = os.getpid()
+                self._values = {}
+                threading.Thread(target=self._heartbeat, name=f'{self.name}-heartbeat', daemon=True).start()
+            self._values[series] = self._values.get(series, 0) + amount
+        self.publish()
+
+    def publish(self):
+        """ Publish the values of this process, refreshing their expiry """
+        with self._lock:
+            values = dict(self._values)
+        # Metrics must never break the code that records them
+        try:
+            get_metrics_store().publish(self.name, process_name(), values, PROCESS_TTL)
+        except Exception:
+            logger.warning("Could not publish the %s metric", self.name, exc_info=True)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(PROCESS_HEARTBEAT)
+            self.publish()
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in buckets, with their sum and count.
+
+    Attributes:
+    - buckets (tuple of float): Upper bounds of the buckets, the last bucket is unbounded.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        series = self._series(labels)
+        self._incr({
+            f'{series}|{bisect_left(self.buckets, value)}': 1,
+            f'{series}|sum': value,
+            f'{series}|count': 1,
+        })
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observe the duration of the block in seconds, if it completes without an exception """
+        start = perf_counter()
+        yield
+        self.observe(perf_counter() - start, **labels)
+
+    def samples(self, values):
+        series_values = {}
+        for field, value in values.items():
+            series, part = field.rsplit('|', 1)
+            series_values.setdefault(series, {})[part] = value
+
+        lines = []
+        for series, parts in sorted(series_values.items()):
+            # Buckets are stored separately and exposed cumulatively
+            cumulative = 0
+            for index, bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += parts.get(str(index), 0)
+                le = '+Inf' if index == len(self.buckets) else _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._labels(series, [('le', le)])} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(series)} {_format_value(parts.get('sum', 0))}")
+            lines.append(f"{self.name}_count{self._labels(series)} {_format_value(parts.get('count', 0))}")
+        return lines
+
+
+def render_metrics():
+    """
+    Returns all registered metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    store = get_metrics_store()
+    values = store.read([metric.name for metric in REGISTRY if not metric.per_process])
+    values.update(store.read_processes([metric.name for metric in REGISTRY if metric.per_process]))
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples(values[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+# Counters exposing the ViewStats totals of the same names, in the order they are exposed
+PROFILE_COUNTERS = (
+    ('gateway_view_db_queries_total', 'queries', 'Database queries of profiled requests, by view.'),
+    ('gateway_view_db_seconds_total', 'query_time', 'Time spent in database queries of profiled requests, by view.'),
+    ('gateway_view_cache_hits_total', 'cache_hits', 'Keys found in the cache by profiled requests, by view.'),
+    ('gateway_view_cache_misses_total', 'cache_misses', 'Keys missing from the cache for profiled requests, by view.'),
+    ('gateway_view_http_requests_total', 'http_requests', 'Outbound HTTP requests of profiled requests, by view.'),
+    ('gateway_view_http_seconds_total', 'http_time',
+     'Time spent in outbound HTTP requests of profiled requests, by view.'),
+)
+
+
+def render_profile_stats():
+    """
+    Returns the request profiles of this process (profile_stats) in the Prometheus text exposition format.
+
+    Profiles are aggregated in each worker process, so every series is labelled with the view name and
+    the process ("<host>:<pid>"); sum them by view to get the totals of all processes.
+    """
+    process = process_name()
+    snapshot = sorted(profile_stats.snapshot().items())
+    lines = [
+        "# HELP gateway_view_latency_seconds Latency of profiled requests, by view.",
+        "# TYPE gateway_view_latency_seconds histogram",
+    ]
+    for view, stats in snapshot:
+        labels = f'view="{_escape(view)}",process="{_escape(process)}"'
+        cumulative = 0
+        for index, count in enumerate(stats['buckets']):
+            cumulative += count
+            le = '+Inf' if index == len(LATENCY_BUCKETS) else _format_value(LATENCY_BUCKETS[index])
+            lines.append(f'gateway_view_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"gateway_view_latency_seconds_sum{{{labels}}} {_format_value(stats['latency'])}")
+        lines.append(f"gateway_view_latency_seconds_count{{{labels}}} {stats['count']}")
+    for name, attribute, documentation in PROFILE_COUNTERS:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} counter")
+        for view, stats in snapshot:
+            labels = f'view="{_escape(view)}",process="{_escape(process)}"'
+            lines.append(f"{name}{{{labels}}} {_format_value(stats[attribute])}")
+    return '\n'.join(lines) + '\n'
+
+
+PAYMENTS_PROCESSED = Counter(
+    'gateway_payments_processed_total', 'Card payments charged successfully.')
+PAYMENTS_FAILED = Counter(
+    'gateway_payments_failed_total', 'Card payments which failed, by reason.', ['reason'])
+LEDGER_POSTING = Histogram(
+    'gateway_ledger_posting_seconds', 'Time taken to post a bank transaction.', ['transaction_type'])
+WEBHOOK_DELIVERY = Histogram(
+    'gateway_webhook_delivery_seconds',
+    'Time taken to notify merchants of payments, by HTTP status or "error" if the request failed.', ['status'])
+API_REQUESTS = Counter(
+    'gateway_api_requests_total', 'API requests by OAuth application client ID, "anonymous" without a valid token.',
+    ['application'])
+WEBSOCKET_CONNECTIONS = ProcessGauge(
+    'gateway_websocket_connections', 'Open WebSocket connections, by node.', ['node'])
@@ -0,0 +1,92 @@
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .metrics import API_REQUESTS
+from .profiling import RequestProfile, current_profile, instrument, profile_stats, sampled, view_name
+
+
+class ProfilingMiddleware:
+    """
+    Record latency, database queries, cache hits and misses and outbound HTTP time of sampled requests,
+    aggregated per view name in profile_stats.
+
+    Should be the first middleware, so the latency covers the whole middleware chain. When the request
+    comes through ProfilingASGIMiddleware, the profile is the one started there and recorded once the
+    response has been sent. With PROFILING_ENABLED off the middleware removes itself at startup.
+    """
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        instrument()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        scope = getattr(request, 'scope', None)
+        if scope is not None and 'profile' in scope:
+            # Sampled, or skipped, by the ASGI wrapper
+            profile, owner = scope['profile'], False
+        else:
+            profile, owner = RequestProfile() if sampled() else None, True
+        if profile is None:
+            return self.get_response(request)
+
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                return self.get_response(request)
+        finally:
+            current_profile.reset(token)
+            profile.name = view_name(request)
+            if owner:
+                profile.finish()
+                profile_stats.record(profile)
+
+
+class ProfilingASGIMiddleware:
+    """
+    ASGI wrapper sampling HTTP requests before they reach Django, so their latency also includes
+    sending the response. The resolved view and the measurements are filled in by ProfilingMiddleware.
+
+    Only wrap the application when PROFILING_ENABLED is on.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile() if sampled() else None
+        try:
+            await self.app(dict(scope, profile=profile), receive, send)
+        finally:
+            if profile is not None:
+                profile.finish()
+                profile_stats.record(profile)
+
+
+def api_application(request):
+    """ Client ID of the OAuth application that made an API request, or 'anonymous' without a valid token """
+    application = getattr(request, 'oauth_application', None)
+    if application is None:
+        # Set by DRF's OAuth2Authentication
+        application = getattr(getattr(request, 'auth', None), 'application', None)
+    return application.client_id if application is not None else 'anonymous'
+
+
+class ApiMetricsMiddleware:
+    """
+    Count the requests to the API per OAuth application.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.namespace == 'api':
+            API_REQUESTS.inc(application=api_application(request))
+        return response
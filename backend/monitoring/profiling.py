@@ -0,0 +1,217 @@
+import functools
+import random
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+# Upper bounds in seconds of the request latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# View name of requests which did not resolve to a view, e.g. 404 responses
+UNRESOLVED = '<unresolved>'
+
+# Profile of the request handled in the current thread or task, None when it is not sampled
+current_profile = ContextVar('current_profile', default=None)
+
+_MISSING = object()
+
+
+class RequestProfile:
+    """
+    Measurements of a single sampled request.
+
+    Instances are installed as database execute wrappers, so every query of the request is counted and timed.
+
+    Attributes:
+    - name (str): Resolved view name of the request.
+    - started (float): perf_counter() value when the request started.
+    - latency (float): Duration of the request in seconds, set by finish().
+    - queries (int): Number of database queries.
+    - query_time (float): Total time spent in database queries, in seconds.
+    - cache_hits (int): Number of keys found in the cache.
+    - cache_misses (int): Number of keys missing from the cache.
+    - http_requests (int): Number of outbound HTTP requests.
+    - http_time (float): Total time spent in outbound HTTP requests, in seconds.
+    """
+    __slots__ = ('name', 'started', 'latency', 'queries', 'query_time', 'cache_hits', 'cache_misses',
+                 'http_requests', 'http_time')
+
+    def __init__(self):
+        self.name = UNRESOLVED
+        self.started = perf_counter()
+        self.latency = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_requests = 0
+        self.http_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += perf_counter() - start
+
+    def finish(self):
+        self.latency = perf_counter() - self.started
+
+
+class ViewStats:
+    """
+    Aggregated measurements of all sampled requests of one view.
+
+    Attributes:
+    - count (int): Number of sampled requests.
+    - buckets (list of int): Number of requests per LATENCY_BUCKETS bucket, plus the unbounded bucket.
+    - latency (float): Total latency in seconds.
+    - queries, query_time, cache_hits, cache_misses, http_requests, http_time: Totals of the
+      RequestProfile attributes of the same names.
+    """
+    __slots__ = ('count', 'buckets', 'latency', 'queries', 'query_time', 'cache_hits', 'cache_misses',
+                 'http_requests', 'http_time')
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_requests = 0
+        self.http_time = 0.0
+
+    def add(self, profile):
+        self.count += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, profile.latency)] += 1
+        self.latency += profile.latency
+        self.queries += profile.queries
+        self.query_time += profile.query_time
+        self.cache_hits += profile.cache_hits
+        self.cache_misses += profile.cache_misses
+        self.http_requests += profile.http_requests
+        self.http_time += profile.http_time
+
+    def as_dict(self):
+        return {slot: list(self.buckets) if slot == 'buckets' else getattr(self, slot) for slot in self.__slots__}
+
+
+class ProfileStats:
+    """
+    In-process aggregation of request profiles per view name.
+
+    Recording only takes a lock and adds a few numbers, the profiles themselves are not kept.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, profile):
+        with self._lock:
+            stats = self._views.get(profile.name)
+            if stats is None:
+                stats = self._views[profile.name] = ViewStats()
+            stats.add(profile)
+
+    def snapshot(self):
+        """
+        Returns the aggregated measurements of each view, as a dict of view name to ViewStats.as_dict().
+        """
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+
+profile_stats = ProfileStats()
+
+
+def sampled():
+    """ Whether the next request is profiled, according to PROFILING_SAMPLE_RATE """
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+def view_name(request):
+    """ Namespaced URL name of the view the request resolved to, or its dotted path if the URL has no name """
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+def _profiled_cache_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return get(self, key, default, version=version, **kwargs)
+        value = get(self, key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            profile.cache_misses += 1
+            return default
+        profile.cache_hits += 1
+        return value
+    wrapper.profiled = True
+    return wrapper
+
+
+def _profiled_cache_get_many(get_many):
+    @functools.wraps(get_many)
+    def wrapper(self, keys, *args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return get_many(self, keys, *args, **kwargs)
+        keys = list(keys)
+        # Backends without a native get_many call get() for each key, which must not count again
+        token = current_profile.set(None)
+        try:
+            found = get_many(self, keys, *args, **kwargs)
+        finally:
+            current_profile.reset(token)
+        profile.cache_hits += len(found)
+        profile.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.profiled = True
+    return wrapper
+
+
+def _profiled_http_send(send):
+    @functools.wraps(send)
+    def wrapper(self, request, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return send(self, request, **kwargs)
+        # Redirects are followed by nested send() calls, which are part of this request's time
+        token = current_profile.set(None)
+        start = perf_counter()
+        try:
+            return send(self, request, **kwargs)
+        finally:
+            current_profile.reset(token)
+            profile.http_requests += 1
+            profile.http_time += perf_counter() - start
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument():
+    """
+    Count cache hits and misses of the configured cache backends and time outbound HTTP requests made
+    with requests, for the profile of the current request. Outside of a profiled request the patched
+    methods only add a context variable lookup. Safe to call more than once.
+    """
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for method, wrap in (('get', _profiled_cache_get), ('get_many', _profiled_cache_get_many)):
+            if not getattr(getattr(backend, method), 'profiled', False):
+                setattr(backend, method, wrap(getattr(backend, method)))
+    if not getattr(requests.Session.send, 'profiled', False):
+        requests.Session.send = _profiled_http_send(requests.Session.send)
@@ -0,0 +1,135 @@
+import os
+import pytest
+import requests
+from asgiref.sync import async_to_sync
+from channels.testing import HttpCommunicator
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import reverse
+from accounts.models import Profile
+from monitoring.metrics import NODE
+from monitoring.middleware import ProfilingASGIMiddleware, ProfilingMiddleware
+from monitoring.profiling import LATENCY_BUCKETS, UNRESOLVED, RequestProfile, current_profile, profile_stats
+
+
+@pytest.fixture(autouse=True)
+def profiling(settings):
+    """
+    Fixture enabling profiling of every request, with empty statistics.
+    """
+    settings.PROFILING_ENABLED = True
+    settings.PROFILING_SAMPLE_RATE = 1.0
+    profile_stats.reset()
+    yield
+    profile_stats.reset()
+
+
+@pytest.fixture
+def profile():
+    """
+    Fixture making a fresh profile the one of the current request.
+    """
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    yield profile
+    current_profile.reset(token)
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """Transport answering every request with an empty 200 response."""
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code, response.request, response.url = 200, request, request.url
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+    def test_disabled(self, settings):
+        """Test that the middleware removes itself when profiling is disabled."""
+        settings.PROFILING_ENABLED = False
+        with pytest.raises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_records_per_view(self, client):
+        """Test that latency, queries and cache lookups are recorded under the resolved view name."""
+        user = Profile.objects.create_user(username='client', password='clientpass123')
+        client.force_login(user)
+        client.get(reverse('chats'))
+        client.get(reverse('chats'))
+
+        stats = profile_stats.snapshot()['chats']
+        assert stats['count'] == 2
+        assert sum(stats['buckets']) == 2
+        assert len(stats['buckets']) == len(LATENCY_BUCKETS) + 1
+        assert stats['latency'] > 0
+        assert stats['queries'] > 0 and stats['query_time'] > 0
+        # The room list is read from the database once and from the cache afterwards
+        assert stats['cache_misses'] >= 1 and stats['cache_hits'] >= 1
+
+    def test_unresolved(self, client):
+        """Test that requests not matching any URL are recorded together."""
+        client.get('/no-such-page/')
+        assert profile_stats.snapshot()[UNRESOLVED]['count'] == 1
+
+    def test_not_sampled(self, settings, client):
+        """Test that nothing is recorded for requests left out by the sample rate."""
+        settings.PROFILING_SAMPLE_RATE = 0
+        client.get(reverse('about'))
+        assert profile_stats.snapshot() == {}
+
+
+class TestInstrumentation:
+    def test_cache_hits_and_misses(self, profile):
+        """Test that single and multiple key cache lookups are counted."""
+        ProfilingMiddleware(lambda request: None)
+        cache.set('present', 1)
+        assert cache.get('present') == 1
+        assert cache.get('absent', 'default') == 'default'
+        assert cache.get_many(['present', 'absent']) == {'present': 1}
+        assert (profile.cache_hits, profile.cache_misses) == (2, 2)
+
+    def test_outbound_http(self, profile):
+        """Test that outbound HTTP requests made with requests are counted and timed."""
+        ProfilingMiddleware(lambda request: None)
+        session = requests.Session()
+        session.mount('http://merchant.test/', _Adapter())
+        session.post('http://merchant.test/notify', json={'paid': True})
+        assert profile.http_requests == 1
+        assert profile.http_time > 0
+
+    def test_asgi_wrapper(self):
+        """Test that requests through the ASGI wrapper are recorded once, under the resolved view name."""
+        app = ProfilingASGIMiddleware(get_asgi_application())
+
+        async def scenario():
+            return await HttpCommunicator(app, 'GET', reverse('about')).get_response(timeout=10)
+
+        response = async_to_sync(scenario)()
+        assert response['status'] == 200
+        stats = profile_stats.snapshot()
+        assert list(stats) == ['about']
+        assert stats['about']['count'] == 1
+
+
+@pytest.mark.django_db
+class TestExport:
+    def test_metrics_endpoint(self, client):
+        """Test that /metrics exposes the profiles of each view, labelled with the worker process."""
+        client.get(reverse('about'))
+        body = client.get(reverse('metrics')).content.decode()
+
+        labels = f'view="about",process="{NODE}:{os.getpid()}"'
+        assert '# TYPE gateway_view_latency_seconds histogram' in body
+        assert f'gateway_view_latency_seconds_bucket{{{labels},le="+Inf"}} 1' in body
+        assert f'gateway_view_latency_seconds_count{{{labels}}} 1' in body
+        assert f'gateway_view_cache_misses_total{{{labels}}} ' in body
+
+    def test_not_exposed_when_disabled(self, settings, client):
+        """Test that /metrics leaves out the profiles when profiling is disabled."""
+        settings.PROFILING_ENABLED = False
+        assert 'gateway_view_latency_seconds' not in client.get(reverse('metrics')).content.decode()
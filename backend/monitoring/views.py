@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from .metrics import render_metrics, render_profile_stats
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose the gateway metrics in the Prometheus text format.
+
+    The values are shared by all worker processes through Redis, so scraping any worker returns
+    the totals. With PROFILING_ENABLED the request profiles of the worker answering are exposed as well.
+    Only the addresses in METRICS_ALLOWED_IPS may read the metrics, none if it is empty.
+
+    Returns:
+    - response (HttpResponse): text/plain exposition of all metrics, or 403 for other addresses.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    content = render_metrics()
+    if settings.PROFILING_ENABLED:
+        content += render_profile_stats()
+    return HttpResponse(content, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -8,6 +8,12 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
 django_asgi_app = get_asgi_application()
 
+from django.conf import settings
+from monitoring.middleware import ProfilingASGIMiddleware
+
+if settings.PROFILING_ENABLED:
+    django_asgi_app = ProfilingASGIMiddleware(django_asgi_app)
+
 import support.routing 
 
 application = ProtocolTypeRouter({
@@ -0,0 +1,172 @@
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.response import SimpleTemplateResponse
+
+# Cookie holding the time until which the reads of a browser that wrote go to the primary
+REPLICA_PIN_COOKIE = 'replica_pin'
+
+# Methods of requests which may read from a replica, all other requests use the primary throughout
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """
+    Routing of the reads of the current request, or of a read_from_replica() block.
+
+    Attributes:
+    - pinned (bool): Whether reads must stay on the primary, for unsafe requests and clients that wrote recently.
+    - use_replica (bool): Whether reads currently go to a replica.
+    - wrote (bool): Whether anything was written, which pins the following reads to the primary.
+    """
+    __slots__ = ('pinned', 'use_replica', 'wrote')
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Send the reads of the block to a replica, unless the request is pinned to the primary. Also used by
+    read-only code outside of requests (e.g. WebSocket consumers). A write in the block pins its remaining
+    reads to the primary.
+    """
+    state, token = _state.get(), None
+    if state is None:
+        state = RoutingState(pinned=False)
+        token = _state.set(state)
+    previous = state.use_replica
+    state.use_replica = not state.pinned and not state.wrote
+    try:
+        yield
+    finally:
+        state.use_replica = previous and not state.wrote
+        if token is not None:
+            _state.reset(token)
+
+
+def replica_reads(view):
+    """
+    Read a view from a replica with read_from_replica(). Only for heavy read paths which tolerate lagging
+    data: lookups such as tokens or orders being paid must see the latest writes. Template responses are
+    rendered in the block, as that is where their querysets are evaluated.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with read_from_replica():
+            response = view(request, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+        return response
+    return wrapper
+
+
+class ReplicaChangeListMixin:
+    """ ModelAdmin mixin reading the change list from a replica """
+    def changelist_view(self, request, extra_context=None):
+        return replica_reads(super().changelist_view)(request, extra_context)
+
+
+class ReplicaRouter:
+    """
+    Database router sending reads to the DATABASE_REPLICAS aliases and writes to the primary.
+
+    Reads only go to a replica in a read_from_replica() block (or a replica_reads view), and not in a
+    request that is pinned (see ReplicaMiddleware). Everywhere else, in transactions and after a write,
+    they go to the primary, so code reading data it is about to write never sees a lagging replica.
+    Migrations only run on the primary, replicas receive the schema by replication.
+    """
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS:
+            return None
+        # Related objects are read from the database their instance came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _state.get()
+        if state is None or not state.use_replica or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.use_replica = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _token_pin_key(request):
+    """ Cache key pinning the reads of an API client to the primary, derived from its Authorization header """
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return f"replica:pin:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+
+class ReplicaMiddleware:
+    """
+    Decide for each request whether its replica_reads views may read from a replica, with read-your-writes
+    stickiness.
+
+    Safe-method requests may read from a replica unless the client wrote within the last
+    REPLICA_STICKY_SECONDS. A request that writes pins the client to the primary for that long: browsers
+    through the replica_pin cookie, API clients through a cache entry keyed by their Authorization header,
+    as they usually keep no cookies. Removes itself when no replica is configured.
+    """
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def pinned(self, request):
+        try:
+            if float(request.COOKIES.get(REPLICA_PIN_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        key = _token_pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        seconds = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(REPLICA_PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds,
+                            secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax')
+        key = _token_pin_key(request)
+        if key is not None:
+            cache.set(key, 1, seconds)
+
+    def __call__(self, request):
+        state = RoutingState(pinned=request.method not in SAFE_METHODS or self.pinned(request))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            self.pin(request, response)
+        return response
@@ -54,9 +54,14 @@ INSTALLED_APPS = [
     "support.apps.SupportConfig",
     "payments.apps.PaymentsConfig",
     "bank.apps.BankConfig",
+    "monitoring.apps.MonitoringConfig",
 ]
 
 MIDDLEWARE = [
+    # Per-view profiling, first so that it measures the whole chain
+    "monitoring.middleware.ProfilingMiddleware",
+    # Read-replica pinning of clients that wrote, before anything reads the database
+    "payment_gateway.replicas.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -68,6 +73,7 @@ MIDDLEWARE = [
     "oauth2_provider.middleware.OAuth2TokenMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "monitoring.middleware.ApiMetricsMiddleware",
 ]
 
 ROOT_URLCONF = "payment_gateway.urls"
@@ -103,6 +109,21 @@ DATABASES = {
     }
 }
 
+# Read replicas (payment_gateway/replicas.py): reads of replica_reads views in GET/HEAD/OPTIONS requests
+# go to one of the DATABASE_REPLICAS aliases, unless the client wrote within the last REPLICA_STICKY_SECONDS.
+DATABASE_ROUTERS = ["payment_gateway.replicas.ReplicaRouter"]
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 10
+if os.environ.get("DATABASE_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ["DATABASE_REPLICA_NAME"],
+        "HOST": os.environ.get("DATABASE_REPLICA_HOST", DATABASES["default"].get("HOST", "")),
+        # Test runs read the replica through the test database of the primary
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS = ["replica"]
+
 # # # PostgreSQL
 # DATABASES = {
 #     "default": {
@@ -203,6 +224,16 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    # orjson based JSON rendering and parsing
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 # Model used for authentication
@@ -243,6 +274,42 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# Support chat: write-behind persistence of messages (support/buffer.py).
+# When enabled, messages are broadcast immediately and saved in batches of up to
+# SUPPORT_MESSAGE_FLUSH_SIZE, at the latest SUPPORT_MESSAGE_FLUSH_INTERVAL ms after they arrive.
+SUPPORT_MESSAGE_WRITE_BEHIND = os.environ.get("SUPPORT_MESSAGE_WRITE_BEHIND", "") == "1"
+SUPPORT_MESSAGE_FLUSH_INTERVAL = 200
+SUPPORT_MESSAGE_FLUSH_SIZE = 500
+# While the database is failing, retries back off up to SUPPORT_MESSAGE_RETRY_MAX ms and at most
+# SUPPORT_MESSAGE_BUFFER_MAX messages are kept in memory, the others are spooled
+SUPPORT_MESSAGE_RETRY_MAX = 30000
+SUPPORT_MESSAGE_BUFFER_MAX = 10000
+# Messages which could not be saved at shutdown or did not fit the buffer, replayed with
+# `manage.py replay_message_spool`
+SUPPORT_MESSAGE_SPOOL = BASE_DIR / "support_message_spool.jsonl"
+
+# Support chat: number of agents assigned to a new room, picked by their number of open rooms,
+# and minutes without an answer after which `manage.py escalate_support_rooms` adds another agent
+SUPPORT_AGENTS_PER_ROOM = 2
+SUPPORT_ESCALATION_AFTER = 15
+# Support chat: days after closing at which `manage.py archive_support_rooms` moves the messages
+# of a room into compressed archive chunks, and the number of messages per chunk
+SUPPORT_ARCHIVE_AFTER_DAYS = 30
+SUPPORT_ARCHIVE_CHUNK_SIZE = 1000
+
+# Per-view profiling (monitoring/middleware.py): latency, queries, cache and outbound HTTP per view name.
+# Off by default; PROFILING_SAMPLE_RATE is the fraction of requests profiled when enabled.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "") == "1"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "1.0"))
+# Addresses allowed to read /metrics (comma separated in the environment), loopback only by default
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip]
+# Seconds after which recording a metric in Redis gives up, so a stalled Redis does not hold up requests
+METRICS_REDIS_TIMEOUT = 0.1
+
+# Seconds the static pages of the accounts app (about, services, ...) are cached per language and
+# logged in/anonymous variant, 0 disables the cache. `manage.py clear_page_cache` drops them on deploy.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
 import django
 
 django.setup()
@@ -0,0 +1,43 @@
+from django.conf import settings
+
+
+class SharedStore:
+    """
+    Lazily created process-wide store of state shared by all worker processes and nodes.
+
+    Called, returns the store: redis_store built on the django_redis cache connection if the default
+    cache is Redis, local_store otherwise (development and tests), which only knows the state of its
+    own process.
+
+    Attributes:
+    - socket_timeout (float): Seconds after which Redis commands of the store fail, or None to share the
+                              cache connection, which waits as long as Redis takes.
+    - instance: The store once created, None before the first call.
+    """
+    def __init__(self, redis_store, local_store, socket_timeout=None):
+        self.redis_store = redis_store
+        self.local_store = local_store
+        self.socket_timeout = socket_timeout
+        self.instance = None
+
+    def __call__(self):
+        if self.instance is None:
+            if settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+                self.instance = self.redis_store(self._redis_connection())
+            else:
+                self.instance = self.local_store()
+        return self.instance
+
+    def _redis_connection(self):
+        from django_redis import get_redis_connection
+
+        connection = get_redis_connection('default')
+        if self.socket_timeout is None:
+            return connection
+        # Own pool to the same server, so that the timeout does not apply to the cache
+        pool = connection.connection_pool
+        return connection.__class__(connection_pool=pool.__class__(
+            connection_class=pool.connection_class,
+            **{**pool.connection_kwargs, 'socket_timeout': self.socket_timeout,
+               'socket_connect_timeout': self.socket_timeout},
+        ))
@@ -0,0 +1,161 @@
+import shutil
+import time
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from bank.models import Bank
+from django.template import engines
+from django.template.response import SimpleTemplateResponse
+from payment_gateway.replicas import (
+    REPLICA_PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, read_from_replica, replica_reads,
+)
+
+
+@pytest.fixture(scope='module')
+def replicas(django_db_blocker, tmp_path_factory):
+    """
+    Fixture replacing the database with a primary and a replica in two SQLite files. The replica is a
+    copy of the migrated primary, so it lags behind every write made afterwards, like a replica would.
+    """
+    path = tmp_path_factory.mktemp('replicas')
+    original = connections.settings['default']
+    with django_db_blocker.unblock():
+        connections['default'].close()
+        del connections['default']
+        connections.settings['default'] = {**original, 'NAME': str(path / 'primary.sqlite3')}
+        call_command('migrate', verbosity=0)
+        Bank.objects.create(first_name='Jan', last_name='Kowalski', country='PL', balance=0)
+        connections['default'].close()
+        shutil.copy(path / 'primary.sqlite3', path / 'replica.sqlite3')
+        connections.settings['replica'] = {**original, 'NAME': str(path / 'replica.sqlite3')}
+        try:
+            with override_settings(DATABASE_REPLICAS=['replica']):
+                yield
+        finally:
+            for alias in ('default', 'replica'):
+                connections[alias].close()
+                del connections[alias]
+            del connections.settings['replica']
+            connections.settings['default'] = original
+
+
+@pytest.fixture
+def written(replicas):
+    """
+    Fixture writing a bank account to the primary only. Usage: replica_count, primary_count = written
+    """
+    Bank.objects.create(first_name='Anna', last_name='Nowak', country='PL', balance=0)
+    return Bank.objects.using('replica').count(), Bank.objects.using('default').count()
+
+
+def _count(request):
+    return HttpResponse(str(Bank.objects.count()))
+
+
+_replica_count = replica_reads(_count)
+
+
+def _write_and_count(request):
+    Bank.objects.create(first_name='Jan', last_name='Kowalski', country='PL', balance=0)
+    return _count(request)
+
+
+def _call(view, method='get', **kwargs):
+    request = getattr(RequestFactory(), method)('/', **kwargs)
+    response = ReplicaMiddleware(view)(request)
+    return int(response.content), response
+
+
+class TestReplicaRouting:
+    def test_safe_request_reads_primary(self, written):
+        """Test that reads of a GET request go to the primary unless the view opts in."""
+        _, primary_count = written
+        assert _call(_count)[0] == primary_count
+
+    def test_replica_view_reads_replica(self, written):
+        """Test that reads of a replica_reads view go to the replica."""
+        replica_count, _ = written
+        assert _call(_replica_count)[0] == replica_count
+
+    def test_unsafe_request_reads_primary(self, written):
+        """Test that reads of a POST request go to the primary, even in a replica_reads view."""
+        _, primary_count = written
+        assert _call(_replica_count, 'post')[0] == primary_count
+
+    def test_template_response_rendered_on_replica(self, written):
+        """Test that template responses of a replica_reads view are rendered from the replica."""
+        replica_count, _ = written
+        template = engines['django'].from_string('{{ banks.count }}')
+
+        @replica_reads
+        def view(request):
+            return SimpleTemplateResponse(template, {'banks': Bank.objects.all()})
+        assert _call(view)[0] == replica_count
+
+    def test_write_pins_request(self, written):
+        """Test that reads after a write in the same request go to the primary."""
+        _, primary_count = written
+        assert _call(replica_reads(_write_and_count))[0] == primary_count + 1
+
+    def test_cookie_pins_client(self, written):
+        """Test that a write pins the following requests of the client to the primary until the cookie expires."""
+        replica_count, primary_count = written
+        _, response = _call(_write_and_count, 'post')
+        pin = response.cookies[REPLICA_PIN_COOKIE]
+        assert pin['httponly']
+
+        assert _call(_replica_count, HTTP_COOKIE=f'{REPLICA_PIN_COOKIE}={pin.value}')[0] == primary_count + 1
+        expired = int(time.time()) - 1
+        assert _call(_replica_count, HTTP_COOKIE=f'{REPLICA_PIN_COOKIE}={expired}')[0] == replica_count
+
+    def test_token_pins_client(self, written):
+        """Test that a write pins the following requests with the same Authorization header to the primary."""
+        replica_count, primary_count = written
+        cache.clear()
+        _call(_write_and_count, 'post', HTTP_AUTHORIZATION='Bearer token-a')
+
+        assert _call(_replica_count, HTTP_AUTHORIZATION='Bearer token-a')[0] == primary_count + 1
+        assert _call(_replica_count, HTTP_AUTHORIZATION='Bearer token-b')[0] == replica_count
+
+    def test_atomic_block_reads_primary(self, written):
+        """Test that reads in a transaction go to the primary."""
+        _, primary_count = written
+
+        @replica_reads
+        def view(request):
+            with transaction.atomic():
+                return _count(request)
+        assert _call(view)[0] == primary_count
+
+    def test_read_from_replica(self, written):
+        """Test that read_from_replica() sends reads outside of requests to the replica."""
+        replica_count, primary_count = written
+        with read_from_replica():
+            assert Bank.objects.count() == replica_count
+        assert Bank.objects.count() == primary_count
+
+    def test_related_objects_follow_instance(self, written):
+        """Test that related objects are read from the database their instance was read from."""
+        with read_from_replica():
+            bank = Bank.objects.first()
+        assert ReplicaRouter().db_for_read(Bank, instance=bank) == 'replica'
+
+
+class TestWithoutReplicas:
+    @pytest.fixture(autouse=True)
+    def no_replicas(self, settings):
+        settings.DATABASE_REPLICAS = []
+
+    def test_router_leaves_reads(self):
+        """Test that without replicas the router leaves reads to the default database."""
+        with read_from_replica():
+            assert ReplicaRouter().db_for_read(Bank) is None
+
+    def test_middleware_not_used(self):
+        """Test that without replicas the middleware removes itself."""
+        with pytest.raises(MiddlewareNotUsed):
+            ReplicaMiddleware(_count)
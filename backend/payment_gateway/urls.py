@@ -29,6 +29,7 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),
     path('api/', include('api.urls', namespace='api')),
     path("i18n/", include("django.conf.urls.i18n")),
+    path('', include('monitoring.urls')),
     
 ] 
 
@@ -1,9 +1,11 @@
+from django import forms
 from django.contrib import admin
-from .models import Order, Product, Client
+from payment_gateway.replicas import ReplicaChangeListMixin
+from .models import Order, OrderItem, Product, Client
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """
     Admin class for the Client model.
 
@@ -20,31 +22,73 @@ class ClientAdmin(admin.ModelAdmin):
     list_display = ["name", "surname", "email"]
 
 
+class ProductAdminForm(forms.ModelForm):
+    """
+    Admin form of a product, rejecting a name or SKU under which the merchant's catalog
+    already has another product.
+    """
+    class Meta:
+        model = Product
+        fields = ["profile", "name", "sku"]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        profile, name = cleaned_data.get('profile'), cleaned_data.get('name')
+        if profile is None or name is None:
+            return cleaned_data
+
+        sku = cleaned_data.get('sku') or ''
+        fingerprint = Product.make_fingerprint(name, sku)
+        if Product.objects.filter(profile=profile, fingerprint=fingerprint).exclude(pk=self.instance.pk).exists():
+            # Products are told apart by their SKU, or by their name if they have none
+            field = 'sku' if sku.strip() else 'name'
+            self.add_error(field, f"The catalog of this merchant already has a product with this {field}.")
+        self.instance.fingerprint = fingerprint
+        return cleaned_data
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """
     Admin class for the Product model.
 
     Fields:
+    - profile
     - name
-    - quantity
+    - sku
     List Display:
     - name
-    - quantity
+    - sku
+    - profile
+    """
+    form = ProductAdminForm
+    fields = ["profile", "name", "sku"]
+    list_display = ["name", "sku", "profile"]
+    list_select_related = ["profile"]
+    search_fields = ["name", "sku"]
+
+
+class OrderItemInline(admin.TabularInline):
+    """
+    Inline admin class for the line items of an order.
     """
-    fields = ["name", "quantity"]
-    list_display = ["name", "quantity"]
+    model = OrderItem
+    fields = ["product", "quantity", "price"]
+    raw_id_fields = ["product"]
+    extra = 0
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """
     Admin class for the Order model.
 
     Attributes:
     - fields (list): List of fields to be displayed and edited in the admin panel.
     - list_display (list): List of fields to be displayed in the list view of the admin panel.
+    - inlines (list): Line items of the order edited on the order page.
     """
-    fields = ["profile", "client", "products", "order_id", "total", "is_paid", "link", "redirect_link"]
+    fields = ["profile", "client", "order_id", "total", "is_paid", "link", "redirect_link"]
+    inlines = [OrderItemInline]
     list_display = ["profile", "client", "order_id", "total",
                     "is_paid", "date_of_order", "date_of_payment", "redirect_link"]
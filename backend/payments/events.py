@@ -0,0 +1,37 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def order_status_group(profile_id):
+    """
+    Returns the name of the channel layer group receiving status changes of the merchant's orders.
+    """
+    return f"order_status_{profile_id}"
+
+
+def order_status_event(order):
+    """
+    Returns the payment status of the order as a channel layer message.
+    """
+    return {
+        'type': 'order.status',
+        'id': order.id,
+        'order_id': order.order_id,
+        'is_paid': order.is_paid,
+        'date_of_payment': order.date_of_payment.isoformat() if order.date_of_payment else None,
+    }
+
+
+def publish_order_status(order):
+    """
+    Sends the payment status of the order to the merchant's subscribers.
+
+    A channel layer failure is only logged, it must not affect the payment itself.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(order_status_group(order.profile_id), order_status_event(order))
+    except Exception:
+        logger.exception("Could not publish the status of order %s", order.id)
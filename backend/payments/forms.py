@@ -17,6 +17,7 @@ class CardForm(forms.Form):
 
     Methods:
         clean_id_card(self): A method to validate the credit card number and determine its type (Visa or MasterCard).
+        failure_reason(self): A method returning why the card data was rejected.
     """
 
     id_card = forms.CharField(label='ID Card', max_length=16, min_length=16, widget=forms.TextInput(attrs={'placeholder': '1234567890123456'}),
@@ -33,6 +34,21 @@ class CardForm(forms.Form):
     )
     cvc = forms.CharField(max_length=3, widget=forms.PasswordInput(attrs={'placeholder': '***'}), )
 
+    # Codes of the card check errors, reported as payment failure reasons
+    FAILURE_REASONS = ('unsupported_card', 'card_not_found', 'wrong_cvc', 'wrong_expiry')
+
+    def failure_reason(self):
+        """
+        Returns the reason the card data was rejected, for the payment metrics: the code of the first
+        failed card check in the order the checks run, or "invalid_card_data" for malformed input.
+        """
+        errors = self.errors.as_data()
+        for field in ('id_card', 'cvc', 'valid_until'):
+            for error in errors.get(field, []):
+                if error.code in self.FAILURE_REASONS:
+                    return error.code
+        return 'invalid_card_data'
+
     def clean_id_card(self):
         """
         Clean method for validating the credit card number and checking if the card exists.
@@ -44,19 +60,19 @@ class CardForm(forms.Form):
 
         # Check if card starts with '4' (Visa) or '5' (MasterCard)
         if not id_card.startswith('4') and not id_card.startswith('5'):
-            raise ValidationError(_("Unsupported card type"))
+            raise ValidationError(_("Unsupported card type"), code="unsupported_card")
 
         # Check if the card exists in the database
         if id_card.startswith('4'):
             try:
                 card = Visa.objects.get(id_card=id_card)
             except Visa.DoesNotExist:
-                raise ValidationError(_("Card not found in our system."))
+                raise ValidationError(_("Card not found in our system."), code="card_not_found")
         elif id_card.startswith('5'):
             try:
                 card = MasterCard.objects.get(id_card=id_card)
             except MasterCard.DoesNotExist:
-                raise ValidationError(_("Card not found in our system."))
+                raise ValidationError(_("Card not found in our system."), code="card_not_found")
         
         return id_card
     
@@ -77,11 +93,11 @@ class CardForm(forms.Form):
         if id_card.startswith('4'):
             card = Visa.objects.get(id_card=id_card)
             if card.cvc != cvc:
-                raise ValidationError(_("Wrong CVC"))
+                raise ValidationError(_("Wrong CVC"), code="wrong_cvc")
         elif id_card.startswith('5'):  # If the card starts with '5' (MasterCard)
             card = MasterCard.objects.get(id_card=id_card)
             if card.cvc != cvc:
-                raise ValidationError(_("Wrong CVC"))
+                raise ValidationError(_("Wrong CVC"), code="wrong_cvc")
                 
         return cvc
     
@@ -102,10 +118,10 @@ class CardForm(forms.Form):
         if id_card.startswith('4'):
             card = Visa.objects.get(id_card=id_card)
             if card.valid_until != valid_until:
-                raise ValidationError(_("Wrong Expiry"))
+                raise ValidationError(_("Wrong Expiry"), code="wrong_expiry")
         elif id_card.startswith('5'):  # If the card starts with '5' (MasterCard)
             card = MasterCard.objects.get(id_card=id_card)
             if card.valid_until != valid_until:
-                raise ValidationError(_("Wrong Expiry"))
+                raise ValidationError(_("Wrong Expiry"), code="wrong_expiry")
                 
         return valid_until
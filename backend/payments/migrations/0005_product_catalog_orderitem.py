@@ -0,0 +1,77 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+
+
+def make_fingerprint(name):
+    # Same key as Product.make_fingerprint for products without a SKU
+    key = f"name:{' '.join(name.split()).lower()}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def move_products_to_catalog(apps, schema_editor):
+    """
+    Replace the per-order Product rows with one catalog product per merchant and
+    product name, keeping the ordered quantities on the new OrderItem line items.
+    """
+    Order = apps.get_model('payments', 'Order')
+    Product = apps.get_model('payments', 'Product')
+    OrderItem = apps.get_model('payments', 'OrderItem')
+
+    catalog = {}
+    items = []
+    for order in Order.objects.prefetch_related('products').order_by('id').iterator(chunk_size=500):
+        for product in order.products.all():
+            key = (order.profile_id, make_fingerprint(product.name))
+            if key not in catalog:
+                catalog[key] = Product.objects.create(profile_id=order.profile_id, name=product.name,
+                                                      fingerprint=key[1])
+            items.append(OrderItem(order_id=order.id, product_id=catalog[key].id, quantity=product.quantity))
+        if len(items) >= 500:
+            OrderItem.objects.bulk_create(items)
+            items = []
+    OrderItem.objects.bulk_create(items)
+
+    # Per-order rows are no longer referenced by anything
+    Product.objects.filter(profile__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0004_order_redirect_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='profile',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='payments.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='payments.product')),
+            ],
+        ),
+        migrations.RunPython(move_products_to_catalog, migrations.RunPython.noop),
+    ]
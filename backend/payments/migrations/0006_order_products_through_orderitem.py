@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0005_product_catalog_orderitem'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(through='payments.OrderItem', to='payments.product'),
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='quantity',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('profile', 'fingerprint'), name='unique_product_fingerprint'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_existing_orders(apps, schema_editor):
+    """
+    Give the existing orders of each merchant consecutive sequence numbers in the order they were created.
+    """
+    Order = apps.get_model('payments', 'Order')
+    OrderSequence = apps.get_model('payments', 'OrderSequence')
+
+    sequences = {}
+    batch = []
+    for order in Order.objects.only('id', 'profile_id').order_by('id').iterator(chunk_size=2000):
+        sequences[order.profile_id] = sequences.get(order.profile_id, 0) + 1
+        order.updated_seq = sequences[order.profile_id]
+        batch.append(order)
+        if len(batch) >= 2000:
+            Order.objects.bulk_update(batch, ['updated_seq'])
+            batch = []
+    Order.objects.bulk_update(batch, ['updated_seq'])
+    OrderSequence.objects.bulk_create(
+        [OrderSequence(profile_id=profile_id, value=value) for profile_id, value in sequences.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_profile_url_feedback'),
+        ('payments', '0006_order_products_through_orderitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSequence',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['profile', 'updated_seq'], name='order_profile_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_orders, migrations.RunPython.noop),
+    ]
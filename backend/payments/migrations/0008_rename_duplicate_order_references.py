@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:43
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def rename_duplicate_references(apps, schema_editor):
+    """
+    Keep the oldest order of each repeated (profile, order_id) pair and suffix the
+    order_id of the others with their own ID, so the pair can be made unique.
+    """
+    Order = apps.get_model('payments', 'Order')
+
+    duplicates = (
+        Order.objects
+        .values('profile_id', 'order_id')
+        .annotate(count=Count('id'), first_id=Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        orders = Order.objects.filter(
+            profile_id=duplicate['profile_id'], order_id=duplicate['order_id']
+        ).exclude(id=duplicate['first_id'])
+        for order in orders:
+            order.order_id = f"{order.order_id[:230]}#{order.id}"
+            order.save(update_fields=['order_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_order_updated_seq'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_references, migrations.RunPython.noop),
+    ]
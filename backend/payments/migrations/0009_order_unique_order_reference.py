@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_rename_duplicate_order_references'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('profile', 'order_id'), name='unique_order_reference'),
+        ),
+    ]
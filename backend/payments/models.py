@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from accounts.models import Profile
+from .events import publish_order_status
+import hashlib
 import uuid
 
 class Client(models.Model):
@@ -26,20 +32,102 @@ class Client(models.Model):
 
 class Product(models.Model):
     """
-    Model representing a product.
+    Model representing a product of a merchant's catalog.
+
+    Products are shared by all orders of the merchant, the ordered quantity and price
+    are stored on the OrderItem line items.
 
     Attributes:
+    - profile (ForeignKey): Merchant owning the product.
     - name (CharField): Product name.
-    - quantity (PositiveIntegerField): Quantity of products.
+    - sku (CharField): Merchant's stock keeping unit (optional).
+    - fingerprint (CharField): Hash identifying the product in the merchant's catalog.
     """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=255)
-    quantity = models.PositiveIntegerField(default=1)
+    sku = models.CharField(max_length=100, blank=True, default='')
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'fingerprint'], name='unique_product_fingerprint'),
+        ]
 
     def __str__(self) -> str:
         """
         Returns a string representation of the product.
         """
-        return f"{self.name} X {self.quantity}"
+        return self.name
+
+    @staticmethod
+    def make_fingerprint(name, sku=''):
+        """
+        Returns the catalog key of a product - the hash of its SKU or, without a SKU,
+        of its whitespace and case normalized name.
+        """
+        key = f"sku:{sku.strip()}" if sku and sku.strip() else f"name:{' '.join(name.split()).lower()}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def from_catalog(cls, profile, products_data):
+        """
+        Returns the catalog products of the merchant matching the given product data,
+        adding the missing ones to the catalog.
+
+        Args:
+        - profile (Profile): Merchant owning the catalog.
+        - products_data (iterable of dict): Product data with 'name' and optional 'sku' keys.
+
+        Returns:
+        - dict: Products keyed by their fingerprint.
+        """
+        wanted = {}
+        for product_data in products_data:
+            fingerprint = cls.make_fingerprint(product_data['name'], product_data.get('sku', ''))
+            wanted.setdefault(fingerprint, product_data)
+
+        catalog = {product.fingerprint: product
+                   for product in cls.objects.filter(profile=profile, fingerprint__in=wanted)}
+        missing = [cls(profile=profile, fingerprint=fingerprint, name=product_data['name'],
+                       sku=product_data.get('sku', ''))
+                   for fingerprint, product_data in wanted.items() if fingerprint not in catalog]
+        if missing:
+            # Products added concurrently by another request are skipped and read back below
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            catalog.update((product.fingerprint, product) for product in cls.objects.filter(
+                profile=profile, fingerprint__in=[product.fingerprint for product in missing]))
+        return catalog
+
+
+class OrderSequence(models.Model):
+    """
+    Model holding the last change sequence number assigned to the orders of a merchant.
+
+    Attributes:
+    - profile (OneToOneField): Link to the User model.
+    - value (BigIntegerField): Last assigned sequence number.
+    """
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def allocate(cls, profile_id, count=1):
+        """
+        Reserves count consecutive sequence numbers for the merchant and returns the last one.
+
+        The counter row stays locked until the surrounding transaction commits, so changes of
+        a merchant's orders become visible in the order of their sequence numbers.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(profile_id=profile_id).update(value=F('value') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(profile_id=profile_id, value=count)
+                        return count
+                except IntegrityError:
+                    # Created concurrently by another transaction
+                    cls.objects.filter(profile_id=profile_id).update(value=F('value') + count)
+            return cls.objects.values_list('value', flat=True).get(profile_id=profile_id)
 
 
 class Order(models.Model):
@@ -48,17 +136,19 @@ class Order(models.Model):
 
     Attributes:
     - client (ForeignKey): Link to the Client model.
-    - products (ManyToManyField): Link to the Product model.
+    - products (ManyToManyField): Link to the Product model through the OrderItem line items.
     - profile (ForeignKey): Link to the User model.
+    - order_id (CharField): Merchant's own reference of the order, unique per merchant.
     - total (DecimalField): Order total.
     - is_paid (BooleanField): Payment status.
     - date_of_order (DateTimeField): Order placement date.
     - date_of_payment (DateTimeField): Payment date for the order.
     - link (SlugField): Unique slug field for generating order links.
+    - updated_seq (BigIntegerField): Change sequence number of the last modification, increasing per merchant.
     """
 
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through='OrderItem')
     profile = models.ForeignKey(Profile,
                                 on_delete=models.CASCADE,)
     order_id = models.CharField(max_length=255)
@@ -68,17 +158,99 @@ class Order(models.Model):
     date_of_payment = models.DateTimeField(null=True, blank=True)
     link = models.SlugField(max_length=100, unique=True, null=True)
     redirect_link = models.SlugField(max_length=200, blank=True, null=True)
+    updated_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile', 'updated_seq'], name='order_profile_seq_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'order_id'], name='unique_order_reference'),
+        ]
 
     def __str__(self) -> str:
         """
         Returns a string representation of the order.
         """
         return f"Order  {self.id} - {self.client}"
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the order with the next change sequence number of its merchant.
+        """
+        with transaction.atomic():
+            self.updated_seq = OrderSequence.allocate(self.profile_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_seq'}
+            super().save(*args, **kwargs)
     
     def mark_as_paid(self):
         """
-        Updates the payment date of the order to the current moment.
+        Updates the payment date of the order to the current moment and publishes the new status.
         """
         self.is_paid = True
         self.date_of_payment = timezone.now()
         self.save()
+        # Notify the merchant's status subscribers once the payment is committed
+        transaction.on_commit(lambda: publish_order_status(self))
+
+
+class OrderItem(models.Model):
+    """
+    Model representing a line item of an order.
+
+    Attributes:
+    - order (ForeignKey): Link to the Order model.
+    - product (ForeignKey): Link to the catalog Product model.
+    - quantity (PositiveIntegerField): Quantity of products.
+    - price (DecimalField): Unit price of the product in the order.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the line item.
+        """
+        return f"{self.product.name} X {self.quantity}"
+
+
+def _orders_version_key(profile_id):
+    return f"orders:etag:{profile_id}"
+
+
+def get_orders_version(profile_id):
+    """
+    Returns the version describing the current state of the merchant's orders.
+
+    The version is kept in the cache, so it can be used to validate conditional requests without
+    touching the orders table. If it is missing, a new version is started.
+    """
+    version = cache.get(_orders_version_key(profile_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_orders_version_key(profile_id), version, None):
+            version = cache.get(_orders_version_key(profile_id), version)
+    return version
+
+
+def bump_orders_version(profile_id):
+    """
+    Starts a new version of the merchant's orders once the current transaction commits.
+    """
+    transaction.on_commit(lambda: cache.set(_orders_version_key(profile_id), uuid.uuid4().hex, None))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    bump_orders_version(instance.profile_id)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, created, update_fields=None, **kwargs):
+    # The merchant's profile is part of every order payload, its login time is not
+    if not created and update_fields != {'last_login'}:
+        bump_orders_version(instance.pk)
@@ -0,0 +1,66 @@
+import pytest
+from django.urls import reverse
+from accounts.models import Profile
+from payments.models import Product
+
+
+@pytest.fixture
+def catalog_admin(client, db):
+    """
+    Fixture providing a client logged in as a superuser, and a merchant with two catalog products.
+    Usage: client, merchant = catalog_admin
+    """
+    admin = Profile.objects.create_superuser(username='admin', password='adminpass123', email='admin@example.com')
+    client.force_login(admin)
+    merchant = Profile.objects.create_user(username='merchant', password='merchantpass123')
+    for name, sku in (('Shoes', ''), ('Hat', 'HAT-1')):
+        Product.objects.create(profile=merchant, name=name, sku=sku, fingerprint=Product.make_fingerprint(name, sku))
+    return client, merchant
+
+
+def _change(client, product, **data):
+    return client.post(reverse('admin:payments_product_change', args=[product.pk]),
+                       {'profile': product.profile_id, 'name': product.name, 'sku': product.sku, **data})
+
+
+@pytest.mark.django_db
+class TestProductAdmin:
+    def test_rename(self, catalog_admin):
+        """Test that renaming a product updates its catalog fingerprint."""
+        client, merchant = catalog_admin
+        product = Product.objects.get(name='Shoes')
+        response = _change(client, product, name='Running shoes')
+
+        assert response.status_code == 302
+        product.refresh_from_db()
+        assert product.fingerprint == Product.make_fingerprint('Running shoes')
+
+    def test_rename_to_existing_name(self, catalog_admin):
+        """Test that renaming a product to the name of another product of the catalog is a form error."""
+        client, merchant = catalog_admin
+        Product.objects.create(profile=merchant, name='Boots', fingerprint=Product.make_fingerprint('Boots'))
+        product = Product.objects.get(name='Shoes')
+        response = _change(client, product, name=' boots ')
+
+        assert response.status_code == 200
+        assert 'name' in response.context['adminform'].form.errors
+        product.refresh_from_db()
+        assert product.name == 'Shoes'
+
+    def test_existing_sku(self, catalog_admin):
+        """Test that giving a product the SKU of another product of the catalog is a form error."""
+        client, merchant = catalog_admin
+        response = _change(client, Product.objects.get(name='Shoes'), sku='HAT-1')
+
+        assert response.status_code == 200
+        assert 'sku' in response.context['adminform'].form.errors
+
+    def test_same_name_for_other_merchant(self, catalog_admin):
+        """Test that products of other merchants may have the same name."""
+        client, _ = catalog_admin
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        response = client.post(reverse('admin:payments_product_add'),
+                               {'profile': other.pk, 'name': 'Shoes', 'sku': ''})
+
+        assert response.status_code == 302
+        assert Product.objects.filter(name='Shoes').count() == 2
@@ -4,6 +4,8 @@ from .models import Order
 from .forms import CardForm
 from bank.models import Transaction, Visa, MasterCard
 from oauth2_provider.models import Application
+from monitoring.metrics import PAYMENTS_FAILED, PAYMENTS_PROCESSED, WEBHOOK_DELIVERY
+from time import perf_counter
 import requests
 
 
@@ -28,7 +30,7 @@ def payment_card(request, order_id, link_uuid):
     """
 
     # Retrieve the order or return a 404 error if the order doesn't exist
-    order = get_object_or_404(Order, id=order_id,)
+    order = get_object_or_404(Order.objects.prefetch_related('items__product'), id=order_id,)
 
     if request.method == 'POST':
         # If the request is a POST, process the credit card data form
@@ -44,6 +46,7 @@ def payment_card(request, order_id, link_uuid):
             elif cd['id_card'][0]=='5':     
                 card_model = MasterCard
             else:
+                PAYMENTS_FAILED.inc(reason='unsupported_card')
                 return render(request, 'payments/error.html', {'error_message': "Unsupported card type"})
                 
             try:
@@ -59,6 +62,7 @@ def payment_card(request, order_id, link_uuid):
                     )
                 app = Application.objects.get(user=order.profile)     
                 order.mark_as_paid()    
+                PAYMENTS_PROCESSED.inc()
                 # Sending information to the application about payment for a given order
                 payment_data = {
                         'order_id': order.order_id,
@@ -68,7 +72,13 @@ def payment_card(request, order_id, link_uuid):
                             'Content-Type': 'application/json'
                         }
                 # Verify only dev mode 
-                response = requests.post(app.redirect_uris, json=payment_data, headers=headers, verify=False)
+                start = perf_counter()
+                try:
+                    response = requests.post(app.redirect_uris, json=payment_data, headers=headers, verify=False)
+                except requests.RequestException:
+                    WEBHOOK_DELIVERY.observe(perf_counter() - start, status='error')
+                    raise
+                WEBHOOK_DELIVERY.observe(perf_counter() - start, status=response.status_code)
                 if response.status_code == 200:
                     order.redirect_link = response.json().get("redirect_link")
                     order.save()
@@ -79,13 +89,18 @@ def payment_card(request, order_id, link_uuid):
             except requests.HTTPError as e:
                 return render(request, 'payments/error.html', {"Error HTTP:", e})
             except card_model.DoesNotExist:
+                PAYMENTS_FAILED.inc(reason='card_not_found')
                 return render(request, 'payments/error.html', {'error_message': "Card not found"})
             except ValidationError as e:
+                # Raised by Transaction.save with the "insufficient_funds" or "same_account" code
+                PAYMENTS_FAILED.inc(reason=e.code if e.code in ('insufficient_funds', 'same_account') else 'error')
                 return render(request, 'payments/error.html', {'error_message': str(e)})
             except Exception as e:
+                if not order.is_paid:
+                    PAYMENTS_FAILED.inc(reason='error')
                 return render(request, 'payments/error.html', {'error_message':e })
         else:
-            
+            PAYMENTS_FAILED.inc(reason=form.failure_reason())
             return render(request, 'payments/card.html', {
                 'form': form, 
                 'order': order, 
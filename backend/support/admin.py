@@ -1,8 +1,9 @@
 from django.contrib import admin
+from payment_gateway.replicas import ReplicaChangeListMixin
 from .models import SupportRoom, Message
 
 @admin.register(SupportRoom)
-class SupportRoomAdmin(admin.ModelAdmin):
+class SupportRoomAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ['uuid', 'title',
                     'status', 'created_at', 'user']
     search_fields = ['user', 'title', 'status', 'created_at']
@@ -10,7 +11,7 @@ class SupportRoomAdmin(admin.ModelAdmin):
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ['content', 'timestamp',
                     'chat', 'sender']
     search_fields = ['sender', 'chat', 'timestamp']
\ No newline at end of file
@@ -0,0 +1,95 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .assignment import OPEN_STATUSES
+from .models import ArchivedMessages, Message, SupportRoom
+
+
+def compress_messages(entries):
+    """ Returns the archive blob of a list of message entries """
+    return zlib.compress(json.dumps(entries, separators=(',', ':')).encode())
+
+
+def decompress_messages(data):
+    """ Returns the message entries of an archive blob, oldest first """
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def rooms_to_archive(days=None):
+    """
+    Returns the IDs of the rooms closed for more than `days` (SUPPORT_ARCHIVE_AFTER_DAYS by default)
+    which still have messages in the Message table.
+    """
+    days = settings.SUPPORT_ARCHIVE_AFTER_DAYS if days is None else days
+    return list(SupportRoom.objects
+                .exclude(status__in=OPEN_STATUSES)
+                .filter(closed_at__lt=timezone.now() - timedelta(days=days), messages__isnull=False)
+                .values_list('id', flat=True)
+                .distinct())
+
+
+def archive_room(room_id, chunk_size=None):
+    """
+    Move the messages of a room into compressed ArchivedMessages chunks, oldest messages first.
+
+    Every chunk of `chunk_size` (SUPPORT_ARCHIVE_CHUNK_SIZE by default) messages is written and
+    deleted from the Message table in its own short transaction, so no lock is held for long and
+    an interrupted run leaves a consistent history which the next run continues.
+
+    Returns:
+    - int: Number of archived messages.
+    """
+    chunk_size = settings.SUPPORT_ARCHIVE_CHUNK_SIZE if chunk_size is None else chunk_size
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Message.objects
+                        .filter(chat_id=room_id)
+                        .order_by('timestamp', 'id')
+                        .values_list('id', 'sender_id', 'sender__username', 'content', 'timestamp')[:chunk_size])
+            if not rows:
+                return archived
+            ArchivedMessages.objects.create(
+                room_id=room_id,
+                data=compress_messages([{
+                    'id': message_id,
+                    'sender_id': sender_id,
+                    'sender': sender,
+                    'content': content,
+                    'timestamp': timestamp.isoformat(),
+                } for message_id, sender_id, sender, content, timestamp in rows]),
+                message_count=len(rows),
+                first_timestamp=rows[0][4],
+                last_timestamp=rows[-1][4],
+                last_id=rows[-1][0],
+            )
+            Message.objects.filter(id__in=[row[0] for row in rows]).delete()
+        archived += len(rows)
+
+
+def archived_history(room_id, before=None, limit=50):
+    """
+    Returns up to `limit` archived messages of a room, newest first, older than the (timestamp, id)
+    cursor if one is given. Only the chunks needed for the page are read and decompressed.
+
+    Returns:
+    - list of dict: id, sender, content and timestamp (datetime) of the messages.
+    """
+    chunks = ArchivedMessages.objects.filter(room_id=room_id).order_by('-last_timestamp', '-last_id')
+    if before is not None:
+        chunks = chunks.filter(first_timestamp__lte=before[0])
+
+    messages = []
+    for data, in chunks.values_list('data').iterator(chunk_size=4):
+        for entry in reversed(decompress_messages(data)):
+            timestamp = datetime.fromisoformat(entry['timestamp'])
+            if before is not None and (timestamp, entry['id']) >= before:
+                continue
+            messages.append({'id': entry['id'], 'sender': entry['sender'], 'content': entry['content'],
+                             'timestamp': timestamp})
+            if len(messages) == limit:
+                return messages
+    return messages
@@ -0,0 +1,160 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q
+
+# Statuses of rooms which still need an agent, they count towards the load of their agents
+OPEN_STATUSES = ('Created', 'Pending')
+
+# Seconds a load counter is kept. Counters are rebuilt from the database once expired, which corrects
+# drift from changes that bypass the model (e.g. status updates through QuerySet.update())
+AGENT_LOAD_CACHE_TIMEOUT = 3600
+
+
+def _load_key(agent_id):
+    return f"support_agent_load_{agent_id}"
+
+
+def get_agent_loads(agent_ids):
+    """
+    Returns the number of open rooms of each agent.
+
+    Loads are kept in cache counters, updated when rooms are opened, closed or deleted and when
+    their admins change. Counters missing from the cache are rebuilt from the database with a
+    single query for all of them, and expire after AGENT_LOAD_CACHE_TIMEOUT.
+
+    Returns:
+    - dict: Agent ID -> number of open rooms assigned to the agent.
+    """
+    from .models import SupportRoom
+
+    cached = cache.get_many([_load_key(agent_id) for agent_id in agent_ids])
+    loads = {agent_id: cached[_load_key(agent_id)] for agent_id in agent_ids if _load_key(agent_id) in cached}
+    missing = [agent_id for agent_id in agent_ids if agent_id not in loads]
+    if missing:
+        counted = dict(SupportRoom.admins.through.objects
+                       .filter(profile_id__in=missing, supportroom__status__in=OPEN_STATUSES)
+                       .values_list('profile_id')
+                       .annotate(rooms=Count('id')))
+        rebuilt = {agent_id: counted.get(agent_id, 0) for agent_id in missing}
+        cache.set_many({_load_key(agent_id): load for agent_id, load in rebuilt.items()}, AGENT_LOAD_CACHE_TIMEOUT)
+        loads.update(rebuilt)
+    return loads
+
+
+def _change_loads(agent_ids, delta):
+    for agent_id in agent_ids:
+        try:
+            cache.incr(_load_key(agent_id), delta)
+        except ValueError:
+            # Not cached, the counter is rebuilt from the database when read next
+            pass
+
+
+def assign_agents(room, count=None, exclude=()):
+    """
+    Assign the least loaded active staff users to the room.
+
+    Args:
+    - room (SupportRoom): The room, already saved.
+    - count (int): Number of agents to add, SUPPORT_AGENTS_PER_ROOM by default.
+    - exclude (iterable of int): IDs of agents which must not be picked, e.g. the current ones.
+
+    Returns:
+    - list of int: IDs of the assigned agents.
+    """
+    UserModel = apps.get_model(settings.AUTH_USER_MODEL)
+    count = settings.SUPPORT_AGENTS_PER_ROOM if count is None else count
+    candidates = list(UserModel.objects
+                      .filter(is_staff=True, is_active=True)
+                      .exclude(id__in=[room.user_id, *exclude])
+                      .values_list('id', flat=True))
+    if not candidates or count <= 0:
+        return []
+
+    loads = get_agent_loads(candidates)
+    agents = sorted(candidates, key=lambda agent_id: (loads[agent_id], agent_id))[:count]
+    # Their loads are increased by admins_changed()
+    room.admins.add(*agents)
+    return agents
+
+
+def release_agents(room):
+    """
+    Decrease the load of the agents of a room which was resolved or closed.
+    """
+    _change_loads(room.admins.values_list('id', flat=True), -1)
+
+
+def reopen_agents(room):
+    """
+    Increase the load of the agents of a room which was opened again.
+    """
+    _change_loads(room.admins.values_list('id', flat=True), 1)
+
+
+def admins_changed(instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the loads of agents added to or removed from open rooms, by assign_agents() or elsewhere
+    (e.g. the admin). Handler of the m2m_changed signal of SupportRoom.admins.
+    """
+    from .models import SupportRoom
+
+    if action == 'pre_clear':
+        # What is cleared cannot be read anymore afterwards
+        if reverse:
+            instance._cleared_open_rooms = SupportRoom.objects.filter(admins=instance, status__in=OPEN_STATUSES).count()
+        elif instance.status in OPEN_STATUSES:
+            instance._cleared_admins = list(instance.admins.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        # The agent is the instance, the rooms are in pk_set
+        if action == 'post_clear':
+            rooms = instance.__dict__.pop('_cleared_open_rooms', 0)
+        else:
+            rooms = SupportRoom.objects.filter(id__in=pk_set, status__in=OPEN_STATUSES).count()
+        if rooms:
+            _change_loads([instance.pk], delta * rooms)
+    elif action == 'post_clear':
+        _change_loads(instance.__dict__.pop('_cleared_admins', []), -1)
+    elif instance.status in OPEN_STATUSES:
+        _change_loads(pk_set, delta)
+
+
+def room_deleting(instance, **kwargs):
+    """
+    Remember the agents of an open room being deleted, whose admins are deleted without m2m_changed.
+    Handler of the pre_delete signal of SupportRoom.
+    """
+    if instance.status in OPEN_STATUSES:
+        instance._deleted_admins = list(instance.admins.values_list('id', flat=True))
+
+
+def room_deleted(instance, **kwargs):
+    """
+    Decrease the load of the agents of a deleted open room. Handler of the post_delete signal of SupportRoom.
+    """
+    _change_loads(instance.__dict__.pop('_deleted_admins', []), -1)
+
+
+def unanswered_rooms(since):
+    """
+    Returns the open rooms whose owner has been waiting for an answer since before the given time
+    and which were not escalated after that time.
+
+    A room is waiting when its latest message of the owner is newer than the latest message of
+    anyone else.
+    """
+    from .models import SupportRoom
+
+    return (SupportRoom.objects
+            .filter(status__in=OPEN_STATUSES)
+            .filter(Q(escalated_at__isnull=True) | Q(escalated_at__lt=since))
+            .alias(last_question=Max('messages__timestamp', filter=Q(messages__sender=F('user'))),
+                   last_answer=Max('messages__timestamp', filter=~Q(messages__sender=F('user'))))
+            .filter(last_question__lt=since)
+            .filter(Q(last_answer__isnull=True) | Q(last_answer__lt=F('last_question'))))
@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+from .models import Message, invalidate_rooms
+
+logger = logging.getLogger(__name__)
+
+# Errors of the database rejecting a message itself, which writing it again cannot fix
+REJECTED = (IntegrityError, DataError)
+
+
+class MessageBuffer:
+    """
+    Per-process write-behind buffer of chat messages.
+
+    Messages are broadcast by the consumer right away and only appended here. The buffer writes
+    them with a single bulk_create once SUPPORT_MESSAGE_FLUSH_SIZE messages are pending, or
+    SUPPORT_MESSAGE_FLUSH_INTERVAL milliseconds after the first pending message arrived. Messages
+    still pending when the process exits are written by an atexit hook, or appended to the
+    SUPPORT_MESSAGE_SPOOL file if the database cannot be reached.
+
+    While the database is failing, flushes are retried with an exponential backoff up to
+    SUPPORT_MESSAGE_RETRY_MAX milliseconds, and incoming messages wait for the retry instead of
+    flushing a full buffer. Messages beyond SUPPORT_MESSAGE_BUFFER_MAX are spooled.
+
+    Attributes:
+    - pending (list of Message): Unsaved messages waiting for the next flush.
+    - flushes (int): Number of bulk writes done by this buffer.
+    - failures (int): Number of flushes failed in a row, a retry is scheduled while it is not 0.
+    """
+    def __init__(self):
+        self.pending = []
+        self.flushes = 0
+        self.failures = 0
+        self._timer = None
+
+    async def add(self, message):
+        """
+        Queue an unsaved message, flushing the buffer if it is full and no retry is scheduled.
+        """
+        self.pending.append(message)
+        if self.failures:
+            if len(self.pending) > settings.SUPPORT_MESSAGE_BUFFER_MAX:
+                overflow = self.pending[settings.SUPPORT_MESSAGE_BUFFER_MAX:]
+                del self.pending[settings.SUPPORT_MESSAGE_BUFFER_MAX:]
+                # Off the thread shared by the ORM calls of all consumers
+                await sync_to_async(spool_messages, thread_sensitive=False)(overflow)
+            # Normally a no-op, the retry is still scheduled
+            self._schedule(self.retry_delay)
+            return
+        if len(self.pending) >= settings.SUPPORT_MESSAGE_FLUSH_SIZE:
+            await self.flush()
+            return
+        self._schedule(settings.SUPPORT_MESSAGE_FLUSH_INTERVAL)
+
+    @property
+    def retry_delay(self):
+        """ Milliseconds until the next flush after the failures so far """
+        return min(settings.SUPPORT_MESSAGE_FLUSH_INTERVAL * 2 ** max(self.failures - 1, 0),
+                   settings.SUPPORT_MESSAGE_RETRY_MAX)
+
+    def _schedule(self, delay):
+        # Timers do not survive the event loop they were started in
+        loop = asyncio.get_running_loop()
+        if self._timer is None or self._timer.done() or self._timer.get_loop() is not loop:
+            self._timer = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay / 1000)
+        await self.flush()
+
+    async def flush(self):
+        """
+        Write all pending messages with save_messages().
+
+        Messages that could not be written are put back and retried by a flush scheduled after
+        retry_delay. Messages rejected by the database are dropped.
+        """
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            _, unsaved = await sync_to_async(save_messages)(batch)
+        except Exception:
+            logger.exception("Could not save %d chat messages, retrying later", len(batch))
+            unsaved = batch
+        else:
+            self.flushes += 1
+        if not unsaved:
+            self.failures = 0
+            return
+        self.failures += 1
+        self.pending[:0] = unsaved
+        # Replaces a timer started by messages that arrived during the flush
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule(self.retry_delay)
+
+    def flush_sync(self):
+        """
+        Write the pending messages from synchronous code, spooling them to a file if that fails.
+        """
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            _, unsaved = save_messages(batch)
+            self.flushes += 1
+        except Exception:
+            logger.exception("Could not save %d chat messages", len(batch))
+            unsaved = batch
+        if unsaved:
+            logger.error("Spooling %d chat messages to %s", len(unsaved), settings.SUPPORT_MESSAGE_SPOOL)
+            spool_messages(unsaved)
+
+
+def save_messages(messages):
+    """
+    Write chat messages with one bulk_create and invalidate the room lists of their rooms.
+
+    If the database rejects the batch, the messages are written one by one and the ones it rejects
+    (e.g. without content) are dropped, so a single bad message does not hold back the others.
+    Errors writing the batch for any other reason, e.g. a lost connection, are raised.
+
+    Returns:
+    - tuple: (list of the saved messages, list of the messages left unsaved by an error other than
+              a rejection while writing them one by one, to be written again later).
+    """
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+        saved, unsaved = messages, []
+    except REJECTED:
+        saved, unsaved = [], []
+        for index, message in enumerate(messages):
+            try:
+                with transaction.atomic():
+                    Message.objects.bulk_create([message])
+            except REJECTED:
+                logger.exception("Dropping a chat message of room %s rejected by the database", message.chat_id)
+                continue
+            except Exception:
+                logger.exception("Could not save %d chat messages", len(messages) - index)
+                unsaved = messages[index:]
+                break
+            saved.append(message)
+
+    if saved:
+        # Room lists cached before the messages were written do not count them yet
+        invalidate_rooms({message.chat_id for message in saved})
+    return saved, unsaved
+
+
+def spool_messages(messages):
+    """
+    Append unsaved messages to the spool file, one JSON object per line.
+    """
+    with open(settings.SUPPORT_MESSAGE_SPOOL, 'a') as f:
+        for message in messages:
+            f.write(json.dumps({
+                'chat_id': message.chat_id,
+                'sender_id': message.sender_id,
+                'content': message.content,
+                'timestamp': message.timestamp.isoformat(),
+            }) + '\n')
+
+
+def read_spool(path):
+    """
+    Returns the unsaved messages stored in a spool file.
+    """
+    with open(path) as f:
+        return [Message(chat_id=record['chat_id'], sender_id=record['sender_id'], content=record['content'],
+                        timestamp=parse_datetime(record['timestamp']))
+                for record in map(json.loads, filter(str.strip, f))]
+
+
+message_buffer = MessageBuffer()
+
+atexit.register(message_buffer.flush_sync)
@@ -1,10 +1,49 @@
 import json
+import time
+import uuid
+from datetime import datetime
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.db.models import Q
 from django.utils.timezone import now
 from asgiref.sync import sync_to_async
-from .models import SupportRoom, Message
+from monitoring.metrics import NODE, WEBSOCKET_CONNECTIONS
+from payment_gateway.replicas import read_from_replica
+from .archive import archived_history
+from .buffer import message_buffer
+from .models import SupportRoom, Message, RoomReadCursor, invalidate_room_lists, invalidate_rooms, room_member_ids
+from .presence import TYPING_INTERVAL, get_presence
+
+# Number of messages sent on connect and per load_before request
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# WebSocket subprotocol a client requests to exchange MessagePack binary frames instead of JSON text
+MSGPACK_SUBPROTOCOL = 'chat.msgpack.v1'
+
+# Maximum number of rooms in a single presence snapshot request
+PRESENCE_SNAPSHOT_MAX = 200
+
+
+def history_cursor(timestamp, message_id):
+    """ Keyset cursor pointing before the message with the given timestamp and ID """
+    return f"{timestamp.isoformat()}|{message_id}"
+
+
+def parse_history_cursor(cursor):
+    """ Returns the (timestamp, id) pair of a history cursor, raises ValueError if it is malformed """
+    timestamp, message_id = str(cursor).rsplit('|', 1)
+    return datetime.fromisoformat(timestamp), int(message_id)
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    # Support room the connection is authorized for, resolved in connect
+    room = None
+    # Monotonic time of the last typing event forwarded for this connection
+    typing_sent = float('-inf')
+    # Whether frames are MessagePack encoded binary data instead of JSON text
+    binary = False
+
     async def connect(self):
         self.user = self.scope['user']
         self.room_id = self.scope['url_route']['kwargs']['room_uuid']
@@ -13,6 +52,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # If the user is not authenticated, close the connection
         if not self.user.is_authenticated:
             await self.close()
+            return
+
+        # Resolve the room once, it is kept for the lifetime of the connection
+        self.room = await self.get_room(self.room_id)
+        if self.room is None:
+            await self.close()
+            return
 
         # Join the WebSocket group based on the room UUID
         await self.channel_layer.group_add(
@@ -20,17 +66,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        # Accept the WebSocket connection
-        await self.accept()
+        # Accept the WebSocket connection, with MessagePack frames if the client asked for them
+        self.binary = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=MSGPACK_SUBPROTOCOL if self.binary else None)
+        await sync_to_async(WEBSOCKET_CONNECTIONS.inc, thread_sensitive=False)(node=NODE)
 
-        # Fetch previous messages
-        messages = await self.get_previous_messages(self.room_id)
+        # Send only the latest page of messages, older pages are requested with load_before
+        messages, before = await self.get_previous_messages(self.room.id)
+        await self.send_history('previous_messages', messages, before)
+        await self.mark_read()
 
-        # Send all previous messages to the client
-        await self.send(text_data=json.dumps({
-            'type': 'previous_messages',
-            'messages': messages
-        }))
+        # Announce the user to everyone in the room, including this connection
+        await sync_to_async(get_presence().join, thread_sensitive=False)(self.room.uuid, self.channel_name, self.user)
+        await self.broadcast_presence()
 
     async def disconnect(self, close_code):
         # Leave the WebSocket group
@@ -39,27 +87,61 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_content = data.get('message')
+        if self.room:
+            await sync_to_async(WEBSOCKET_CONNECTIONS.dec, thread_sensitive=False)(node=NODE)
+            await sync_to_async(get_presence().leave, thread_sensitive=False)(self.room.uuid, self.channel_name)
+            await self.broadcast_presence()
+            # Messages received while connected have been seen
+            await self.mark_read()
 
-        # If the user is not authenticated, don't save the message
-        if not self.user.is_authenticated:
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data) if text_data is not None else msgpack.unpackb(bytes_data, raw=False)
+        except ValueError:
+            await self.send_frame({'type': 'error', 'message': 'Malformed frame.'})
+            return
+        if not isinstance(data, dict):
+            return
+
+        # If the connection was not authorized for a room, ignore the message
+        if not self.room:
             return
 
-        # Get the support room and save the message to the database
-        room = await self.get_room(self.room_id)  # Changed to async call
-        new_message = await sync_to_async(Message.objects.create)(
-            content=message_content,
+        if data.get('type') == 'load_before':
+            await self.load_before(data.get('before'))
+            return
+
+        if data.get('type') == 'heartbeat':
+            # Keeps the presence entry of the connection from expiring
+            await sync_to_async(get_presence().join, thread_sensitive=False)(self.room.uuid, self.channel_name, self.user)
+            return
+
+        if data.get('type') == 'typing':
+            await self.typing()
+            return
+
+        if data.get('type') == 'presence_snapshot':
+            await self.presence_snapshot(data.get('rooms'))
+            return
+
+        content = data.get('message')
+        if not isinstance(content, str) or not content.strip():
+            await self.send_frame({'type': 'error', 'message': 'Empty message.'})
+            return
+
+        new_message = Message(
+            content=content,
             sender=self.user,
-            chat=room,
-            timestamp=now()
+            chat=self.room,
         )
+        if not settings.SUPPORT_MESSAGE_WRITE_BEHIND:
+            # Save the message to the room resolved at connect time
+            await self.save_message(new_message)
 
         message_data = {
             'type': 'chat_message',
             'message': new_message.content,
-            'sender': new_message.sender.username,
+            'sender': self.user.username,
             'timestamp': new_message.timestamp.isoformat()
         }
 
@@ -69,24 +151,152 @@ class ChatConsumer(AsyncWebsocketConsumer):
             message_data
         )
 
+        if settings.SUPPORT_MESSAGE_WRITE_BEHIND:
+            # Saved later together with other messages of this process
+            await message_buffer.add(new_message)
+
+    async def load_before(self, cursor):
+        """ Send the page of messages preceding the cursor of the oldest message the client has """
+        try:
+            before = parse_history_cursor(cursor)
+        except (TypeError, ValueError):
+            await self.send_frame({'type': 'error', 'message': 'Invalid history cursor.'})
+            return
+
+        # Older pages hardly change, a lagging replica serves them as well as the primary
+        with read_from_replica():
+            messages, before = await self.get_previous_messages(self.room.id, before)
+        await self.send_history('older_messages', messages, before)
+
+    async def send_frame(self, frame):
+        """ Send a frame as MessagePack binary data or JSON text, depending on the negotiated subprotocol """
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(frame, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(frame))
+
+    async def send_history(self, frame_type, messages, before):
+        """
+        Send a page of history. JSON clients get a list of message objects. MessagePack clients get
+        the senders once and the messages as [sender index, content, timestamp in epoch milliseconds]
+        rows, which avoids repeating keys, usernames and ISO timestamps in every message.
+        """
+        if not self.binary:
+            await self.send_frame({
+                'type': frame_type,
+                'messages': [{'message': msg['content'], 'sender': msg['sender'],
+                              'timestamp': msg['timestamp'].isoformat()} for msg in messages],
+                'before': before,
+            })
+            return
+
+        senders = {}
+        rows = [[senders.setdefault(msg['sender'], len(senders)), msg['content'],
+                 int(msg['timestamp'].timestamp() * 1000)] for msg in messages]
+        await self.send_frame({'type': frame_type, 'senders': list(senders), 'rows': rows, 'before': before})
+
+    async def broadcast_presence(self):
+        """ Send the users present in the room to everyone in the room """
+        members = await sync_to_async(get_presence().members, thread_sensitive=False)([self.room.uuid])
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'presence.update',
+            'room': str(self.room.uuid),
+            'users': members[str(self.room.uuid)],
+        })
+
+    async def typing(self):
+        """ Forward a typing event to the room, at most once per TYPING_INTERVAL for this connection """
+        if time.monotonic() - self.typing_sent < TYPING_INTERVAL:
+            return
+        self.typing_sent = time.monotonic()
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'user.typing',
+            'user': {'id': self.user.id, 'username': self.user.username},
+        })
+
+    async def presence_snapshot(self, room_uuids):
+        """ Send the users present in each of the given rooms the user has access to in one frame """
+        if not isinstance(room_uuids, list):
+            room_uuids = []
+        room_uuids = await self.get_accessible_rooms(room_uuids[:PRESENCE_SNAPSHOT_MAX])
+        members = await sync_to_async(get_presence().members, thread_sensitive=False)(room_uuids)
+        await self.send_frame({'type': 'presence_snapshot', 'rooms': members})
+
     async def chat_message(self, event):
         # Send the message to the user
-        await self.send(text_data=json.dumps(event))
+        await self.send_frame(event)
+
+    async def presence_update(self, event):
+        await self.send_frame({'type': 'presence', 'room': event['room'], 'users': event['users']})
+
+    async def user_typing(self, event):
+        await self.send_frame({'type': 'typing', 'user': event['user']})
 
     @sync_to_async
     def get_room(self, room_id):
-        """ Fetch the support room """
-        try:
-            return SupportRoom.objects.get(uuid=room_id)
-        except SupportRoom.DoesNotExist:
+        """
+        Fetch the support room if the user is its owner or one of its admins, None otherwise.
+        """
+        room = SupportRoom.objects.filter(uuid=room_id).first()
+        if room is None or self.user.id not in room_member_ids([room.id]):
             return None
+        return room
 
     @sync_to_async
-    def get_previous_messages(self, room_id):
-        """ Fetch all messages for the given support room """
-        try:
-            room = SupportRoom.objects.get(uuid=room_id)
-            messages = room.messages.all().order_by('timestamp')
-            return [{'message': msg.content, 'sender': msg.sender.username, 'timestamp': msg.timestamp.isoformat()} for msg in messages]
-        except SupportRoom.DoesNotExist:
-            return []
+    def save_message(self, message):
+        """
+        Save the message, and mark its room changed in the same thread hop: unread counts and the last
+        message changed for all its members, including agents added since the connection was opened.
+        """
+        message.save()
+        invalidate_rooms([message.chat_id])
+
+    async def mark_read(self):
+        """ Move the read cursor of the user in the room to now """
+        await RoomReadCursor.objects.abulk_create(
+            [RoomReadCursor(room=self.room, user=self.user, last_read_at=now())],
+            update_conflicts=True, unique_fields=['room', 'user'], update_fields=['last_read_at'])
+        await sync_to_async(invalidate_room_lists, thread_sensitive=False)([self.user.id])
+
+    @sync_to_async
+    def get_accessible_rooms(self, room_uuids):
+        """ Returns the UUIDs among the given ones of the rooms the user owns or administers """
+        valid = []
+        for room_uuid in room_uuids:
+            try:
+                valid.append(uuid.UUID(str(room_uuid)))
+            except ValueError:
+                continue
+        return list(SupportRoom.objects
+                    .filter(Q(user=self.user) | Q(admins=self.user), uuid__in=valid)
+                    .values_list('uuid', flat=True)
+                    .distinct())
+
+    @sync_to_async
+    def get_previous_messages(self, room_pk, before=None):
+        """
+        Fetch a page of messages of the support room with the given primary key, oldest first.
+
+        Messages are read newest first from the (chat, timestamp) index, starting before the
+        (timestamp, id) keyset cursor if one is given. Once they run out, the page continues with
+        the archived messages of the room, which are all older. Returns the messages (dicts with their
+        id, sender, content and timestamp) and the cursor of the next older page, or None if there are
+        no older messages.
+        """
+        messages = (Message.objects
+                    .filter(chat_id=room_pk)
+                    .select_related('sender')
+                    .order_by('-timestamp', '-id'))
+        if before is not None:
+            timestamp, message_id = before
+            messages = messages.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+        page = [{'id': msg.id, 'sender': msg.sender.username, 'content': msg.content, 'timestamp': msg.timestamp}
+                for msg in messages[:CHAT_HISTORY_PAGE_SIZE + 1]]
+        if len(page) <= CHAT_HISTORY_PAGE_SIZE:
+            oldest = (page[-1]['timestamp'], page[-1]['id']) if page else before
+            page += archived_history(room_pk, oldest, CHAT_HISTORY_PAGE_SIZE + 1 - len(page))
+
+        has_more = len(page) > CHAT_HISTORY_PAGE_SIZE
+        page = page[:CHAT_HISTORY_PAGE_SIZE][::-1]
+        return page, history_cursor(page[0]['timestamp'], page[0]['id']) if has_more else None
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from support.archive import archive_room, rooms_to_archive
+
+
+class Command(BaseCommand):
+    help = ("Move the messages of support rooms closed for more than SUPPORT_ARCHIVE_AFTER_DAYS days "
+            "into compressed archive chunks. Meant to be run periodically, e.g. nightly from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive rooms closed for more than this many days.")
+        parser.add_argument('--chunk-size', type=int, help="Number of messages moved per transaction.")
+
+    def handle(self, *args, **options):
+        rooms = rooms_to_archive(options['days'])
+        archived = sum(archive_room(room_id, options['chunk_size']) for room_id in rooms)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} messages of {len(rooms)} rooms."))
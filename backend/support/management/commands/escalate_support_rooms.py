@@ -0,0 +1,26 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from support.assignment import assign_agents, unanswered_rooms
+from support.models import invalidate_room_lists
+
+
+class Command(BaseCommand):
+    help = ("Add another agent to open support rooms whose owner has been waiting for an answer "
+            "for more than SUPPORT_ESCALATION_AFTER minutes. Meant to be run periodically, e.g. from cron.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(minutes=settings.SUPPORT_ESCALATION_AFTER)
+        escalated = 0
+        for room in unanswered_rooms(since):
+            agents = assign_agents(room, count=1, exclude=room.admins.values_list('id', flat=True))
+            # Rooms without a free agent are retried on the next run
+            if not agents:
+                continue
+            room.escalated_at = now
+            room.save(update_fields=['escalated_at'])
+            invalidate_room_lists(agents)
+            escalated += 1
+        self.stdout.write(self.style.SUCCESS(f"Escalated {escalated} rooms."))
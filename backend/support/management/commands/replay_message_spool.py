@@ -0,0 +1,29 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from support.buffer import read_spool, save_messages, spool_messages
+
+
+class Command(BaseCommand):
+    help = "Save chat messages spooled to SUPPORT_MESSAGE_SPOOL when they could not be written at shutdown."
+
+    def handle(self, *args, **options):
+        path = settings.SUPPORT_MESSAGE_SPOOL
+        # Messages spooled by processes exiting meanwhile go to a new file. A file left by
+        # an interrupted replay is replayed first.
+        replaying = f"{path}.replaying"
+        if not os.path.exists(replaying):
+            if not os.path.exists(path):
+                self.stdout.write("No spooled messages.")
+                return
+            os.replace(path, replaying)
+
+        messages = read_spool(replaying)
+        saved, unsaved = save_messages(messages)
+        os.remove(replaying)
+        if unsaved:
+            # Left by a database error, replayed next time. Messages rejected by the database are dropped.
+            spool_messages(unsaved)
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {len(saved)} spooled messages, dropped {len(messages) - len(saved) - len(unsaved)}, "
+            f"spooled {len(unsaved)} again."))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0002_supportroom_admins'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'timestamp'], name='message_chat_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('support', '0004_message_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='support.supportroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='roomreadcursor',
+            constraint=models.UniqueConstraint(fields=('room', 'user'), name='unique_room_read_cursor'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0005_roomreadcursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportroom',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
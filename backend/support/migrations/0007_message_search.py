@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# SQLite: external content FTS5 tables kept in sync with their source tables by triggers
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE support_message_fts USING fts5(
+           content, content='support_message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER support_message_fts_insert AFTER INSERT ON support_message BEGIN
+           INSERT INTO support_message_fts(rowid, content) VALUES (new.id, new.content);
+       END""",
+    """CREATE TRIGGER support_message_fts_delete AFTER DELETE ON support_message BEGIN
+           INSERT INTO support_message_fts(support_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+       END""",
+    """CREATE TRIGGER support_message_fts_update AFTER UPDATE OF content ON support_message BEGIN
+           INSERT INTO support_message_fts(support_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+           INSERT INTO support_message_fts(rowid, content) VALUES (new.id, new.content);
+       END""",
+    "INSERT INTO support_message_fts(support_message_fts) VALUES ('rebuild')",
+    """CREATE VIRTUAL TABLE support_supportroom_fts USING fts5(
+           title, content='support_supportroom', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER support_supportroom_fts_insert AFTER INSERT ON support_supportroom BEGIN
+           INSERT INTO support_supportroom_fts(rowid, title) VALUES (new.id, new.title);
+       END""",
+    """CREATE TRIGGER support_supportroom_fts_delete AFTER DELETE ON support_supportroom BEGIN
+           INSERT INTO support_supportroom_fts(support_supportroom_fts, rowid, title) VALUES ('delete', old.id, old.title);
+       END""",
+    """CREATE TRIGGER support_supportroom_fts_update AFTER UPDATE OF title ON support_supportroom BEGIN
+           INSERT INTO support_supportroom_fts(support_supportroom_fts, rowid, title) VALUES ('delete', old.id, old.title);
+           INSERT INTO support_supportroom_fts(rowid, title) VALUES (new.id, new.title);
+       END""",
+    "INSERT INTO support_supportroom_fts(support_supportroom_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER support_supportroom_fts_update",
+    "DROP TRIGGER support_supportroom_fts_delete",
+    "DROP TRIGGER support_supportroom_fts_insert",
+    "DROP TABLE support_supportroom_fts",
+    "DROP TRIGGER support_message_fts_update",
+    "DROP TRIGGER support_message_fts_delete",
+    "DROP TRIGGER support_message_fts_insert",
+    "DROP TABLE support_message_fts",
+]
+
+# PostgreSQL: GIN expression indexes, maintained by the database on every write. The
+# expressions must match the ones in support.search for the planner to use the indexes.
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX support_message_content_fts ON support_message USING gin (to_tsvector('simple', content))",
+    "CREATE INDEX support_supportroom_title_fts ON support_supportroom USING gin (to_tsvector('simple', title))",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX support_supportroom_title_fts",
+    "DROP INDEX support_message_content_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0006_supportroom_escalated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
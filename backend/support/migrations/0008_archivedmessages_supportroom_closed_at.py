@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0007_message_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportroom',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessages',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('last_id', models.PositiveBigIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='support.supportroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'last_timestamp', 'last_id'], name='archive_room_last_idx')],
+            },
+        ),
+    ]
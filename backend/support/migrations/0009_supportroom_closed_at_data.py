@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+
+def set_closed_at(apps, schema_editor):
+    """
+    Rooms closed before closed_at existed count as closed since their last message.
+    """
+    SupportRoom = apps.get_model('support', 'SupportRoom')
+    rooms = (SupportRoom.objects
+             .filter(status__in=['Resolved', 'Closed'], closed_at__isnull=True)
+             .annotate(last_activity=Coalesce(Max('messages__timestamp'), 'created_at')))
+    for room in rooms.iterator():
+        SupportRoom.objects.filter(pk=room.pk).update(closed_at=room.last_activity)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0008_archivedmessages_supportroom_closed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_closed_at, migrations.RunPython.noop),
+    ]
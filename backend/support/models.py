@@ -1,7 +1,15 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
-from django.apps import apps
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.utils import timezone
 import uuid
+from .assignment import admins_changed, room_deleted, room_deleting
+
+# Seconds the room list of a user is cached for, unless it is invalidated earlier
+ROOM_LIST_CACHE_TIMEOUT = 300
 
 
 class SupportRoom(models.Model):
@@ -17,25 +25,205 @@ class SupportRoom(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_rooms')
     admins = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='admin_rooms', blank=True)
+    # Last time another agent was added because the room was left unanswered
+    escalated_at = models.DateTimeField(null=True, blank=True)
+    # When the room was resolved or closed, None while it is open
+    closed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.title} - {self.status}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        room = super().from_db(db, field_names, values)
+        # Status as loaded, to update the agents' load when it changes
+        room._loaded_status = room.status if 'status' in field_names else None
+        return room
+
     def save(self, *args, **kwargs):
+        from .assignment import OPEN_STATUSES, assign_agents, release_agents, reopen_agents
+
+        loaded_status = getattr(self, '_loaded_status', None)
+        if self.pk is None or loaded_status is not None:
+            was_open = self.pk is None or loaded_status in OPEN_STATUSES
+            if was_open != (self.status in OPEN_STATUSES):
+                # Closed rooms are archived some time after closing
+                self.closed_at = None if self.status in OPEN_STATUSES else timezone.now()
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'closed_at'}
+
         if not self.pk:  
-            UserModel = apps.get_model(settings.AUTH_USER_MODEL)
             super().save(*args, **kwargs)
-            admin_users = UserModel.objects.filter(is_staff=True)
-            self.admins.set(admin_users)  
+            # A few of the least busy agents instead of every staff member
+            agents = assign_agents(self)
+            invalidate_room_lists([self.user_id, *agents])
         else:
             super().save(*args, **kwargs)
+            if loaded_status is not None and (loaded_status in OPEN_STATUSES) != (self.status in OPEN_STATUSES):
+                if self.status in OPEN_STATUSES:
+                    reopen_agents(self)
+                else:
+                    release_agents(self)
+        self._loaded_status = self.status
 
 
 class Message(models.Model):
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the message is received, buffered messages are saved later with their own timestamp
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     chat = models.ForeignKey(SupportRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # Serves the latest-first, keyset paginated history of a room
+            models.Index(fields=['chat', 'timestamp'], name='message_chat_timestamp_idx'),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} at {self.timestamp}"
+
+
+class ArchivedMessages(models.Model):
+    """
+    Compressed chunk of the message history of a closed support room, moved out of the Message table.
+
+    Attributes:
+    - room (ForeignKey): The support room.
+    - data (BinaryField): zlib compressed JSON list of the messages, oldest first, each with its
+                          original id, sender_id, sender (username), content and timestamp.
+    - message_count (int): Number of messages in the chunk.
+    - first_timestamp (DateTimeField): Timestamp of the oldest message of the chunk.
+    - last_timestamp (DateTimeField): Timestamp of the newest message of the chunk.
+    - last_id (int): Original ID of the newest message of the chunk.
+    - archived_at (DateTimeField): When the chunk was archived.
+    """
+    room = models.ForeignKey(SupportRoom, on_delete=models.CASCADE, related_name='archived_messages')
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    last_id = models.PositiveBigIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves reading the archived history of a room newest chunk first
+            models.Index(fields=['room', 'last_timestamp', 'last_id'], name='archive_room_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.message_count} archived messages of {self.room}"
+
+
+class RoomReadCursor(models.Model):
+    """
+    Point up to which a user has read the messages of a support room.
+
+    Attributes:
+    - room (ForeignKey): The support room.
+    - user (ForeignKey): The reading user.
+    - last_read_at (DateTimeField): Messages sent after this time are unread for the user.
+    """
+    room = models.ForeignKey(SupportRoom, on_delete=models.CASCADE, related_name='read_cursors')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_cursors')
+    last_read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'user'], name='unique_room_read_cursor'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} read {self.room} until {self.last_read_at}"
+
+
+def _room_list_key(user_id):
+    return f"support_room_list_{user_id}"
+
+
+def _room_version_key(room_id):
+    return f"support_room_version_{room_id}"
+
+
+def user_rooms(user):
+    """
+    Returns the support rooms listed for the user: staff users get the rooms they administer,
+    other users the rooms they created.
+    """
+    return SupportRoom.objects.filter(admins=user) if user.is_staff else SupportRoom.objects.filter(user=user)
+
+
+def get_room_list(user):
+    """
+    Returns the support rooms of the user with their unread count and last message, cached per user.
+
+    Staff users get the rooms they administer, other users the rooms they created. Unread counts
+    (messages of other users sent after the user's read cursor) and the last message are annotated
+    on the room query, so the list is read with a single query. The cached list is kept with the
+    versions of its rooms, and read again once one of them changed (see invalidate_rooms).
+
+    Returns:
+    - list of dict: uuid, title, status, unread, last_message, last_message_sender and
+                    last_message_at of every room, most recently active first.
+    """
+    key = _room_list_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        version_keys, versions, rooms = cached
+        if cache.get_many(version_keys) == versions:
+            return rooms
+
+    queryset = user_rooms(user)
+    last_message = Message.objects.filter(chat=OuterRef('pk')).order_by('-timestamp', '-id')
+    read_until = RoomReadCursor.objects.filter(room=OuterRef('pk'), user=user).values('last_read_at')[:1]
+    rooms = list(queryset
+                 .annotate(read_until=Subquery(read_until))
+                 .annotate(
+                     unread=Count('messages', filter=(
+                         ~Q(messages__sender=user)
+                         & (Q(read_until__isnull=True) | Q(messages__timestamp__gt=F('read_until'))))),
+                     last_message=Subquery(last_message.values('content')[:1]),
+                     last_message_sender=Subquery(last_message.values('sender__username')[:1]),
+                     last_message_at=Subquery(last_message.values('timestamp')[:1]),
+                 )
+                 .order_by(Coalesce('last_message_at', 'created_at').desc(), '-id')
+                 .values('id', 'uuid', 'title', 'status', 'unread', 'last_message', 'last_message_sender',
+                         'last_message_at'))
+    # Rooms that did not change lately have no version, a version set later differs all the same
+    version_keys = [_room_version_key(room.pop('id')) for room in rooms]
+    cache.set(key, (version_keys, cache.get_many(version_keys), rooms), ROOM_LIST_CACHE_TIMEOUT)
+    return rooms
+
+
+def room_member_ids(room_ids):
+    """
+    Returns the IDs of the owners and admins of the given rooms, read with a single query.
+    """
+    owners = SupportRoom.objects.filter(id__in=room_ids).values_list('user_id', flat=True)
+    admins = SupportRoom.admins.through.objects.filter(supportroom_id__in=room_ids).values_list('profile_id', flat=True)
+    return set(owners.union(admins))
+
+
+def invalidate_rooms(room_ids):
+    """
+    Mark the given rooms changed, e.g. by a new message, so the cached room lists of all their current
+    members are read again. Costs a single cache write, the members are not looked up.
+    """
+    version = uuid.uuid4().hex
+    # An expired version only makes the lists cached with it read again
+    cache.set_many({_room_version_key(room_id): version for room_id in room_ids}, ROOM_LIST_CACHE_TIMEOUT)
+
+
+def invalidate_room_lists(user_ids):
+    """
+    Drop the cached room lists of the given users, e.g. when they were added to a room or read it.
+    """
+    cache.delete_many([_room_list_key(user_id) for user_id in user_ids])
+
+
+
+# Keep the load counters of agents in line with changes made besides assign_agents() and SupportRoom.save()
+m2m_changed.connect(admins_changed, sender=SupportRoom.admins.through)
+pre_delete.connect(room_deleting, sender=SupportRoom)
+post_delete.connect(room_deleted, sender=SupportRoom)
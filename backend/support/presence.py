@@ -0,0 +1,102 @@
+import json
+import time
+from payment_gateway.stores import SharedStore
+
+# Seconds after the last heartbeat at which a connection is no longer considered online.
+# Clients send a heartbeat every PRESENCE_HEARTBEAT seconds.
+PRESENCE_TTL = 60
+PRESENCE_HEARTBEAT = 20
+
+# Minimum number of seconds between two typing events forwarded for the same connection
+TYPING_INTERVAL = 3
+
+
+def public_info(info):
+    """ Returns the user info of a presence entry without its heartbeat time """
+    return {'id': info['id'], 'username': info['username'], 'is_staff': info['is_staff']}
+
+
+def presence_key(room_uuid):
+    """ Returns the Redis key of the presence hash of a room """
+    return f"support:presence:{room_uuid}"
+
+
+class RedisPresence:
+    """
+    Presence of users in support rooms, kept in one Redis hash per room.
+
+    Hash fields are channel names of the connections and values the JSON encoded info of their
+    user with the time of the last heartbeat, so a user with two open tabs stays online until both close.
+    Entries older than PRESENCE_TTL are skipped and removed when read, the hash itself expires
+    PRESENCE_TTL seconds after the last heartbeat of the room.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def join(self, room_uuid, channel_name, user):
+        """ Mark the connection of the user as present in the room, also used for heartbeats """
+        key = presence_key(room_uuid)
+        info = json.dumps({'id': user.id, 'username': user.username, 'is_staff': user.is_staff, 'seen': time.time()})
+        pipeline = self.connection.pipeline()
+        pipeline.hset(key, channel_name, info)
+        pipeline.expire(key, PRESENCE_TTL)
+        pipeline.execute()
+
+    def leave(self, room_uuid, channel_name):
+        """ Remove the connection from the room """
+        self.connection.hdel(presence_key(room_uuid), channel_name)
+
+    def members(self, room_uuids):
+        """
+        Returns the users present in each of the rooms, read in a single round trip.
+
+        Returns:
+        - dict: Room UUID -> list of info dicts of the present users, ordered by username.
+        """
+        room_uuids = [str(room_uuid) for room_uuid in room_uuids]
+        pipeline = self.connection.pipeline()
+        for room_uuid in room_uuids:
+            pipeline.hgetall(presence_key(room_uuid))
+
+        deadline = time.time() - PRESENCE_TTL
+        members, stale = {}, self.connection.pipeline()
+        for room_uuid, entries in zip(room_uuids, pipeline.execute()):
+            users = {}
+            for field, info in entries.items():
+                info = json.loads(info)
+                if info['seen'] < deadline:
+                    stale.hdel(presence_key(room_uuid), field)
+                else:
+                    users[info['id']] = public_info(info)
+            members[room_uuid] = sorted(users.values(), key=lambda info: info['username'])
+        stale.execute()
+        return members
+
+
+class LocalPresence:
+    """
+    Process-local presence store with the interface of RedisPresence, used when the cache is not
+    Redis (development and tests). It only knows the connections of its own process.
+    """
+    def __init__(self):
+        self.rooms = {}
+
+    def join(self, room_uuid, channel_name, user):
+        self.rooms.setdefault(str(room_uuid), {})[channel_name] = {
+            'id': user.id, 'username': user.username, 'is_staff': user.is_staff, 'seen': time.time()}
+
+    def leave(self, room_uuid, channel_name):
+        self.rooms.get(str(room_uuid), {}).pop(channel_name, None)
+
+    def members(self, room_uuids):
+        deadline = time.time() - PRESENCE_TTL
+        members = {}
+        for room_uuid in room_uuids:
+            users = {info['id']: public_info(info) for info in self.rooms.get(str(room_uuid), {}).values()
+                     if info['seen'] >= deadline}
+            members[str(room_uuid)] = sorted(users.values(), key=lambda info: info['username'])
+        return members
+
+
+# Presence store: Redis if the default cache is Redis, process-local otherwise
+get_presence = SharedStore(RedisPresence, LocalPresence)
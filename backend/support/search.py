@@ -0,0 +1,96 @@
+import re
+from django.db import connection
+from .models import Message, SupportRoom, user_rooms
+
+# Number of messages per page of search results, and of rooms returned with the first page
+SEARCH_PAGE_SIZE = 20
+SEARCH_ROOMS_LIMIT = 10
+
+
+def _fts5_query(text):
+    """
+    Returns an FTS5 query matching all words of the text. Every word is quoted, so FTS5 operators
+    and special characters typed by the user are searched for literally.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def _search_ids(table, column, text, scope, limit, offset):
+    """
+    Returns the IDs of the rows of the table matching the text best, restricted to the IDs of the
+    given queryset of rooms (by their chat for messages).
+
+    SQLite uses the FTS5 tables and PostgreSQL the GIN indexes created by the 0007 migration,
+    both kept up to date by the database on every write. Other databases fall back to a
+    substring search.
+    """
+    scope_sql, scope_params = scope.values('id').query.sql_with_params()
+    scope_column = 'chat_id' if table == 'support_message' else 'id'
+    if connection.vendor == 'sqlite':
+        fts = f'{table}_fts'
+        sql = (f'SELECT t.id FROM {fts} JOIN {table} t ON t.id = {fts}.rowid '
+               f'WHERE {fts} MATCH %s AND t.{scope_column} IN ({scope_sql}) '
+               f'ORDER BY bm25({fts}), t.id DESC LIMIT %s OFFSET %s')
+        params = [_fts5_query(text), *scope_params, limit, offset]
+    elif connection.vendor == 'postgresql':
+        document = f"to_tsvector('simple', t.{column})"
+        sql = (f"SELECT t.id FROM {table} t "
+               f"WHERE {document} @@ plainto_tsquery('simple', %s) AND t.{scope_column} IN ({scope_sql}) "
+               f"ORDER BY ts_rank({document}, plainto_tsquery('simple', %s)) DESC, t.id DESC LIMIT %s OFFSET %s")
+        params = [text, *scope_params, text, limit, offset]
+    else:
+        model = Message if table == 'support_message' else SupportRoom
+        return list(model.objects
+                    .filter(**{f'{column}__icontains': text, f'{scope_column}__in': scope.values('id')})
+                    .order_by('-id')
+                    .values_list('id', flat=True)[offset:offset + limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_messages(user, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Full-text search over the messages of the rooms listed for the user, best matches first.
+
+    Args:
+    - user (Profile): The searching user.
+    - text (str): The words to search for, all of them have to match.
+    - page (int): Page of results, starting at 1.
+    - page_size (int): Number of messages per page.
+
+    Returns:
+    - tuple: List of dicts with the id, room, room_title, sender, content and timestamp of the
+             matching messages, and whether there is a next page.
+    """
+    if not re.search(r'\w', text):
+        return [], False
+    ids = _search_ids('support_message', 'content', text, user_rooms(user), page_size + 1, (page - 1) * page_size)
+    has_more = len(ids) > page_size
+    ids = ids[:page_size]
+
+    messages = Message.objects.select_related('chat', 'sender').in_bulk(ids)
+    return [{
+        'id': message.id,
+        'room': str(message.chat.uuid),
+        'room_title': message.chat.title,
+        'sender': message.sender.username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    } for message in (messages[message_id] for message_id in ids)], has_more
+
+
+def search_rooms(user, text, limit=SEARCH_ROOMS_LIMIT):
+    """
+    Full-text search over the titles of the rooms listed for the user, best matches first.
+
+    Returns:
+    - list of dict: uuid, title and status of the matching rooms.
+    """
+    if not re.search(r'\w', text):
+        return []
+    ids = _search_ids('support_supportroom', 'title', text, user_rooms(user), limit, 0)
+    rooms = SupportRoom.objects.in_bulk(ids)
+    return [{'uuid': str(rooms[room_id].uuid), 'title': rooms[room_id].title, 'status': rooms[room_id].status}
+            for room_id in ids]
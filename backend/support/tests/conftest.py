@@ -0,0 +1,80 @@
+import pytest
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from accounts.models import Profile
+from support.models import SupportRoom
+from support.presence import LocalPresence
+from support.routing import websocket_urlpatterns
+
+
+@pytest.fixture(autouse=True)
+def in_memory_channel_layer(settings):
+    """
+    Fixture replacing the Redis channel layer with an in-memory one.
+    """
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Fixture clearing the cache before each test, so cached room lists do not leak between tests.
+    """
+    cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def keep_test_connection(monkeypatch):
+    """
+    Fixture keeping consumers from closing the test database connection.
+
+    Consumers close old connections before handling each message, like Django does per request.
+    The communicator only suppresses this while a test awaits it, not during a disconnect.
+    """
+    monkeypatch.setattr('channels.db.close_old_connections', lambda: None)
+
+
+@pytest.fixture(autouse=True)
+def local_presence(monkeypatch):
+    """
+    Fixture giving every test an empty process-local presence store.
+    """
+    store = LocalPresence()
+    monkeypatch.setattr('support.presence.get_presence.instance', store)
+    return store
+
+
+@pytest.fixture
+def support_user(db):
+    """
+    Fixture creating the user owning the support room.
+    """
+    return Profile.objects.create_user(username='client', password='clientpass123')
+
+
+@pytest.fixture
+def room(support_user):
+    """
+    Fixture creating a support room of support_user.
+    """
+    return SupportRoom.objects.create(title='Payment problem', user=support_user)
+
+
+@pytest.fixture
+def communicator():
+    """
+    Factory fixture creating a WebSocket communicator connected to the chat of a room as the given user.
+
+    Usage:
+        socket = communicator(room, user)
+        connected, _ = await socket.connect()
+    """
+    def _factory(room, user=None, subprotocols=None):
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{room.uuid}/',
+                                       subprotocols=subprotocols)
+        socket.scope['user'] = user or AnonymousUser()
+        return socket
+    return _factory
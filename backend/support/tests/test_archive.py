@@ -0,0 +1,104 @@
+import pytest
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.utils import timezone
+from support.archive import archive_room, decompress_messages, rooms_to_archive
+from support.consumers import CHAT_HISTORY_PAGE_SIZE
+from support.models import ArchivedMessages, Message, SupportRoom
+
+
+def _create_messages(room, sender, count, start=0):
+    """Create count messages in room, one second apart, numbered from start."""
+    first = timezone.now() - timedelta(days=60)
+    return Message.objects.bulk_create(
+        Message(content=f'message {i}', chat=room, sender=sender, timestamp=first + timedelta(seconds=i))
+        for i in range(start, start + count))
+
+
+def _close(room, days_ago):
+    room.status = 'Closed'
+    room.save()
+    SupportRoom.objects.filter(pk=room.pk).update(closed_at=timezone.now() - timedelta(days=days_ago))
+
+
+@pytest.mark.django_db
+class TestClosedAt:
+    def test_set_on_close_and_cleared_on_reopen(self, room):
+        """Test that closed_at records when a room was closed and is cleared when it is reopened."""
+        assert room.closed_at is None
+
+        room.status = 'Resolved'
+        room.save(update_fields=['status'])
+        room.refresh_from_db()
+        assert room.closed_at is not None
+
+        room.status = 'Pending'
+        room.save()
+        room.refresh_from_db()
+        assert room.closed_at is None
+
+
+@pytest.mark.django_db
+class TestArchive:
+    def test_rooms_to_archive(self, settings, room, support_user):
+        """Test that only rooms closed for more than SUPPORT_ARCHIVE_AFTER_DAYS with messages are archived."""
+        settings.SUPPORT_ARCHIVE_AFTER_DAYS = 30
+        recent = SupportRoom.objects.create(title='Recent', user=support_user)
+        empty = SupportRoom.objects.create(title='Empty', user=support_user)
+        _create_messages(room, support_user, 1)
+        _create_messages(recent, support_user, 1)
+        _close(room, days_ago=31)
+        _close(recent, days_ago=5)
+        _close(empty, days_ago=31)
+
+        assert rooms_to_archive() == [room.id]
+
+    def test_archive_in_chunks(self, room, support_user):
+        """Test that messages are moved into compressed chunks of the given size, oldest first."""
+        messages = _create_messages(room, support_user, 7)
+
+        assert archive_room(room.id, chunk_size=3) == 7
+
+        assert not Message.objects.filter(chat=room).exists()
+        chunks = list(ArchivedMessages.objects.filter(room=room).order_by('last_timestamp'))
+        assert [chunk.message_count for chunk in chunks] == [3, 3, 1]
+        entries = [entry for chunk in chunks for entry in decompress_messages(chunk.data)]
+        assert [entry['id'] for entry in entries] == [message.id for message in messages]
+        assert entries[0] == {'id': messages[0].id, 'sender_id': support_user.id, 'sender': 'client',
+                              'content': 'message 0', 'timestamp': messages[0].timestamp.isoformat()}
+
+    def test_command(self, settings, room, support_user):
+        """Test that the command archives the messages of all rooms closed long enough."""
+        settings.SUPPORT_ARCHIVE_AFTER_DAYS = 30
+        _create_messages(room, support_user, 5)
+        _close(room, days_ago=40)
+
+        call_command('archive_support_rooms', chunk_size=2)
+
+        assert not Message.objects.filter(chat=room).exists()
+        assert ArchivedMessages.objects.filter(room=room).count() == 3
+
+    def test_history_reads_archive(self, room, support_user, communicator):
+        """Test that the consumer pages through the hot and archived history as one history."""
+        count = CHAT_HISTORY_PAGE_SIZE + 20
+        _create_messages(room, support_user, count)
+        archive_room(room.id, chunk_size=30)
+        # Messages written after the room was reopened stay in the Message table
+        _create_messages(room, support_user, 10, start=count)
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            pages = [await socket.receive_json_from()]
+            await socket.receive_json_from()  # Users present in the room
+            while pages[-1]['before']:
+                await socket.send_json_to({'type': 'load_before', 'before': pages[-1]['before']})
+                pages.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return pages
+
+        pages = async_to_sync(scenario)()
+        messages = [m['message'] for page in reversed(pages) for m in page['messages']]
+        assert messages == [f'message {i}' for i in range(count + 10)]
+        assert all(len(page['messages']) == CHAT_HISTORY_PAGE_SIZE for page in pages[:-1])
@@ -0,0 +1,144 @@
+import pytest
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from accounts.models import Profile
+from support.assignment import get_agent_loads
+from support.models import Message, SupportRoom, get_room_list
+
+
+@pytest.fixture
+def agents(db):
+    """
+    Fixture creating four staff users.
+    """
+    return [Profile.objects.create_user(username=f'agent{i}', password='agentpass123', is_staff=True)
+            for i in range(4)]
+
+
+def _admin_ids(room):
+    return set(room.admins.values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+class TestAgentAssignment:
+    def test_rooms_spread_over_agents(self, settings, agents, support_user):
+        """Test that each room gets SUPPORT_AGENTS_PER_ROOM agents, the least loaded ones."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 2
+        rooms = [SupportRoom.objects.create(title=f'Room {i}', user=support_user) for i in range(4)]
+
+        assert all(len(_admin_ids(room)) == 2 for room in rooms)
+        assert get_agent_loads([agent.id for agent in agents]) == {agent.id: 2 for agent in agents}
+
+    def test_only_active_staff(self, settings, support_user):
+        """Test that users who are not staff, inactive staff and the owner are never assigned."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 5
+        agent = Profile.objects.create_user(username='agent', password='agentpass123', is_staff=True)
+        Profile.objects.create_user(username='former', password='formerpass123', is_staff=True, is_active=False)
+        support_user.is_staff = True
+        support_user.save()
+
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+
+        assert _admin_ids(room) == {agent.id}
+
+    def test_closing_and_reopening_updates_load(self, settings, agents, support_user):
+        """Test that resolved rooms stop counting towards the load of their agents."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        agent_id, = _admin_ids(room)
+        assert get_agent_loads([agent_id]) == {agent_id: 1}
+
+        room.status = 'Resolved'
+        room.save()
+        assert get_agent_loads([agent_id]) == {agent_id: 0}
+
+        room = SupportRoom.objects.get(pk=room.pk)
+        room.status = 'Pending'
+        room.save()
+        assert get_agent_loads([agent_id]) == {agent_id: 1}
+
+    def test_deleting_room_updates_load(self, settings, agents, support_user):
+        """Test that deleted open rooms, also deleted with their owner, stop counting towards the load."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        agent_id, = _admin_ids(room)
+        SupportRoom.objects.create(title='Invoice', user=support_user)
+        agent_ids = [agent.id for agent in agents]
+        assert sum(get_agent_loads(agent_ids).values()) == 2
+
+        room.delete()
+        assert get_agent_loads([agent_id]) == {agent_id: 0}
+        support_user.delete()
+        assert get_agent_loads(agent_ids) == {agent.id: 0 for agent in agents}
+
+    def test_editing_admins_updates_load(self, settings, agents, support_user):
+        """Test that agents added to or removed from open rooms outside of assignment update their load."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        first, second = agents[0], agents[1]
+        room.admins.set([first])
+        assert get_agent_loads([first.id, second.id]) == {first.id: 1, second.id: 0}
+
+        room.admins.set([second])
+        assert get_agent_loads([first.id, second.id]) == {first.id: 0, second.id: 1}
+        second.admin_rooms.clear()
+        first.admin_rooms.add(room)
+        assert get_agent_loads([first.id, second.id]) == {first.id: 1, second.id: 0}
+        room.admins.clear()
+        assert get_agent_loads([first.id, second.id]) == {first.id: 0, second.id: 0}
+
+    def test_loads_rebuilt_from_database(self, settings, agents, support_user):
+        """Test that load counters missing from the cache are counted from the open rooms."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 4
+        SupportRoom.objects.create(title='Open', user=support_user)
+        SupportRoom.objects.create(title='Closed', user=support_user, status='Closed')
+        cache.clear()
+
+        assert get_agent_loads([agent.id for agent in agents]) == {agent.id: 1 for agent in agents}
+
+    def test_agent_lists_only_assigned_rooms(self, settings, agents, support_user):
+        """Test that agents see only the rooms assigned to them."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        rooms = [SupportRoom.objects.create(title=f'Room {i}', user=support_user) for i in range(4)]
+
+        for agent, room in zip(agents, rooms):
+            assert [item['title'] for item in get_room_list(agent)] == [room.title]
+
+
+@pytest.mark.django_db
+class TestEscalation:
+    def _waiting_room(self, support_user, minutes):
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        Message.objects.create(chat=room, sender=support_user, content='Hello?',
+                               timestamp=timezone.now() - timedelta(minutes=minutes))
+        return room
+
+    def test_unanswered_room_escalated(self, settings, agents, support_user):
+        """Test that a room waiting longer than SUPPORT_ESCALATION_AFTER gets one more agent, once."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        settings.SUPPORT_ESCALATION_AFTER = 15
+        room = self._waiting_room(support_user, minutes=20)
+
+        call_command('escalate_support_rooms')
+        room.refresh_from_db()
+        assert len(_admin_ids(room)) == 2
+        assert room.escalated_at is not None
+
+        call_command('escalate_support_rooms')
+        assert len(_admin_ids(room)) == 2
+
+    def test_recent_or_answered_rooms_not_escalated(self, settings, agents, support_user):
+        """Test that rooms waiting for a short time or already answered are left alone."""
+        settings.SUPPORT_AGENTS_PER_ROOM = 1
+        settings.SUPPORT_ESCALATION_AFTER = 15
+        recent = self._waiting_room(support_user, minutes=5)
+        answered = self._waiting_room(support_user, minutes=30)
+        Message.objects.create(chat=answered, sender=agents[0], content='Checking',
+                               timestamp=timezone.now() - timedelta(minutes=25))
+
+        call_command('escalate_support_rooms')
+
+        assert len(_admin_ids(recent)) == 1
+        assert len(_admin_ids(answered)) == 1
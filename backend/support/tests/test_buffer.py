@@ -0,0 +1,224 @@
+import asyncio
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from support import consumers
+from support.buffer import MessageBuffer, read_spool, spool_messages
+from support.models import Message
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    """
+    Fixture providing a fresh message buffer, also used by the chat consumer.
+    """
+    buffer = MessageBuffer()
+    monkeypatch.setattr(consumers, 'message_buffer', buffer)
+    return buffer
+
+
+def _message(room, sender, content='Hello'):
+    return Message(content=content, chat=room, sender=sender)
+
+
+@pytest.mark.django_db
+class TestMessageBuffer:
+    def test_flush_when_full(self, settings, room, support_user, buffer):
+        """Test that the buffer writes its messages with one bulk insert once it is full."""
+        settings.SUPPORT_MESSAGE_FLUSH_SIZE = 3
+
+        async def scenario():
+            for i in range(3):
+                await buffer.add(_message(room, support_user, f'message {i}'))
+
+        with CaptureQueriesContext(connection) as context:
+            async_to_sync(scenario)()
+        assert Message.objects.count() == 3
+        assert len([query for query in context.captured_queries if query['sql'].startswith('INSERT')]) == 1
+        assert buffer.flushes == 1
+        assert buffer.pending == []
+
+    def test_flush_after_interval(self, settings, room, support_user, buffer):
+        """Test that pending messages are written once the flush interval has passed."""
+        settings.SUPPORT_MESSAGE_FLUSH_INTERVAL = 10
+
+        async def scenario():
+            await buffer.add(_message(room, support_user))
+            saved_at_once = len(buffer.pending) == 0
+            await asyncio.sleep(0.1)
+            return saved_at_once
+
+        assert async_to_sync(scenario)() is False
+        assert Message.objects.count() == 1
+
+    def test_keeps_timestamps(self, room, support_user, buffer):
+        """Test that buffered messages are saved with the time they were received."""
+        received = timezone.now() - timezone.timedelta(seconds=30)
+        message = _message(room, support_user)
+        message.timestamp = received
+
+        async def scenario():
+            await buffer.add(message)
+            await buffer.flush()
+
+        async_to_sync(scenario)()
+        assert Message.objects.get().timestamp == received
+
+    def test_failed_flush_is_retried(self, monkeypatch, room, support_user, buffer):
+        """Test that messages of a failed flush are kept for the next one."""
+        bulk_create = Message.objects.bulk_create
+
+        def failing(*args, **kwargs):
+            raise ConnectionError("database unavailable")
+
+        async def scenario():
+            await buffer.add(_message(room, support_user))
+            monkeypatch.setattr(Message.objects, 'bulk_create', failing)
+            await buffer.flush()
+            pending = len(buffer.pending)
+            monkeypatch.setattr(Message.objects, 'bulk_create', bulk_create)
+            await buffer.flush()
+            return pending
+
+        assert async_to_sync(scenario)() == 1
+        assert Message.objects.count() == 1
+
+    def test_rejected_message_is_dropped(self, room, support_user, buffer):
+        """Test that a message rejected by the database is dropped without holding back the rest of its batch."""
+        async def scenario():
+            await buffer.add(_message(room, support_user, 'before'))
+            await buffer.add(_message(room, support_user, None))
+            await buffer.add(_message(room, support_user, 'after'))
+            await buffer.flush()
+
+        async_to_sync(scenario)()
+        assert list(Message.objects.order_by('id').values_list('content', flat=True)) == ['before', 'after']
+        assert buffer.pending == []
+
+    def test_failed_flush_is_rescheduled(self, monkeypatch, settings, room, support_user, buffer):
+        """Test that a failed flush schedules another one instead of waiting for the next message."""
+        settings.SUPPORT_MESSAGE_FLUSH_INTERVAL = 10
+        bulk_create = Message.objects.bulk_create
+
+        def failing(*args, **kwargs):
+            raise ConnectionError("database unavailable")
+
+        async def scenario():
+            await buffer.add(_message(room, support_user))
+            monkeypatch.setattr(Message.objects, 'bulk_create', failing)
+            await buffer.flush()
+            monkeypatch.setattr(Message.objects, 'bulk_create', bulk_create)
+            await asyncio.sleep(0.1)
+
+        async_to_sync(scenario)()
+        assert Message.objects.count() == 1
+        assert buffer.pending == []
+
+    def test_no_flush_from_add_while_retrying(self, monkeypatch, settings, tmp_path, room, support_user, buffer):
+        """Test that while the database is failing messages wait for the retry and the overflow is spooled."""
+        settings.SUPPORT_MESSAGE_FLUSH_SIZE = 2
+        settings.SUPPORT_MESSAGE_BUFFER_MAX = 3
+        settings.SUPPORT_MESSAGE_FLUSH_INTERVAL = 10000
+        settings.SUPPORT_MESSAGE_SPOOL = tmp_path / 'spool.jsonl'
+        attempts = []
+
+        def failing(*args, **kwargs):
+            attempts.append(args)
+            raise ConnectionError("database unavailable")
+        monkeypatch.setattr(Message.objects, 'bulk_create', failing)
+
+        async def scenario():
+            for i in range(6):
+                await buffer.add(_message(room, support_user, f'message {i}'))
+            buffer._timer.cancel()
+
+        async_to_sync(scenario)()
+        assert len(attempts) == 1
+        assert [message.content for message in buffer.pending] == ['message 0', 'message 1', 'message 2']
+        assert [message.content for message in read_spool(settings.SUPPORT_MESSAGE_SPOOL)] == \
+            ['message 3', 'message 4', 'message 5']
+
+    def test_retries_back_off(self, settings, buffer):
+        """Test that the delay of retries doubles with every failed flush, up to SUPPORT_MESSAGE_RETRY_MAX."""
+        settings.SUPPORT_MESSAGE_FLUSH_INTERVAL = 200
+        settings.SUPPORT_MESSAGE_RETRY_MAX = 1000
+        delays = []
+        for failures in range(5):
+            buffer.failures = failures
+            delays.append(buffer.retry_delay)
+        assert delays == [200, 200, 400, 800, 1000]
+
+    def test_shutdown_spools_and_replays(self, monkeypatch, settings, tmp_path, room, support_user, buffer):
+        """Test that messages which cannot be saved at shutdown are spooled and replayed later."""
+        settings.SUPPORT_MESSAGE_SPOOL = tmp_path / 'spool.jsonl'
+        buffer.pending = [_message(room, support_user, 'first'), _message(room, support_user, 'second')]
+
+        def failing(*args, **kwargs):
+            raise ConnectionError("database unavailable")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(Message.objects, 'bulk_create', failing)
+            buffer.flush_sync()
+        assert Message.objects.count() == 0
+
+        call_command('replay_message_spool')
+        assert list(Message.objects.order_by('id').values_list('content', flat=True)) == ['first', 'second']
+        assert not settings.SUPPORT_MESSAGE_SPOOL.exists()
+
+    def test_replay_drops_rejected_messages(self, settings, tmp_path, room, support_user):
+        """Test that replaying a spool saves its valid messages and drops those the database rejects."""
+        settings.SUPPORT_MESSAGE_SPOOL = tmp_path / 'spool.jsonl'
+        spool_messages([_message(room, support_user, None), _message(room, support_user, 'valid')])
+
+        call_command('replay_message_spool')
+        assert list(Message.objects.values_list('content', flat=True)) == ['valid']
+        assert not settings.SUPPORT_MESSAGE_SPOOL.exists()
+
+
+@pytest.mark.django_db
+class TestWriteBehindConsumer:
+    def test_messages_broadcast_before_saving(self, settings, room, support_user, buffer, communicator):
+        """Test that in write-behind mode messages are broadcast at once and saved in one batch."""
+        settings.SUPPORT_MESSAGE_WRITE_BEHIND = True
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            received = []
+            for i in range(5):
+                await socket.send_json_to({'message': f'message {i}'})
+                received.append(await socket.receive_json_from())
+            saved_before_flush = len(buffer.pending) == 0
+            await buffer.flush()
+            await socket.disconnect()
+            return received, saved_before_flush
+
+        received, saved_before_flush = async_to_sync(scenario)()
+        assert [data['message'] for data in received] == [f'message {i}' for i in range(5)]
+        assert saved_before_flush is False
+        assert buffer.flushes == 1
+        assert [message.timestamp.isoformat() for message in Message.objects.order_by('id')] == \
+            [data['timestamp'] for data in received]
+
+    @pytest.mark.parametrize('frame', [{}, {'message': ''}, {'message': '   '}, {'message': 42}])
+    def test_empty_message_rejected(self, settings, room, support_user, buffer, communicator, frame):
+        """Test that frames without message content are answered with an error instead of being buffered."""
+        settings.SUPPORT_MESSAGE_WRITE_BEHIND = True
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.send_json_to(frame)
+            error = await socket.receive_json_from()
+            await socket.disconnect()
+            return error
+
+        assert async_to_sync(scenario)() == {'type': 'error', 'message': 'Empty message.'}
+        assert buffer.pending == []
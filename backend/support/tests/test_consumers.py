@@ -0,0 +1,197 @@
+import json
+import pytest
+from datetime import timedelta
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from accounts.models import Profile
+from monitoring import metrics
+from support.consumers import CHAT_HISTORY_PAGE_SIZE
+from support.models import Message, SupportRoom
+
+
+def _create_messages(room, sender, count, timestamp=None):
+    """Create count messages in room, one second apart, or all with the same timestamp if given."""
+    start = timezone.now() - timedelta(days=1)
+    messages = Message.objects.bulk_create(
+        Message(content=f'message {i}', chat=room, sender=sender) for i in range(count))
+    for i, message in enumerate(messages):
+        message.timestamp = timestamp or start + timedelta(seconds=i)
+    Message.objects.bulk_update(messages, ['timestamp'])
+
+
+@pytest.mark.django_db
+class TestChatHistory:
+    def test_anonymous_user_rejected(self, room, communicator):
+        """Test that an anonymous user cannot connect to a room."""
+        async def scenario():
+            connected, _ = await communicator(room).connect()
+            return connected
+
+        assert async_to_sync(scenario)() is False
+
+    def test_connect_sends_latest_page(self, room, support_user, communicator):
+        """Test that only the latest page of messages is sent on connect, oldest first."""
+        _create_messages(room, support_user, CHAT_HISTORY_PAGE_SIZE + 5)
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            data = await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.disconnect()
+            return data
+
+        data = async_to_sync(scenario)()
+        assert data['type'] == 'previous_messages'
+        assert [m['message'] for m in data['messages']] == [
+            f'message {i}' for i in range(5, CHAT_HISTORY_PAGE_SIZE + 5)]
+        assert data['messages'][0]['sender'] == 'client'
+        assert data['before'] is not None
+
+    def test_load_before_pages_through_history(self, room, support_user, communicator):
+        """Test that load_before returns the older pages until the history is exhausted."""
+        count = CHAT_HISTORY_PAGE_SIZE * 2 + 3
+        _create_messages(room, support_user, count)
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            pages = [await socket.receive_json_from()]
+            await socket.receive_json_from()  # Users present in the room
+            while pages[-1]['before']:
+                await socket.send_json_to({'type': 'load_before', 'before': pages[-1]['before']})
+                pages.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return pages
+
+        pages = async_to_sync(scenario)()
+        assert [page['type'] for page in pages] == ['previous_messages', 'older_messages', 'older_messages']
+        messages = [m['message'] for page in reversed(pages) for m in page['messages']]
+        assert messages == [f'message {i}' for i in range(count)]
+
+    def test_keyset_with_equal_timestamps(self, room, support_user, communicator):
+        """Test that messages sharing a timestamp are neither skipped nor repeated between pages."""
+        _create_messages(room, support_user, CHAT_HISTORY_PAGE_SIZE + 10, timestamp=timezone.now())
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            first = await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.send_json_to({'type': 'load_before', 'before': first['before']})
+            second = await socket.receive_json_from()
+            await socket.disconnect()
+            return first, second
+
+        first, second = async_to_sync(scenario)()
+        messages = [m['message'] for m in second['messages'] + first['messages']]
+        assert messages == [f'message {i}' for i in range(CHAT_HISTORY_PAGE_SIZE + 10)]
+        assert second['before'] is None
+
+    def test_history_single_query(self, room, support_user, communicator):
+        """Test that the history is read with one query instead of one per message sender."""
+        _create_messages(room, support_user, 20)
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.disconnect()
+
+        with CaptureQueriesContext(connection) as context:
+            async_to_sync(scenario)()
+        assert len([query for query in context.captured_queries if 'support_message' in query['sql']]) == 1
+
+    def test_invalid_cursor(self, room, support_user, communicator):
+        """Test that a malformed cursor is answered with an error."""
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.send_json_to({'type': 'load_before', 'before': 'garbage'})
+            data = await socket.receive_json_from()
+            await socket.disconnect()
+            return data
+
+        assert async_to_sync(scenario)()['type'] == 'error'
+
+
+@pytest.mark.django_db
+class TestChatRoomAccess:
+    def test_user_of_other_room_rejected(self, room, communicator):
+        """Test that a user who neither owns nor administers the room cannot connect."""
+        stranger = Profile.objects.create_user(username='stranger', password='strangerpass123')
+
+        async def scenario():
+            connected, _ = await communicator(room, stranger).connect()
+            return connected
+
+        assert async_to_sync(scenario)() is False
+
+    def test_admin_connects(self, support_user, communicator):
+        """Test that staff users assigned to the room can connect."""
+        admin = Profile.objects.create_user(username='agent', password='agentpass123', is_staff=True)
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+
+        async def scenario():
+            socket = communicator(room, admin)
+            connected, _ = await socket.connect()
+            await socket.disconnect()
+            return connected
+
+        assert async_to_sync(scenario)() is True
+
+    def test_unknown_room_rejected(self, support_user, communicator):
+        """Test that connecting to a room which does not exist is rejected."""
+        async def scenario():
+            connected, _ = await communicator(SupportRoom(title='Missing'), support_user).connect()
+            return connected
+
+        assert async_to_sync(scenario)() is False
+
+    def test_message_saved_without_room_lookup(self, room, support_user, communicator):
+        """Test that chat messages are broadcast and saved without looking the room up again."""
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            received = []
+            for text in ('Hello', 'Anyone there?'):
+                await socket.send_json_to({'message': text})
+                received.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return received
+
+        with CaptureQueriesContext(connection) as context:
+            received = async_to_sync(scenario)()
+        assert [data['sender'] for data in received] == ['client', 'client']
+        assert list(Message.objects.order_by('id').values_list('content', flat=True)) == ['Hello', 'Anyone there?']
+        # The room is read once at connect, each message costs only its INSERT
+        sql = [query['sql'] for query in context.captured_queries]
+        assert len([query for query in sql if '"support_supportroom"."uuid" =' in query]) == 1
+        assert len([query for query in sql if query.startswith('INSERT INTO "support_message"')]) == 2
+
+    def test_open_connections_metric(self, room, support_user, communicator):
+        """Test that the open connections gauge of the node follows connects and disconnects."""
+        def open_connections():
+            values = metrics.get_metrics_store().read_processes([metrics.WEBSOCKET_CONNECTIONS.name])
+            return values[metrics.WEBSOCKET_CONNECTIONS.name].get(json.dumps([metrics.NODE]), 0)
+
+        before = open_connections()
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            connected = await sync_to_async(open_connections)()
+            await socket.disconnect()
+            return connected
+
+        assert async_to_sync(scenario)() == before + 1
+        assert open_connections() == before
@@ -0,0 +1,113 @@
+import pytest
+from asgiref.sync import async_to_sync
+from accounts.models import Profile
+from support import presence
+from support.models import SupportRoom
+
+
+@pytest.fixture
+def agent(db):
+    """
+    Fixture creating a staff user, assigned to every support room created afterwards.
+    """
+    return Profile.objects.create_user(username='agent', password='agentpass123', is_staff=True)
+
+
+async def _join(socket):
+    """Connect and skip the history frame, returning the presence frame of the room."""
+    await socket.connect()
+    await socket.receive_json_from()
+    return await socket.receive_json_from()
+
+
+@pytest.mark.django_db
+class TestPresence:
+    def test_join_and_leave(self, agent, support_user, communicator):
+        """Test that everyone in the room receives the users present after each join and leave."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+
+        async def scenario():
+            client, staff = communicator(room, support_user), communicator(room, agent)
+            first = await _join(client)
+            await _join(staff)
+            joined = await client.receive_json_from()
+            await staff.disconnect()
+            left = await client.receive_json_from()
+            await client.disconnect()
+            return first, joined, left
+
+        first, joined, left = async_to_sync(scenario)()
+        assert first['type'] == 'presence'
+        assert [user['username'] for user in first['users']] == ['client']
+        assert [(user['username'], user['is_staff']) for user in joined['users']] == [('agent', True), ('client', False)]
+        assert [user['username'] for user in left['users']] == ['client']
+
+    def test_user_with_two_connections_stays_online(self, room, support_user, communicator):
+        """Test that closing one of two connections of a user keeps the user present."""
+        async def scenario():
+            first, second = communicator(room, support_user), communicator(room, support_user)
+            await _join(first)
+            await _join(second)
+            await first.receive_json_from()
+            await second.disconnect()
+            left = await first.receive_json_from()
+            await first.disconnect()
+            return left
+
+        assert [user['username'] for user in async_to_sync(scenario)()['users']] == ['client']
+
+    def test_typing_is_coalesced(self, agent, support_user, communicator):
+        """Test that repeated typing events of a connection are forwarded only once per interval."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+
+        async def scenario():
+            client, staff = communicator(room, support_user), communicator(room, agent)
+            await _join(staff)
+            await _join(client)
+            await staff.receive_json_from()
+            for _ in range(5):
+                await client.send_json_to({'type': 'typing'})
+            typing = await staff.receive_json_from()
+            nothing_more = await staff.receive_nothing(timeout=0.2)
+            await client.disconnect()
+            await staff.disconnect()
+            return typing, nothing_more
+
+        typing, nothing_more = async_to_sync(scenario)()
+        assert typing == {'type': 'typing', 'user': {'id': typing['user']['id'], 'username': 'client'}}
+        assert nothing_more is True
+
+    def test_snapshot_of_many_rooms(self, agent, support_user, communicator):
+        """Test that an agent gets the presence of all requested rooms it has access to in one frame."""
+        rooms = [SupportRoom.objects.create(title=f'Room {i}', user=support_user) for i in range(3)]
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        foreign = SupportRoom.objects.create(title='Foreign', user=other)
+        foreign.admins.clear()
+
+        async def scenario():
+            client, staff = communicator(rooms[1], support_user), communicator(rooms[0], agent)
+            await _join(client)
+            await _join(staff)
+            await staff.send_json_to({'type': 'presence_snapshot',
+                                      'rooms': [str(room.uuid) for room in rooms] + [str(foreign.uuid), 'bad']})
+            snapshot = await staff.receive_json_from()
+            await client.disconnect()
+            await staff.disconnect()
+            return snapshot
+
+        snapshot = async_to_sync(scenario)()
+        assert snapshot['type'] == 'presence_snapshot'
+        assert {room_uuid: [user['username'] for user in users] for room_uuid, users in snapshot['rooms'].items()} == {
+            str(rooms[0].uuid): ['agent'],
+            str(rooms[1].uuid): ['client'],
+            str(rooms[2].uuid): [],
+        }
+
+    def test_expired_presence(self, monkeypatch, room, support_user, local_presence):
+        """Test that connections without a heartbeat for PRESENCE_TTL seconds are no longer present."""
+        local_presence.join(room.uuid, 'channel', support_user)
+        assert len(local_presence.members([room.uuid])[str(room.uuid)]) == 1
+
+        now = presence.time.time()
+        monkeypatch.setattr(presence.time, 'time', lambda: now + presence.PRESENCE_TTL + 1)
+        assert local_presence.members([room.uuid]) == {str(room.uuid): []}
@@ -0,0 +1,108 @@
+import json
+import msgpack
+import pytest
+from asgiref.sync import async_to_sync
+from support.consumers import MSGPACK_SUBPROTOCOL
+from support.models import Message
+from .test_consumers import _create_messages
+
+
+async def _receive(socket):
+    """Receive a MessagePack frame and decode it."""
+    return msgpack.unpackb(await socket.receive_from(), raw=False)
+
+
+@pytest.mark.django_db
+class TestMessagePackProtocol:
+    def test_subprotocol_negotiated(self, room, support_user, communicator):
+        """Test that the MessagePack subprotocol is accepted only when the client asks for it."""
+        async def scenario():
+            binary = communicator(room, support_user, [MSGPACK_SUBPROTOCOL])
+            text = communicator(room, support_user)
+            result = (await binary.connect(), await text.connect())
+            await binary.disconnect()
+            await text.disconnect()
+            return result
+
+        (binary_connected, binary_protocol), (text_connected, text_protocol) = async_to_sync(scenario)()
+        assert binary_connected and text_connected
+        assert binary_protocol == MSGPACK_SUBPROTOCOL
+        assert text_protocol is None
+
+    def test_compact_history(self, room, support_user, communicator):
+        """Test that MessagePack clients receive history as sender indexes and epoch millisecond rows."""
+        _create_messages(room, support_user, 3)
+        messages = list(Message.objects.order_by('timestamp'))
+
+        async def scenario():
+            socket = communicator(room, support_user, [MSGPACK_SUBPROTOCOL])
+            await socket.connect()
+            history = await _receive(socket)
+            presence = await _receive(socket)
+            await socket.disconnect()
+            return history, presence
+
+        history, presence = async_to_sync(scenario)()
+        assert history['type'] == 'previous_messages'
+        assert history['senders'] == ['client']
+        assert history['rows'] == [
+            [0, message.content, int(message.timestamp.timestamp() * 1000)] for message in messages]
+        assert history['before'] is None
+        assert presence['type'] == 'presence'
+
+    def test_binary_and_text_clients_share_a_room(self, room, support_user, communicator):
+        """Test that a message sent as MessagePack reaches JSON clients and the other way around."""
+        async def scenario():
+            binary = communicator(room, support_user, [MSGPACK_SUBPROTOCOL])
+            text = communicator(room, support_user)
+            await binary.connect()
+            await _receive(binary)
+            await _receive(binary)  # Users present in the room
+            await text.connect()
+            await text.receive_json_from()
+            await text.receive_json_from()  # Users present in the room
+            await _receive(binary)  # Presence update after the text client joined
+            await binary.send_to(bytes_data=msgpack.packb({'message': 'From binary'}))
+            received = [await text.receive_json_from(), await _receive(binary)]
+            await text.send_json_to({'message': 'From text'})
+            received += [await text.receive_json_from(), await _receive(binary)]
+            await binary.disconnect()
+            await text.disconnect()
+            return received
+
+        received = async_to_sync(scenario)()
+        assert [data['message'] for data in received] == ['From binary', 'From binary', 'From text', 'From text']
+        assert list(Message.objects.order_by('id').values_list('content', flat=True)) == ['From binary', 'From text']
+
+    def test_malformed_frame(self, room, support_user, communicator):
+        """Test that an undecodable frame is answered with an error instead of closing the connection."""
+        async def scenario():
+            socket = communicator(room, support_user, [MSGPACK_SUBPROTOCOL])
+            await socket.connect()
+            await _receive(socket)
+            await _receive(socket)  # Users present in the room
+            await socket.send_to(bytes_data=b'\xc1')
+            error = await _receive(socket)
+            await socket.disconnect()
+            return error
+
+        assert async_to_sync(scenario)()['type'] == 'error'
+
+    def test_history_smaller_than_json(self, room, support_user, communicator):
+        """Test that a MessagePack history page is smaller than the same page as JSON."""
+        _create_messages(room, support_user, 50)
+
+        async def scenario():
+            frames = []
+            for subprotocols in ([MSGPACK_SUBPROTOCOL], None):
+                socket = communicator(room, support_user, subprotocols)
+                await socket.connect()
+                frames.append(await socket.receive_from())
+                await socket.receive_from()  # Users present in the room
+                await socket.disconnect()
+            return frames
+
+        binary, text = async_to_sync(scenario)()
+        assert isinstance(binary, bytes) and isinstance(text, str)
+        assert len(json.loads(text)['messages']) == len(msgpack.unpackb(binary)['rows'])
+        assert len(binary) < len(text.encode()) * 0.7
@@ -0,0 +1,162 @@
+import pytest
+from datetime import timedelta
+from asgiref.sync import async_to_sync, sync_to_async
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import Profile
+from support import consumers
+from support.buffer import MessageBuffer
+from support.models import Message, RoomReadCursor, SupportRoom, get_room_list, invalidate_rooms
+
+
+@pytest.fixture
+def agent(db):
+    """
+    Fixture creating a staff user, assigned to every support room created afterwards.
+    """
+    return Profile.objects.create_user(username='agent', password='agentpass123', is_staff=True)
+
+
+def _say(room, sender, content, seconds_ago=0):
+    return Message.objects.create(chat=room, sender=sender, content=content,
+                                  timestamp=timezone.now() - timedelta(seconds=seconds_ago))
+
+
+@pytest.mark.django_db
+class TestRoomList:
+    def test_unread_and_last_message(self, agent, support_user):
+        """Test that rooms carry the number of unread messages of other users and the last message."""
+        quiet = SupportRoom.objects.create(title='Quiet', user=support_user)
+        busy = SupportRoom.objects.create(title='Busy', user=support_user)
+        _say(busy, support_user, 'Hello', seconds_ago=30)
+        _say(busy, support_user, 'My payment failed', seconds_ago=20)
+        _say(busy, agent, 'Let me check')
+
+        rooms = get_room_list(agent)
+
+        assert [room['title'] for room in rooms] == ['Busy', 'Quiet']
+        assert rooms[0]['unread'] == 2
+        assert (rooms[0]['last_message'], rooms[0]['last_message_sender']) == ('Let me check', 'agent')
+        assert rooms[1]['unread'] == 0
+        assert rooms[1]['last_message'] is None
+        assert get_room_list(support_user)[0]['unread'] == 1
+
+    def test_read_cursor(self, agent, support_user):
+        """Test that only messages sent after the read cursor of the user are unread."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        _say(room, support_user, 'Hello', seconds_ago=30)
+        RoomReadCursor.objects.create(room=room, user=agent, last_read_at=timezone.now() - timedelta(seconds=20))
+        _say(room, support_user, 'Anyone there?', seconds_ago=10)
+
+        assert get_room_list(agent)[0]['unread'] == 1
+
+    def test_single_query_and_cached(self, agent, support_user, django_assert_num_queries):
+        """Test that the list is read with one query and served from the cache afterwards."""
+        for i in range(5):
+            room = SupportRoom.objects.create(title=f'Room {i}', user=support_user)
+            _say(room, support_user, 'Hello')
+
+        with django_assert_num_queries(1):
+            rooms = get_room_list(agent)
+        with django_assert_num_queries(0):
+            assert get_room_list(agent) == rooms
+
+    def test_only_own_rooms(self, support_user):
+        """Test that users who are not staff only see the rooms they created."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        SupportRoom.objects.create(title='Mine', user=support_user)
+        SupportRoom.objects.create(title='Theirs', user=other)
+
+        assert [room['title'] for room in get_room_list(support_user)] == ['Mine']
+
+    def test_new_room_invalidates(self, agent, support_user):
+        """Test that creating a room drops the cached lists of its owner and admins."""
+        get_room_list(agent)
+        SupportRoom.objects.create(title='Refund', user=support_user)
+
+        assert [room['title'] for room in get_room_list(agent)] == ['Refund']
+
+    @pytest.mark.parametrize('write_behind', [False, True])
+    def test_new_message_invalidates(self, settings, monkeypatch, write_behind, agent, support_user, communicator):
+        """Test that chat messages make the cached lists of all room members stale, also when buffered."""
+        settings.SUPPORT_MESSAGE_WRITE_BEHIND = write_behind
+        buffer = MessageBuffer()
+        monkeypatch.setattr(consumers, 'message_buffer', buffer)
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        assert get_room_list(agent)[0]['unread'] == 0
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await socket.send_json_to({'message': 'Hello'})
+            await socket.receive_json_from()
+            await buffer.flush()
+            await socket.disconnect()
+
+        async_to_sync(scenario)()
+        assert get_room_list(agent)[0]['unread'] == 1
+        assert get_room_list(agent)[0]['last_message'] == 'Hello'
+
+    def test_new_message_invalidates_added_agent(self, agent, support_user, communicator):
+        """Test that messages make the cached lists of agents added after the connection opened stale."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        escalated = Profile.objects.create_user(username='escalated', password='agentpass123', is_staff=True)
+
+        async def scenario():
+            socket = communicator(room, support_user)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.receive_json_from()  # Users present in the room
+            await sync_to_async(room.admins.add)(escalated)
+            assert (await sync_to_async(get_room_list)(escalated))[0]['unread'] == 0
+            await socket.send_json_to({'message': 'Hello'})
+            await socket.receive_json_from()
+            await socket.disconnect()
+
+        async_to_sync(scenario)()
+        assert get_room_list(escalated)[0]['unread'] == 1
+
+    def test_changed_room_invalidates_only_its_lists(self, agent, support_user, django_assert_num_queries):
+        """Test that a changed room makes the lists containing it stale without looking up its members."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        SupportRoom.objects.create(title='Other', user=other)
+        get_room_list(support_user)
+        get_room_list(other)
+
+        with django_assert_num_queries(0):
+            invalidate_rooms([room.id])
+        with django_assert_num_queries(0):
+            get_room_list(other)
+        with django_assert_num_queries(1):
+            get_room_list(support_user)
+
+    def test_connecting_marks_read(self, agent, support_user, communicator):
+        """Test that opening a room clears its unread count for the user."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        _say(room, support_user, 'Hello', seconds_ago=5)
+        assert get_room_list(agent)[0]['unread'] == 1
+
+        async def scenario():
+            socket = communicator(room, agent)
+            await socket.connect()
+            await socket.receive_json_from()
+            await socket.disconnect()
+
+        async_to_sync(scenario)()
+        assert get_room_list(agent)[0]['unread'] == 0
+
+    def test_chats_view_shows_unread(self, client, agent, support_user):
+        """Test that the chat page lists rooms with their unread badge and last message."""
+        room = SupportRoom.objects.create(title='Refund', user=support_user)
+        _say(room, support_user, 'My payment failed')
+        client.force_login(agent)
+
+        response = client.get(reverse('chats'))
+
+        assert response.status_code == 200
+        content = response.content.decode()
+        assert 'room-unread">1<' in content
+        assert 'My payment failed' in content
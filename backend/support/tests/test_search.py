@@ -0,0 +1,116 @@
+import pytest
+from django.urls import reverse
+from accounts.models import Profile
+from support.models import Message, SupportRoom
+from support.search import SEARCH_PAGE_SIZE, search_messages, search_rooms
+
+
+@pytest.fixture
+def room(support_user):
+    """
+    Fixture creating a support room of support_user.
+    """
+    return SupportRoom.objects.create(title='Card payment declined', user=support_user)
+
+
+def _say(room, sender, content):
+    return Message.objects.create(chat=room, sender=sender, content=content)
+
+
+def _contents(results):
+    return [result['content'] for result in results]
+
+
+@pytest.mark.django_db
+class TestMessageSearch:
+    def test_all_words_match(self, room, support_user):
+        """Test that messages containing all searched words are found."""
+        _say(room, support_user, 'My card payment was declined')
+        _say(room, support_user, 'The card works in other shops')
+        _say(room, support_user, 'Hello')
+
+        messages, has_more = search_messages(support_user, 'card declined')
+
+        assert _contents(messages) == ['My card payment was declined']
+        assert messages[0]['room'] == str(room.uuid)
+        assert messages[0]['sender'] == 'client'
+        assert has_more is False
+
+    def test_ranked(self, room, support_user):
+        """Test that better matches come first."""
+        _say(room, support_user, 'I would like to ask about the status of my order and maybe a refund later')
+        _say(room, support_user, 'Refund, refund, refund!')
+
+        assert _contents(search_messages(support_user, 'refund')[0])[0] == 'Refund, refund, refund!'
+
+    def test_index_follows_changes(self, room, support_user):
+        """Test that inserted, edited and deleted messages are reflected in the results."""
+        message = _say(room, support_user, 'Where is my invoice?')
+        assert len(search_messages(support_user, 'invoice')[0]) == 1
+
+        message.content = 'Where is my receipt?'
+        message.save()
+        assert search_messages(support_user, 'invoice')[0] == []
+        assert len(search_messages(support_user, 'receipt')[0]) == 1
+
+        message.delete()
+        assert search_messages(support_user, 'receipt')[0] == []
+
+    def test_only_rooms_of_user(self, room, support_user):
+        """Test that messages of rooms the user does not take part in are not found."""
+        other = Profile.objects.create_user(username='other', password='otherpass123')
+        foreign = SupportRoom.objects.create(title='Other', user=other)
+        _say(foreign, other, 'Secret refund details')
+        _say(room, support_user, 'My refund')
+
+        assert _contents(search_messages(support_user, 'refund')[0]) == ['My refund']
+        assert _contents(search_messages(other, 'refund')[0]) == ['Secret refund details']
+
+    def test_pagination(self, room, support_user):
+        """Test that results are returned in pages."""
+        for i in range(SEARCH_PAGE_SIZE + 5):
+            _say(room, support_user, f'Refund number {i}')
+
+        first, first_more = search_messages(support_user, 'refund')
+        second, second_more = search_messages(support_user, 'refund', page=2)
+
+        assert (len(first), first_more) == (SEARCH_PAGE_SIZE, True)
+        assert (len(second), second_more) == (5, False)
+        assert not {m['id'] for m in first} & {m['id'] for m in second}
+
+    def test_diacritics_ignored(self, room, support_user):
+        """Test that words are found regardless of diacritics."""
+        _say(room, support_user, 'Płatność nie przeszła')
+
+        assert _contents(search_messages(support_user, 'płatnosc')[0]) == ['Płatność nie przeszła']
+
+    def test_search_syntax_is_literal(self, room, support_user):
+        """Test that FTS operators and quotes in the query do not cause errors."""
+        _say(room, support_user, 'refund or chargeback')
+
+        assert _contents(search_messages(support_user, 'refund OR "chargeback*')[0]) == ['refund or chargeback']
+        assert search_messages(support_user, '"*()')[0] == []
+
+    def test_room_titles(self, room, support_user):
+        """Test that rooms are found by their title."""
+        SupportRoom.objects.create(title='Refund', user=support_user)
+
+        assert [result['title'] for result in search_rooms(support_user, 'declined')] == ['Card payment declined']
+
+
+@pytest.mark.django_db
+class TestSearchView:
+    def test_requires_login(self, client):
+        """Test that anonymous users cannot search."""
+        assert client.get(reverse('support_search'), {'q': 'refund'}).status_code == 401
+
+    def test_results(self, client, room, support_user):
+        """Test that the view returns matching rooms and messages."""
+        _say(room, support_user, 'My card payment was declined')
+        client.force_login(support_user)
+
+        data = client.get(reverse('support_search'), {'q': 'declined'}).json()
+
+        assert [result['title'] for result in data['rooms']] == ['Card payment declined']
+        assert _contents(data['messages']) == ['My card payment was declined']
+        assert data['has_more'] is False
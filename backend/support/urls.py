@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('chat/', views.chats, name='chats'),
     path('create-room/', views.create_room, name='create_room'),
+    path('search/', views.search, name='support_search'),
 ]
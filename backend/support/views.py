@@ -2,7 +2,8 @@ from django.shortcuts import redirect, render, get_object_or_404
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from .models import SupportRoom
+from .models import SupportRoom, get_room_list
+from .search import search_messages, search_rooms
 from accounts.models import Profile
 
 
@@ -11,11 +12,8 @@ def chats(request):
     if not request.user.is_authenticated:
         return redirect('login')
 
-    user = request.user
-    if user.is_staff:
-        rooms = SupportRoom.objects.filter(admins=user)
-    else:
-        rooms = SupportRoom.objects.filter(user=user)
+    # Rooms with their unread count and last message, cached per user
+    rooms = get_room_list(request.user)
 
     return render(request, 'support/chats.html', {'section': 'support', 'rooms': rooms})
 
@@ -33,4 +31,30 @@ def create_room(request):
         return JsonResponse({"uuid": room.uuid, "title": room.title, "status": room.status}, status=201)
     
     else:
-        return HttpResponse("404")
\ No newline at end of file
+        return HttpResponse("404")
+
+
+def search(request):
+    """
+    Full-text search over the messages and room titles of the user's support rooms.
+
+    Query parameters:
+    - q (str): Words to search for.
+    - page (int): Page of message results, starting at 1. Matching rooms are returned with the first page.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    text = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        return JsonResponse({"error": "Invalid page"}, status=400)
+
+    messages, has_more = search_messages(request.user, text, page)
+    return JsonResponse({
+        "rooms": search_rooms(request.user, text) if page == 1 else [],
+        "messages": messages,
+        "page": page,
+        "has_more": has_more,
+    })
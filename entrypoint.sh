@@ -14,4 +14,6 @@ python manage.py loaddata data.json
 
 # django-admin compilemessages
 python manage.py collectstatic --noinput
+# Render the cached static pages again with the deployed templates and translations
+python manage.py clear_page_cache
 exec "$@"
\ No newline at end of file